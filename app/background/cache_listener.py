@@ -0,0 +1,97 @@
+import asyncio
+import json
+import logging
+from datetime import datetime
+import asyncpg
+from app.db.pool import connect_dedicated
+from app.db.events import (
+    CACHE_EVENTS_CHANNEL,
+    INSTANCE_ID,
+    SUBSCRIPTION_UPDATED,
+    SUBSCRIPTION_DELETED,
+    SUBSCRIPTIONS_CLEARED,
+    OUTBOX_ENQUEUED
+)
+from app.utils.entitlement_cache import store_access, clear_access_cache
+from app.utils.notification_cache import clear_user_notification
+from app.utils.expiry_scheduler import schedule_expiry, cancel_expiry, clear_expiries
+from app.background.outbox import wake_outbox
+
+logger = logging.getLogger(__name__)
+
+RECONNECT_DELAY_SECONDS = 5
+
+
+def apply_cache_event(payload: str) -> None:
+    """Применяет событие от другой реплики к локальным кэшам (и будит outbox)"""
+    try:
+        event = json.loads(payload)
+    except ValueError:
+        logger.warning(f"Некорректное событие кэша: {payload[:100]}")
+        return
+    
+    event_type = event.get("type")
+    if event_type == OUTBOX_ENQUEUED:
+        # Свои тоже: NOTIFY приходит после COMMIT, запись уже видна воркеру
+        wake_outbox()
+        return
+    
+    if event.get("origin") == INSTANCE_ID:
+        return
+    
+    user_id_hash = event.get("user_id")
+    
+    if event_type == SUBSCRIPTION_UPDATED and user_id_hash:
+        expires_at = datetime.fromisoformat(event["expires_at"])
+        store_access(user_id_hash, expires_at)
+        clear_user_notification(user_id_hash)
+        schedule_expiry(user_id_hash, expires_at)
+    elif event_type == SUBSCRIPTION_DELETED and user_id_hash:
+        store_access(user_id_hash, None)
+        cancel_expiry(user_id_hash)
+    elif event_type == SUBSCRIPTIONS_CLEARED:
+        clear_access_cache()
+        clear_expiries()
+    else:
+        logger.debug(f"Пропущено событие кэша: {event_type}")
+
+
+def _on_notification(conn: asyncpg.Connection, pid: int, channel: str, payload: str) -> None:
+    apply_cache_event(payload)
+
+
+async def cache_invalidation_listener():
+    """Фоновая задача: слушает NOTIFY от других реплик и обновляет кэши"""
+    logger.info("📡 Запущен слушатель событий кэша")
+    
+    try:
+        while True:
+            conn = None
+            try:
+                conn = await connect_dedicated()
+                closed = asyncio.Event()
+                conn.add_termination_listener(lambda _: closed.set())
+                await conn.add_listener(CACHE_EVENTS_CHANNEL, _on_notification)
+                
+                # Пока соединения не было, события могли потеряться
+                clear_access_cache()
+                logger.info(f"📡 LISTEN {CACHE_EVENTS_CHANNEL}")
+                
+                await closed.wait()
+                logger.warning("Соединение слушателя событий кэша закрыто, переподключение...")
+            
+            except asyncio.CancelledError:
+                raise
+            
+            except Exception as e:
+                logger.error(f"Ошибка слушателя событий кэша: {e}")
+            
+            finally:
+                if conn is not None and not conn.is_closed():
+                    await conn.close()
+            
+            await asyncio.sleep(RECONNECT_DELAY_SECONDS)
+    
+    except asyncio.CancelledError:
+        logger.info("✅ Слушатель событий кэша остановлен")
+        raise
@@ -1,42 +1,103 @@
 import asyncio
 import logging
-from aiogram import Bot
+import time
+from app.db.repositories.outbox import OutboxRepository
 from app.db.repositories.subscriptions import SubscriptionRepository
+from app.models.outbox import OutboxMessage
+from app.models.subscription import SubscriptionRecord
 from app.services.notifications import NotificationService
 from app.constants import CLEANUP_INTERVAL_SECONDS
 from app.config import config
+from app.utils.entitlement_cache import invalidate_access
+from app.utils.expiry_scheduler import init_expiry_scheduler
+from app.utils.metrics import registry
 
 logger = logging.getLogger(__name__)
 
+CLEANUP_CYCLE_SECONDS = registry.histogram(
+    "factchecker_cleanup_cycle_seconds",
+    "Duration of cleanup cycles that found expired subscriptions"
+)
+EXPIRED_SUBSCRIPTIONS = registry.counter(
+    "factchecker_subscriptions_expired_total",
+    "Expired subscriptions removed by the cleanup task"
+)
+DIGEST_PAGES = registry.counter(
+    "factchecker_expiry_digest_pages_total",
+    "Expiry digest messages queued (per admin)"
+)
+LAST_CYCLE_EXPIRED = registry.gauge(
+    "factchecker_cleanup_last_expired",
+    "Subscriptions expired in the last cleanup cycle"
+)
 
-async def subscription_cleanup_task(bot: Bot):
-    """Фоновая задача для автоматической очистки истекших подписок"""
+
+async def subscription_cleanup_task():
+    """
+    Фоновая задача для автоматической очистки истекших подписок
+    
+    Просыпается к ближайшему истечению по расписанию (min-heap), которое
+    обновляется при выдаче и отзыве подписок. Истекшие подписки удаляются
+    пачками по CLEANUP_BATCH_SIZE; одна сводка админам за весь цикл
+    записывается в outbox в транзакции последней (неполной) пачки и
+    доставляется задачей outbox.
+    """
     logger.info("🔄 Запущена фоновая задача очистки подписок")
-    notification_service = NotificationService(bot)
+    batch_size = max(1, config.cleanup_batch_size)
+    scheduler = init_expiry_scheduler(
+        SubscriptionRepository.get_upcoming_expirations,
+        config.expiry_load_limit,
+        config.expiry_resync_seconds
+    )
+    digest_messages = 0
+    # Подписки, удаленные в текущем цикле (пачки, транзакции которых зафиксированы)
+    expired_subs: list[SubscriptionRecord] = []
+    
+    def digest_for(expired: list[SubscriptionRecord]) -> list[OutboxMessage]:
+        nonlocal digest_messages
+        messages = NotificationService.expiry_digest_messages(
+            config.admin_chat_ids,
+            [(sub['user_id'], sub['expires_at']) for sub in expired]
+        )
+        digest_messages += len(messages)
+        return messages
+    
+    def digest(batch: list[SubscriptionRecord]) -> list[OutboxMessage]:
+        # Полная пачка - не последняя: сводка пойдет с последней пачкой цикла
+        if len(batch) >= batch_size:
+            return []
+        return digest_for(expired_subs + batch)
     
     try:
         while True:
             try:
-                await asyncio.sleep(CLEANUP_INTERVAL_SECONDS)
+                await scheduler.wait_until_due()
                 
-                # Получаем список истекших подписок перед удалением
-                expired_subs = await SubscriptionRepository.get_expired()
+                started = time.perf_counter()
+                digest_messages = 0
                 
-                if expired_subs:
-                    # Уведомляем админов об истечении подписки
-                    for sub in expired_subs:
-                        user_id_hash = sub['user_id']
-                        
-                        # Уведомляем админов
-                        await notification_service.notify_admins_subscription_expired(
-                            config.admin_chat_ids,
-                            user_id_hash
-                        )
-                        logger.info(f"📢 Админы уведомлены об истечении подписки {user_id_hash[:16]}...")
-                    
-                    # Удаляем истекшие подписки
-                    deleted_count = await SubscriptionRepository.delete_expired()
-                    logger.info(f"🗑️ Удалено истекших подписок: {deleted_count}")
+                # Удаляем истекшие подписки пачками, получая удаленные строки
+                while True:
+                    batch = await SubscriptionRepository.pop_expired(batch_size, digest)
+                    for sub in batch:
+                        invalidate_access(sub['user_id'])
+                    expired_subs.extend(batch)
+                    if len(batch) < batch_size:
+                        break
+                # Сводка за цикл записана вместе с последней пачкой
+                expired, expired_subs = expired_subs, []
+                scheduler.mark_processed()
+                LAST_CYCLE_EXPIRED.set(len(expired))
+                
+                if expired:
+                    pages = digest_messages // max(1, len(config.admin_chat_ids))
+                    EXPIRED_SUBSCRIPTIONS.inc(len(expired))
+                    DIGEST_PAGES.inc(digest_messages)
+                    CLEANUP_CYCLE_SECONDS.observe(time.perf_counter() - started)
+                    logger.info(
+                        f"🗑️ Удалено истекших подписок: {len(expired)}, "
+                        f"сводка админам поставлена в очередь (сообщений на админа: {pages})"
+                    )
             
             except asyncio.CancelledError:
                 # Позволяем задаче корректно завершиться при отмене
@@ -45,6 +106,13 @@ async def subscription_cleanup_task(bot: Bot):
             
             except Exception as e:
                 logger.error(f"Ошибка в задаче очистки подписок: {e}")
+                # Пачки, удаленные до ошибки, не должны остаться без сводки
+                if expired_subs:
+                    try:
+                        await OutboxRepository.enqueue_now(digest_for(expired_subs))
+                    except Exception as digest_error:
+                        logger.error(f"Не удалось поставить сводку об истекших подписках: {digest_error}")
+                    expired_subs = []
                 # Продолжаем работу даже после ошибки
                 await asyncio.sleep(CLEANUP_INTERVAL_SECONDS)
     
@@ -0,0 +1,22 @@
+import asyncio
+import logging
+from app.clients import perplexity
+
+logger = logging.getLogger(__name__)
+
+
+async def perplexity_keepalive_task(interval: float):
+    """Фоновая задача: не дает соединениям с Perplexity закрыться при простое"""
+    logger.info(f"🔥 Запущен keep-alive соединений с Perplexity (каждые {interval:.0f} с)")
+    
+    try:
+        while True:
+            await asyncio.sleep(interval)
+            
+            # Если запросы и так идут, соединения уже горячие
+            if perplexity.idle_seconds() >= interval:
+                await perplexity.warm_up()
+    
+    except asyncio.CancelledError:
+        logger.info("✅ Keep-alive соединений с Perplexity остановлен")
+        raise
@@ -0,0 +1,156 @@
+import asyncio
+import logging
+from typing import Optional
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+from app.config import config
+from app.db.repositories.outbox import OutboxRepository
+from app.models.outbox import OutboxRecord
+from app.services.notifications import NotificationService
+from app.services.outbound import outbound_priority
+from app.utils.metrics import registry, ERRORS
+
+logger = logging.getLogger(__name__)
+
+# Взятое на доставку уведомление снова станет доступно через это время,
+# если процесс упадет до записи результата
+OUTBOX_LEASE_SECONDS = 120
+OUTBOX_RETRY_BASE_DELAY_SECONDS = 5
+OUTBOX_RETRY_MAX_DELAY_SECONDS = 900
+
+OUTBOX_DELIVERED = registry.counter(
+    "factchecker_outbox_delivered_total",
+    "Notifications delivered from the outbox",
+    ("kind",)
+)
+OUTBOX_RETRIES = registry.counter(
+    "factchecker_outbox_retries_total",
+    "Notification deliveries rescheduled after an error",
+    ("kind",)
+)
+OUTBOX_FAILED = registry.counter(
+    "factchecker_outbox_failed_total",
+    "Notifications given up on (blocked bot, bad request or retries exhausted)",
+    ("kind",)
+)
+OUTBOX_DELAY_SECONDS = registry.histogram(
+    "factchecker_outbox_delivery_delay_seconds",
+    "Time from enqueueing a notification to its delivery"
+)
+
+_wakeup: Optional[asyncio.Event] = None
+
+
+def wake_outbox() -> None:
+    """Будит задачу доставки (в процессах без нее ничего не делает)"""
+    if _wakeup is not None:
+        _wakeup.set()
+
+
+def _retry_delay(attempts: int) -> float:
+    return min(OUTBOX_RETRY_MAX_DELAY_SECONDS, OUTBOX_RETRY_BASE_DELAY_SECONDS * 2 ** (attempts - 1))
+
+
+async def _deliver(bot: Bot, record: OutboxRecord) -> Optional[Exception]:
+    """Отправляет одно уведомление, возвращает ошибку или None"""
+    try:
+        text, parse_mode = NotificationService.render(record["kind"], record["payload"])
+        with outbound_priority(record["priority"]):
+            await bot.send_message(record["chat_id"], text, parse_mode=parse_mode)
+        return None
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        return e
+
+
+async def deliver_batch(bot: Bot, records: list[OutboxRecord], concurrency: int) -> None:
+    """Доставляет пачку параллельно и записывает результаты одной транзакцией"""
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    
+    async def deliver(record: OutboxRecord) -> Optional[Exception]:
+        async with semaphore:
+            return await _deliver(bot, record)
+    
+    errors = await asyncio.gather(*(deliver(record) for record in records))
+    
+    delivered: list[int] = []
+    retries: list[tuple[int, float, str]] = []
+    failed: list[tuple[int, str]] = []
+    for record, error in zip(records, errors):
+        kind = record["kind"]
+        if error is None:
+            delivered.append(record["id"])
+            OUTBOX_DELIVERED.inc(kind=kind)
+            continue
+        
+        # Пользователь заблокировал бота, чат не найден, неизвестный вид - повтор не поможет
+        permanent = isinstance(error, (TelegramForbiddenError, TelegramBadRequest, KeyError, ValueError))
+        if permanent or record["attempts"] >= config.outbox_max_attempts:
+            failed.append((record["id"], str(error)))
+            OUTBOX_FAILED.inc(kind=kind)
+            logger.error(
+                f"Уведомление #{record['id']} ({kind}) для {record['chat_id']} не доставлено "
+                f"после {record['attempts']} попыток: {error}"
+            )
+            continue
+        
+        delay = error.retry_after if isinstance(error, TelegramRetryAfter) else _retry_delay(record["attempts"])
+        retries.append((record["id"], delay, str(error)))
+        OUTBOX_RETRIES.inc(kind=kind)
+        logger.warning(f"Уведомление #{record['id']} ({kind}): {error}; повтор через {delay} с")
+    
+    for delay in await OutboxRepository.complete(delivered, retries, failed):
+        OUTBOX_DELAY_SECONDS.observe(delay)
+
+
+async def notification_outbox_task(bot: Bot):
+    """
+    Фоновая задача доставки уведомлений из outbox
+    
+    Берет готовые к отправке записи пачками и отправляет их параллельно.
+    Ошибки Telegram откладывают запись с экспоненциальной задержкой, после
+    OUTBOX_MAX_ATTEMPTS попыток запись помечается failed_at. Задача
+    просыпается по событию OUTBOX_ENQUEUED (LISTEN/NOTIFY) или к ближайшей
+    повторной попытке, но не реже OUTBOX_POLL_SECONDS.
+    """
+    global _wakeup
+    logger.info("📬 Запущена фоновая задача доставки уведомлений")
+    _wakeup = asyncio.Event()
+    batch_size = max(1, config.outbox_batch_size)
+    
+    try:
+        while True:
+            try:
+                # Сбрасываем до выборки: событие во время доставки не потеряется
+                _wakeup.clear()
+                
+                records = await OutboxRepository.claim(batch_size, OUTBOX_LEASE_SECONDS)
+                if records:
+                    await deliver_batch(bot, records, config.outbox_concurrency)
+                    if len(records) == batch_size:
+                        continue
+                
+                timeout = config.outbox_poll_seconds
+                next_attempt_in = await OutboxRepository.seconds_until_next_attempt()
+                if next_attempt_in is not None:
+                    # Не меньше секунды: просроченные записи могут быть взяты другой репликой
+                    timeout = min(timeout, max(1.0, next_attempt_in))
+                
+                try:
+                    await asyncio.wait_for(_wakeup.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+            
+            except asyncio.CancelledError:
+                raise
+            
+            except Exception as e:
+                ERRORS.inc(component="outbox")
+                logger.error(f"Ошибка в задаче доставки уведомлений: {e}")
+                await asyncio.sleep(config.outbox_poll_seconds)
+    
+    except asyncio.CancelledError:
+        _wakeup = None
+        logger.info("✅ Задача доставки уведомлений остановлена")
+        raise
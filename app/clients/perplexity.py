@@ -1,26 +1,241 @@
+import asyncio
+import hashlib
+import importlib.util
 import logging
+import time
+from contextlib import aclosing, nullcontext
+import httpx
 from openai import AsyncOpenAI
-from typing import Optional
+from typing import AsyncContextManager, AsyncIterator, Awaitable, Callable, Optional
+
+from app.clients.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    LatencyTracker,
+    backoff_delay,
+    is_retryable
+)
+from app.utils.metrics import ERRORS, registry
+from app.utils.minhash import Fingerprint, NearDuplicateIndex
+from app.utils.text import normalize_claim
+from app.utils.ttl_cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
+BASE_URL = "https://api.perplexity.ai"
+
 _client: Optional[AsyncOpenAI] = None
+_http_client: Optional[httpx.AsyncClient] = None
+_base_url: str = BASE_URL
+_last_activity: float = 0.0
 _system_prompt: Optional[str] = None
+_system_prompt_hash: str = ""
+
+# Устойчивость к сбоям API
+_request_timeout: float = 60
+_max_retries: int = 2
+_retry_base_delay: float = 0.5
+_retry_max_delay: float = 8
+_hedge_enabled: bool = False
+_hedge_min_delay: float = 2.0
+_breaker = CircuitBreaker()
+_latency = LatencyTracker()
+
+# Позиция в очереди (0 - очередь дошла до запроса) и вход в очередь с таким уведомлением
+PositionCallback = Callable[[int], Awaitable[None]]
+Gate = Callable[[PositionCallback], AsyncContextManager]
+
+TRY_LATER_TEXT = "⏳ Сервис проверки сейчас перегружен. Пожалуйста, попробуйте позже."
+
+FACT_CHECK_SECONDS = registry.histogram(
+    "factchecker_fact_check_seconds",
+    "check_fact/stream_fact latency by answer source",
+    ("mode", "source")
+)
+UPSTREAM_REQUEST_SECONDS = registry.histogram(
+    "factchecker_upstream_request_seconds",
+    "Single Perplexity API attempt latency",
+    ("mode", "outcome")
+)
+
+# Кэш успешных ответов: ключ - хеш нормализованного утверждения и system prompt
+_response_cache: TTLCache[str, str] = TTLCache(max_size=1000, ttl=1800, weigher=len, max_weight=10_000_000)
 
+# Индекс похожих утверждений (перефразировки, другие эмодзи/ссылки)
+_near_index: Optional[NearDuplicateIndex] = None
+# Сигнатура текста длиннее этого считается вне event loop (~1 мс на 1000 символов)
+_FINGERPRINT_INLINE_CHARS = 1000
 
-def init_client(api_key: str) -> AsyncOpenAI:
-    """Инициализирует Perplexity AI клиент"""
-    global _client
+
+def init_client(
+    api_key: str,
+    *,
+    base_url: str = BASE_URL,
+    max_connections: int = 20,
+    max_keepalive_connections: int = 10,
+    keepalive_expiry: float = 90,
+    http2: bool = False,
+    timeout: float = 60,
+    connect_timeout: float = 10
+) -> AsyncOpenAI:
+    """
+    Инициализирует Perplexity AI клиент на общем httpx транспорте
+    
+    Args:
+        api_key: API ключ Perplexity
+        base_url: Адрес OpenAI-совместимого API (по умолчанию Perplexity)
+        max_connections: Максимум соединений к API
+        max_keepalive_connections: Сколько простаивающих соединений держать открытыми
+        keepalive_expiry: Через сколько секунд простоя закрывать соединение
+        http2: Использовать HTTP/2 (нужен пакет h2)
+        timeout: Таймаут запроса по умолчанию
+        connect_timeout: Таймаут установки соединения
+    """
+    global _client, _http_client, _base_url
+    
+    if http2 and importlib.util.find_spec("h2") is None:
+        logger.warning("HTTP/2 недоступен: пакет h2 не установлен (pip install 'httpx[http2]'), используется HTTP/1.1")
+        http2 = False
+    
+    _http_client = httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        ),
+        timeout=httpx.Timeout(timeout, connect=connect_timeout)
+    )
+    _base_url = base_url
     _client = AsyncOpenAI(
         api_key=api_key,
-        base_url="https://api.perplexity.ai"
+        base_url=base_url,
+        http_client=_http_client,
+        # Повторы делает _complete/_complete_stream
+        max_retries=0
     )
     return _client
 
 
+async def close_client() -> None:
+    """Закрывает HTTP соединения клиента"""
+    global _client, _http_client
+    if _client:
+        await _client.close()
+        _client = None
+        _http_client = None
+
+
+async def warm_up() -> bool:
+    """
+    Открывает (или поддерживает) соединение с API заранее
+    
+    Любой ответ сервера подходит - важно, что TCP/TLS соединение
+    осталось в пуле и следующий запрос не платит за handshake.
+    """
+    global _last_activity
+    if _http_client is None:
+        return False
+    
+    try:
+        response = await _http_client.get(_base_url)
+        _last_activity = time.monotonic()
+        logger.debug(f"Прогрев соединения с Perplexity: HTTP {response.status_code} ({response.http_version})")
+        return True
+    except httpx.HTTPError as e:
+        logger.warning(f"Не удалось прогреть соединение с Perplexity: {e}")
+        return False
+
+
+def idle_seconds() -> float:
+    """Сколько секунд не было обращений к API"""
+    return time.monotonic() - _last_activity
+
+
+def init_resilience(
+    timeout: float = 60,
+    max_retries: int = 2,
+    retry_base_delay: float = 0.5,
+    retry_max_delay: float = 8,
+    breaker_threshold: int = 5,
+    breaker_reset_timeout: float = 30,
+    hedge_enabled: bool = False,
+    hedge_min_delay: float = 2.0
+) -> None:
+    """
+    Настраивает повторы, circuit breaker и hedged-запросы
+    
+    Args:
+        timeout: Таймаут одного запроса к API в секундах
+        max_retries: Повторов при 429/5xx/сетевых ошибках
+        retry_base_delay: Базовая задержка экспоненциального backoff
+        retry_max_delay: Максимальная задержка между повторами
+        breaker_threshold: Ошибок подряд до размыкания breaker
+        breaker_reset_timeout: Сколько секунд breaker остается разомкнутым
+        hedge_enabled: Дублировать медленный запрос после p95 латентности
+        hedge_min_delay: Минимальная задержка перед дублирующим запросом
+    """
+    global _request_timeout, _max_retries, _retry_base_delay, _retry_max_delay
+    global _hedge_enabled, _hedge_min_delay, _breaker
+    _request_timeout = timeout
+    _max_retries = max_retries
+    _retry_base_delay = retry_base_delay
+    _retry_max_delay = retry_max_delay
+    _hedge_enabled = hedge_enabled
+    _hedge_min_delay = hedge_min_delay
+    _breaker = CircuitBreaker(breaker_threshold, breaker_reset_timeout)
+
+
+def get_breaker_state() -> str:
+    """Возвращает состояние circuit breaker (closed/open/half_open)"""
+    return _breaker.state
+
+
+def init_response_cache(max_size: int = 1000, ttl: float = 1800, max_chars: int = 10_000_000) -> None:
+    """
+    Настраивает кэш ответов
+    
+    Args:
+        max_size: Максимум ответов в кэше (0 - кэш отключен)
+        ttl: Время жизни ответа в секундах
+        max_chars: Ограничение суммарного размера ответов (в символах)
+    """
+    global _response_cache
+    _response_cache = TTLCache(max_size=max_size, ttl=ttl, weigher=len, max_weight=max_chars)
+
+
+def init_near_duplicate_index(
+    capacity: int = 10_000,
+    threshold: float = 0.8,
+    ttl: float = 6 * 3600,
+    max_bytes: int = 10_000_000
+) -> None:
+    """
+    Включает поиск ответа по похожим утверждениям
+    
+    Args:
+        capacity: Сколько последних проверенных утверждений хранить
+        threshold: Минимальное сходство (Jaccard по словесным биграммам), 0..1
+        ttl: Сколько секунд ответ считается актуальным
+        max_bytes: Ограничение суммарного размера сжатых ответов в байтах
+    """
+    global _near_index
+    _near_index = NearDuplicateIndex(capacity=capacity, threshold=threshold, ttl=ttl, max_bytes=max_bytes)
+
+
+def get_near_duplicate_stats() -> dict:
+    """Возвращает статистику индекса похожих утверждений"""
+    return _near_index.stats() if _near_index else {}
+
+
+def get_response_cache_stats() -> dict:
+    """Возвращает статистику кэша ответов"""
+    return _response_cache.stats()
+
+
 def load_system_prompt(file_path: str = "system_prompt.txt") -> str:
     """Загружает system prompt из файла"""
-    global _system_prompt
+    global _system_prompt, _system_prompt_hash
     
     if _system_prompt:
         return _system_prompt
@@ -28,6 +243,7 @@ def load_system_prompt(file_path: str = "system_prompt.txt") -> str:
     try:
         with open(file_path, "r", encoding="utf-8") as f:
             _system_prompt = f.read()
+            _system_prompt_hash = hashlib.sha256(_system_prompt.encode("utf-8")).hexdigest()
             return _system_prompt
     except FileNotFoundError:
         logger.error(f"Файл {file_path} не найден")
@@ -37,26 +253,413 @@ def load_system_prompt(file_path: str = "system_prompt.txt") -> str:
         raise
 
 
-async def check_fact(user_message: str) -> str:
-    """Проверяет факт через Perplexity AI"""
+def _cache_key(user_message: str) -> str:
+    """Ключ кэша: смена system prompt автоматически делает старые ответы недоступными"""
+    normalized = normalize_claim(user_message)
+    return hashlib.sha256(f"{_system_prompt_hash}:{normalized}".encode("utf-8")).hexdigest()
+
+
+def _build_messages(user_message: str) -> list[dict]:
+    return [
+        {"role": "system", "content": _system_prompt},
+        {"role": "user", "content": user_message}
+    ]
+
+
+def _ensure_initialized() -> None:
     if not _client:
         raise RuntimeError("Perplexity client не инициализирован")
     
     if not _system_prompt:
         raise RuntimeError("System prompt не загружен")
+
+
+async def _request_completion(user_message: str) -> str:
+    """Запрос к sonar-pro; ошибки пробрасываются вызывающему коду"""
+    global _last_activity
+    _last_activity = time.monotonic()
+    response = await _client.chat.completions.create(  # type: ignore[union-attr]
+        model="sonar-pro",
+        messages=_build_messages(user_message),  # type: ignore[arg-type]
+        max_tokens=2000,
+        temperature=0.2,
+        timeout=_request_timeout
+    )
+    return response.choices[0].message.content or ""
+
+
+async def _request_completion_stream(user_message: str) -> AsyncIterator[str]:
+    """Потоковый запрос к sonar-pro (stream=True), отдает фрагменты текста"""
+    global _last_activity
+    _last_activity = time.monotonic()
+    stream = await _client.chat.completions.create(  # type: ignore[union-attr]
+        model="sonar-pro",
+        messages=_build_messages(user_message),  # type: ignore[arg-type]
+        max_tokens=2000,
+        temperature=0.2,
+        stream=True,
+        timeout=_request_timeout
+    )
+    # Ответ закрывается и при досрочной остановке потребителя или отмене,
+    # иначе соединение остается занятым в пуле httpx
+    async with stream:
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+async def _hedged_completion(user_message: str) -> str:
+    """
+    Запрос с дублированием: если ответ не пришел за p95 латентности,
+    отправляется второй такой же запрос, используется первый успешный
+    """
+    p95 = _latency.p95()
+    if not _hedge_enabled or p95 is None:
+        return await _request_completion(user_message)
     
+    primary = asyncio.create_task(_request_completion(user_message))
+    pending = {primary}
+    # Отмена вызывающего (single-flight без подписчиков, остановка бота)
+    # отменяет и все еще идущие запросы к API
     try:
-        response = await _client.chat.completions.create(
-            model="sonar-pro",
-            messages=[
-                {"role": "system", "content": _system_prompt},
-                {"role": "user", "content": user_message}
-            ],
-            max_tokens=2000,
-            temperature=0.2
-        )
-        
-        return response.choices[0].message.content or "Нет ответа от AI"
+        done, pending = await asyncio.wait(pending, timeout=max(p95, _hedge_min_delay))
+        if done:
+            return primary.result()
+        
+        logger.info(f"Запрос к Perplexity дольше p95 ({p95:.1f} с), отправлен дублирующий")
+        pending.add(asyncio.create_task(_request_completion(user_message)))
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error  # type: ignore[misc]
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def _complete(user_message: str) -> str:
+    """Запрос к API с повторами и circuit breaker"""
+    attempt = 0
+    while True:
+        if not _breaker.allow_request():
+            raise CircuitOpenError("Perplexity API временно недоступен")
+        
+        started = time.monotonic()
+        try:
+            content = await _hedged_completion(user_message)
+        except asyncio.CancelledError:
+            _breaker.release_probe()
+            raise
+        except Exception as e:
+            UPSTREAM_REQUEST_SECONDS.observe(time.monotonic() - started, mode="complete", outcome="error")
+            ERRORS.inc(component="perplexity")
+            if not is_retryable(e):
+                # Ошибка запроса (401/403/400), а не сбой сервиса: состояние breaker не меняем
+                _breaker.release_probe()
+                raise
+            _breaker.record_failure()
+            if attempt >= _max_retries:
+                raise
+            delay = backoff_delay(attempt, _retry_base_delay, _retry_max_delay)
+            logger.warning(f"Perplexity: {e}; повтор {attempt + 1}/{_max_retries} через {delay:.1f} с")
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
+        
+        elapsed = time.monotonic() - started
+        UPSTREAM_REQUEST_SECONDS.observe(elapsed, mode="complete", outcome="ok")
+        _breaker.record_success()
+        _latency.record(elapsed)
+        return content
+
+
+async def _complete_stream(user_message: str) -> AsyncIterator[str]:
+    """Потоковый запрос с повторами (только пока не получен первый фрагмент)"""
+    attempt = 0
+    while True:
+        if not _breaker.allow_request():
+            raise CircuitOpenError("Perplexity API временно недоступен")
+        
+        received = False
+        started = time.monotonic()
+        try:
+            async with aclosing(_request_completion_stream(user_message)) as deltas:
+                async for delta in deltas:
+                    received = True
+                    yield delta
+        except (asyncio.CancelledError, GeneratorExit):
+            _breaker.release_probe()
+            raise
+        except Exception as e:
+            UPSTREAM_REQUEST_SECONDS.observe(time.monotonic() - started, mode="stream", outcome="error")
+            ERRORS.inc(component="perplexity")
+            if not is_retryable(e):
+                _breaker.release_probe()
+                raise
+            _breaker.record_failure()
+            if received or attempt >= _max_retries:
+                raise
+            delay = backoff_delay(attempt, _retry_base_delay, _retry_max_delay)
+            logger.warning(f"Perplexity stream: {e}; повтор {attempt + 1}/{_max_retries} через {delay:.1f} с")
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
+        
+        UPSTREAM_REQUEST_SECONDS.observe(time.monotonic() - started, mode="stream", outcome="ok")
+        _breaker.record_success()
+        return
+
+
+class _Flight:
+    """
+    Один запрос к API, на который подписаны все одинаковые запросы
+    
+    Фрагменты ответа накапливаются, каждый подписчик читает их со своей позиции.
+    Позицию в очереди получают только текущие подписчики: ушедший пользователь
+    (в том числе тот, кто запустил запрос) больше не получает уведомлений.
+    """
+    
+    def __init__(self, key: str, fingerprint: Optional[Fingerprint] = None):
+        self.key = key
+        self.fingerprint = fingerprint
+        self.parts: list[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.watchers: list[PositionCallback] = []
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+    
+    def append(self, delta: str) -> None:
+        self.parts.append(delta)
+        self._notify()
+    
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        self.done = True
+        self.error = error
+        self._notify()
+    
+    async def report_position(self, position: int) -> None:
+        await asyncio.gather(*(watcher(position) for watcher in list(self.watchers)), return_exceptions=True)
+    
+    async def wait_changed(self) -> None:
+        await self._changed.wait()
+    
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+
+# Запросы в процессе выполнения: ключ кэша -> общий запрос
+_inflight: dict[str, _Flight] = {}
+
+
+async def _run_flight(flight: _Flight, user_message: str, stream: bool, gate: Optional[Gate]) -> None:
+    """Выполняет запрос к API и раздает результат подписчикам"""
+    try:
+        # При разомкнутом breaker не занимаем место в очереди
+        if _breaker.is_open:
+            raise CircuitOpenError("Perplexity API временно недоступен")
+        
+        async with gate(flight.report_position) if gate else nullcontext():
+            if stream:
+                async with aclosing(_complete_stream(user_message)) as deltas:
+                    async for delta in deltas:
+                        flight.append(delta)
+            else:
+                content = await _complete(user_message)
+                if content:
+                    flight.append(content)
+    except Exception as e:
+        _inflight.pop(flight.key, None)
+        flight.finish(e)
+        return
+    except BaseException:
+        _inflight.pop(flight.key, None)
+        # Отмена запроса (например, при остановке бота) - обычная ошибка для
+        # подписчиков: их самих не отменяли, и они должны завершить ответ
+        flight.finish(RuntimeError("запрос к Perplexity отменен"))
+        raise
+    
+    _inflight.pop(flight.key, None)
+    content = "".join(flight.parts)
+    # В кэш попадают только успешные непустые ответы
+    if content:
+        _response_cache.set(flight.key, content)
+        if _near_index:
+            _near_index.add(flight.fingerprint, content)
+    flight.finish()
+
+
+async def _subscribe(
+    key: str,
+    user_message: str,
+    stream: bool,
+    gate: Optional[Gate],
+    fingerprint: Optional[Fingerprint] = None,
+    on_position: Optional[PositionCallback] = None
+) -> AsyncIterator[str]:
+    """
+    Подписывается на запрос к API с таким же ключом или запускает новый
+    
+    Запрос к API отменяется, только когда уходит последний подписчик.
+    gate используется только тем, кто запускает запрос, но позицию в очереди
+    получают все подписчики, пока они ждут ответа (on_position).
+    """
+    flight = _inflight.get(key)
+    if flight is None:
+        flight = _Flight(key, fingerprint)
+        flight.task = asyncio.create_task(_run_flight(flight, user_message, stream, gate))
+        _inflight[key] = flight
+    
+    flight.subscribers += 1
+    if on_position is not None:
+        flight.watchers.append(on_position)
+    try:
+        index = 0
+        while True:
+            while index < len(flight.parts):
+                yield flight.parts[index]
+                index += 1
+            if flight.done:
+                if flight.error is not None:
+                    raise flight.error
+                return
+            await flight.wait_changed()
+    finally:
+        flight.subscribers -= 1
+        if on_position is not None:
+            flight.watchers.remove(on_position)
+        if flight.subscribers == 0 and not flight.done and flight.task:
+            _inflight.pop(key, None)
+            flight.task.cancel()
+
+
+async def _lookup_cached(key: str, user_message: str) -> tuple[Optional[str], Optional[Fingerprint]]:
+    """
+    Ищет готовый ответ: точное совпадение, затем похожее утверждение
+    
+    Возвращает ответ и сигнатуру утверждения, чтобы при промахе не считать
+    её повторно при добавлении в индекс. Ответ на похожее утверждение не
+    копируется в кэш точных ответов: иначе он пережил бы свой TTL в индексе.
+    Сигнатура длинного текста считается в потоке, чтобы не задерживать
+    остальные апдейты.
+    """
+    cached = _response_cache.get(key)
+    if cached is not None or _near_index is None:
+        return cached, None
+    
+    if len(user_message) > _FINGERPRINT_INLINE_CHARS:
+        fingerprint = await asyncio.to_thread(_near_index.fingerprint, user_message)
+    else:
+        fingerprint = _near_index.fingerprint(user_message)
+    return _near_index.lookup(fingerprint), fingerprint
+
+
+def _fallback_answer(key: str) -> str:
+    """Ответ при разомкнутом breaker: устаревший ответ из кэша или просьба подождать"""
+    stale = _response_cache.get_stale(key)
+    if stale is not None:
+        logger.info("Perplexity недоступен, отдан ответ из кэша")
+        return stale
+    return TRY_LATER_TEXT
+
+
+async def check_fact(
+    user_message: str,
+    gate: Optional[Gate] = None,
+    on_position: Optional[PositionCallback] = None
+) -> str:
+    """
+    Проверяет факт через Perplexity AI (с кэшем ответов и поиском похожих утверждений)
+    
+    Одинаковые запросы, пришедшие одновременно, ждут один общий запрос к API.
+    
+    Args:
+        user_message: Текст утверждения
+        gate: Фабрика контекста, в который входим только перед запросом к API
+            (например, слот планировщика) - ответы из кэша его не ждут.
+            Получает функцию, рассылающую позицию в очереди подписчикам
+        on_position: Вызывается с позицией в очереди, пока запрос ждет слот
+    """
+    _ensure_initialized()
+    
+    started = time.perf_counter()
+    source = "upstream"
+    try:
+        key = _cache_key(user_message)
+        cached, fingerprint = await _lookup_cached(key, user_message)
+        if cached is not None:
+            source = "cache"
+            return cached
+        
+        try:
+            parts = [delta async for delta in _subscribe(key, user_message, False, gate, fingerprint, on_position)]
+        except CircuitOpenError:
+            source = "fallback"
+            return _fallback_answer(key)
+        except Exception as e:
+            logger.error(f"Ошибка при проверке факта: {e}")
+            stale = _response_cache.get_stale(key)
+            if stale is not None and is_retryable(e):
+                source = "fallback"
+                return stale
+            source = "error"
+            return f"❌ Произошла ошибка при проверке: {str(e)}"
+        
+        return "".join(parts) or "Нет ответа от AI"
+    finally:
+        FACT_CHECK_SECONDS.observe(time.perf_counter() - started, mode="complete", source=source)
+
+
+async def stream_fact(
+    user_message: str,
+    gate: Optional[Gate] = None,
+    on_position: Optional[PositionCallback] = None
+) -> AsyncIterator[str]:
+    """
+    Проверяет факт через Perplexity AI в потоковом режиме
+    
+    Отдает фрагменты ответа по мере генерации. Ответ из кэша отдается
+    одним фрагментом. При ошибке последним фрагментом идет текст ошибки.
+    gate и on_position - как в check_fact; слот удерживается на всё время генерации.
+    """
+    _ensure_initialized()
+    
+    started = time.perf_counter()
+    key = _cache_key(user_message)
+    cached, fingerprint = await _lookup_cached(key, user_message)
+    if cached is not None:
+        FACT_CHECK_SECONDS.observe(time.perf_counter() - started, mode="stream", source="cache")
+        yield cached
+        return
+    
+    source = "upstream"
+    has_content = False
+    subscription = _subscribe(key, user_message, True, gate, fingerprint, on_position)
+    try:
+        async for delta in subscription:
+            has_content = True
+            yield delta
+    except CircuitOpenError:
+        source = "fallback"
+        if not has_content:
+            yield _fallback_answer(key)
+        return
     except Exception as e:
-        logger.error(f"Ошибка при проверке факта: {e}")
-        return f"❌ Произошла ошибка при проверке: {str(e)}"
+        source = "error"
+        logger.error(f"Ошибка при потоковой проверке факта: {e}")
+        prefix = "\n\n" if has_content else ""
+        yield f"{prefix}❌ Произошла ошибка при проверке: {str(e)}"
+        return
+    finally:
+        await subscription.aclose()
+        # Время до конца генерации (без учета отправки ответа в Telegram)
+        FACT_CHECK_SECONDS.observe(time.perf_counter() - started, mode="stream", source=source)
+    
+    if not has_content:
+        yield "Нет ответа от AI"
@@ -0,0 +1,110 @@
+"""
+Устойчивость запросов к внешним API: повторы с джиттером, circuit breaker
+и оценка латентности для hedged-запросов.
+"""
+import random
+import time
+from collections import deque
+from typing import Optional
+
+import openai
+
+
+class CircuitOpenError(Exception):
+    """Circuit breaker разомкнут - запрос не отправляется"""
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Ошибки, после которых имеет смысл повторить запрос: 429, 5xx, сеть, таймаут"""
+    if isinstance(error, (openai.APIConnectionError, openai.RateLimitError)):
+        # APITimeoutError - подкласс APIConnectionError
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code >= 500
+    return False
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Экспоненциальная задержка с полным джиттером (attempt с 0)"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker: closed -> open -> half-open -> closed
+
+    После failure_threshold ошибок подряд запросы отклоняются reset_timeout
+    секунд. Затем пропускается один пробный запрос: успех замыкает цепь,
+    ошибка снова размыкает.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+    @property
+    def is_open(self) -> bool:
+        """Разомкнут ли breaker (без изменения состояния)"""
+        return (
+            self.state == self.OPEN
+            and time.monotonic() - self.opened_at < self.reset_timeout
+        )
+
+    def allow_request(self) -> bool:
+        """Можно ли отправить запрос сейчас"""
+        if self.state == self.CLOSED:
+            return True
+
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+
+        # half-open: только один пробный запрос
+        if self._probe_in_flight:
+            return False
+        self._probe_in_flight = True
+        return True
+
+    def release_probe(self) -> None:
+        """Запрос отменен без результата - пробный слот снова свободен"""
+        self._probe_in_flight = False
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """Скользящее окно латентностей успешных запросов для оценки p95"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples: deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def p95(self) -> Optional[float]:
+        """p95 в секундах или None, если данных пока мало"""
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
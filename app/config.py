@@ -1,4 +1,5 @@
 import os
+import re
 import logging
 from typing import Optional
 from pydantic import BaseModel, Field, field_validator
@@ -23,6 +24,95 @@ class Config(BaseModel):
     robokassa_password2: str = Field(..., description="Robokassa Password #2 (for webhooks)")
     robokassa_is_test: bool = Field(default=True, description="Robokassa test mode")
     
+    # Пул соединений PostgreSQL
+    db_pool_min_size: int = Field(default=1, description="Min pool connections")
+    db_pool_max_size: int = Field(default=10, description="Max pool connections")
+    db_command_timeout: float = Field(default=60, description="Default query timeout in seconds")
+    db_acquire_timeout: float = Field(default=10, description="Pool acquire timeout in seconds")
+    db_max_inactive_lifetime: float = Field(default=300, description="Idle connection lifetime in seconds")
+    db_statement_cache_size: int = Field(default=100, description="Prepared statement cache size per connection")
+    
+    # Хеширование user ID
+    hash_executor: str = Field(default="thread", description="Executor for scrypt hashing: thread or process")
+    hash_workers: int = Field(default=4, description="Max concurrent scrypt computations")
+    hash_cache_size: int = Field(default=10000, description="Max cached user ID hashes (0 disables cache)")
+    hash_cache_ttl: int = Field(default=3600, description="TTL of cached user ID hashes in seconds")
+    
+    # Кэш подписок в памяти
+    entitlement_cache_size: int = Field(default=10000, description="Max cached subscription entries (0 disables cache)")
+    entitlement_cache_ttl: int = Field(default=300, description="Max TTL of a cached active subscription in seconds")
+    entitlement_negative_ttl: int = Field(default=30, description="TTL of a cached 'no subscription' result in seconds")
+    
+    # Кэш ответов Perplexity
+    fact_cache_size: int = Field(default=1000, description="Max cached fact-check answers (0 disables cache)")
+    fact_cache_ttl: int = Field(default=1800, description="TTL of a cached fact-check answer in seconds")
+    fact_cache_max_chars: int = Field(default=10_000_000, description="Total size limit of cached answers in characters")
+    
+    # HTTP транспорт Perplexity
+    perplexity_base_url: str = Field(default="https://api.perplexity.ai", description="Base URL of the OpenAI-compatible Perplexity API")
+    perplexity_max_connections: int = Field(default=20, description="Max HTTP connections to Perplexity")
+    perplexity_max_keepalive: int = Field(default=10, description="Max idle keep-alive connections to Perplexity")
+    perplexity_keepalive_expiry: float = Field(default=90, description="Idle seconds before a connection is closed")
+    perplexity_http2: bool = Field(default=False, description="Use HTTP/2 (requires the h2 package)")
+    perplexity_connect_timeout: float = Field(default=10, description="Connect timeout in seconds")
+    perplexity_keepalive_interval: float = Field(default=60, description="Idle keep-alive ping interval in seconds (0 disables)")
+    
+    # Устойчивость запросов к Perplexity
+    perplexity_timeout: float = Field(default=60, description="Per-request Perplexity timeout in seconds")
+    perplexity_max_retries: int = Field(default=2, description="Retries on 429/5xx/network errors")
+    perplexity_retry_base_delay: float = Field(default=0.5, description="Base delay for jittered exponential backoff")
+    perplexity_retry_max_delay: float = Field(default=8, description="Max delay between retries")
+    perplexity_breaker_threshold: int = Field(default=5, description="Consecutive failures that open the circuit breaker")
+    perplexity_breaker_reset: float = Field(default=30, description="Seconds the circuit breaker stays open")
+    perplexity_hedge_enabled: bool = Field(default=False, description="Send a hedged request after p95 latency")
+    perplexity_hedge_min_delay: float = Field(default=2.0, description="Min delay before a hedged request")
+    
+    # Ограничение запросов к Perplexity
+    fact_check_concurrency: int = Field(default=8, description="Max concurrent upstream fact-check requests")
+    
+    # Поиск ответа по похожим утверждениям (MinHash/LSH)
+    near_dup_enabled: bool = Field(default=True, description="Reuse answers for near-duplicate claims")
+    near_dup_threshold: float = Field(default=0.8, description="Min word-bigram Jaccard similarity to reuse an answer")
+    near_dup_capacity: int = Field(default=10000, description="Number of recent verified claims kept in the index")
+    near_dup_max_bytes: int = Field(default=10_000_000, description="Total size limit of stored compressed answers in bytes")
+    near_dup_ttl: int = Field(default=21600, description="Seconds a near-duplicate answer stays reusable")
+    
+    # Потоковые ответы
+    streaming_enabled: bool = Field(default=True, description="Stream answers into the placeholder message")
+    stream_edit_interval: float = Field(default=1.0, description="Min seconds between placeholder edits while streaming")
+    
+    # Получение апдейтов Telegram
+    telegram_api_url: Optional[str] = Field(default=None, description="Base URL of a self-hosted Bot API server (default api.telegram.org)")
+    bot_mode: str = Field(default="polling", description="How updates are received: polling or webhook")
+    webhook_url: Optional[str] = Field(default=None, description="Public HTTPS base URL of the webhook server")
+    webhook_path: str = Field(default="/telegram/webhook", description="Path of the Telegram webhook route")
+    webhook_secret: Optional[str] = Field(default=None, description="Secret token checked on every webhook request")
+    webhook_max_connections: int = Field(default=40, description="Max simultaneous webhook connections from Telegram")
+    
+    # Метрики Prometheus: отдельный сервер, не публичный порт 5000
+    metrics_host: str = Field(default="127.0.0.1", description="Bind address of the /metrics server")
+    metrics_port: int = Field(default=9100, description="Port of the /metrics server (worker i uses port + 1 + i)")
+    
+    # Исходящие вызовы Telegram (лимиты Bot API)
+    outbound_global_rate: float = Field(default=30, description="Max Bot API calls to chats per second for the whole bot")
+    outbound_chat_rate: float = Field(default=1, description="Max calls per second to one private chat")
+    outbound_chat_burst: int = Field(default=3, description="Short burst allowed per private chat")
+    outbound_group_rate_per_minute: float = Field(default=20, description="Max calls per minute to one group")
+    outbound_max_retries: int = Field(default=3, description="Retries after a 429 with retry_after")
+    
+    expiry_load_limit: int = Field(default=10000, description="Upcoming expirations kept in the in-memory schedule")
+    expiry_resync_seconds: float = Field(default=600, description="Safety re-scan interval of the expiry schedule")
+    cleanup_batch_size: int = Field(default=500, description="Expired subscriptions deleted per query")
+    
+    # Очередь уведомлений (outbox)
+    outbox_batch_size: int = Field(default=50, description="Notifications claimed per delivery batch")
+    outbox_concurrency: int = Field(default=5, description="Max parallel sends within a batch")
+    outbox_max_attempts: int = Field(default=8, description="Delivery attempts before a notification is marked failed")
+    outbox_poll_seconds: float = Field(default=5.0, description="Max sleep between outbox checks")
+    
+    # Несколько процессов-обработчиков
+    workers: int = Field(default=1, description="Worker processes handling updates (1 - single process)")
+    
     log_level: str = Field(default="INFO", description="Logging level")
     
     @field_validator('admin_chat_ids', mode='before')
@@ -33,6 +123,32 @@ class Config(BaseModel):
             return [int(id.strip()) for id in v.split(",")]
         return v
     
+    @field_validator('hash_executor')
+    @classmethod
+    def validate_hash_executor(cls, v: str) -> str:
+        """Проверяет тип пула для хеширования"""
+        v = v.lower()
+        if v not in ("thread", "process"):
+            raise ValueError("HASH_EXECUTOR должен быть 'thread' или 'process'")
+        return v
+    
+    @field_validator('bot_mode')
+    @classmethod
+    def validate_bot_mode(cls, v: str) -> str:
+        """Проверяет режим получения апдейтов"""
+        v = v.lower()
+        if v not in ("polling", "webhook"):
+            raise ValueError("BOT_MODE должен быть 'polling' или 'webhook'")
+        return v
+    
+    @field_validator('webhook_secret')
+    @classmethod
+    def validate_webhook_secret(cls, v: Optional[str]) -> Optional[str]:
+        """Telegram допускает в secret_token только A-Z, a-z, 0-9, _ и - (до 256 символов)"""
+        if v and not re.fullmatch(r"[A-Za-z0-9_-]{1,256}", v):
+            raise ValueError("WEBHOOK_SECRET может содержать только A-Z, a-z, 0-9, _ и - (до 256 символов)")
+        return v
+    
     @classmethod
     def from_env(cls) -> "Config":
         """Создает конфиг из переменных окружения с валидацией"""
@@ -48,6 +164,11 @@ class Config(BaseModel):
         robokassa_pass2 = os.getenv("ROBOKASSA_PASSWORD2")
         robokassa_test = os.getenv("ROBOKASSA_IS_TEST", "True").lower() == "true"
         
+        # Режим получения апдейтов
+        bot_mode = os.getenv("BOT_MODE", "polling").lower()
+        webhook_url = os.getenv("WEBHOOK_URL")
+        webhook_secret = os.getenv("WEBHOOK_SECRET")
+        
         if not telegram_token:
             raise ValueError("TELEGRAM_BOT_TOKEN не установлен")
         if not perplexity_key:
@@ -64,6 +185,10 @@ class Config(BaseModel):
             raise ValueError("ROBOKASSA_PASSWORD1 не установлен")
         if not robokassa_pass2:
             raise ValueError("ROBOKASSA_PASSWORD2 не установлен")
+        if bot_mode == "webhook" and not webhook_url:
+            raise ValueError("WEBHOOK_URL не установлен. Укажите публичный HTTPS адрес сервера для BOT_MODE=webhook")
+        if bot_mode == "webhook" and not webhook_secret:
+            raise ValueError("WEBHOOK_SECRET не установлен. Укажите секрет для проверки запросов от Telegram")
         
         # Парсим admin_ids через validator
         parsed_ids = cls.parse_admin_ids(admin_ids)
@@ -78,6 +203,66 @@ class Config(BaseModel):
             robokassa_password1=robokassa_pass1,
             robokassa_password2=robokassa_pass2,
             robokassa_is_test=robokassa_test,
+            db_pool_min_size=int(os.getenv("DB_POOL_MIN_SIZE", "1")),
+            db_pool_max_size=int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+            db_command_timeout=float(os.getenv("DB_COMMAND_TIMEOUT", "60")),
+            db_acquire_timeout=float(os.getenv("DB_ACQUIRE_TIMEOUT", "10")),
+            db_max_inactive_lifetime=float(os.getenv("DB_MAX_INACTIVE_LIFETIME", "300")),
+            db_statement_cache_size=int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100")),
+            hash_executor=os.getenv("HASH_EXECUTOR", "thread"),
+            hash_workers=int(os.getenv("HASH_WORKERS", "4")),
+            hash_cache_size=int(os.getenv("HASH_CACHE_SIZE", "10000")),
+            hash_cache_ttl=int(os.getenv("HASH_CACHE_TTL", "3600")),
+            entitlement_cache_size=int(os.getenv("ENTITLEMENT_CACHE_SIZE", "10000")),
+            entitlement_cache_ttl=int(os.getenv("ENTITLEMENT_CACHE_TTL", "300")),
+            entitlement_negative_ttl=int(os.getenv("ENTITLEMENT_NEGATIVE_TTL", "30")),
+            fact_cache_size=int(os.getenv("FACT_CACHE_SIZE", "1000")),
+            fact_cache_ttl=int(os.getenv("FACT_CACHE_TTL", "1800")),
+            fact_cache_max_chars=int(os.getenv("FACT_CACHE_MAX_CHARS", "10000000")),
+            perplexity_base_url=os.getenv("PERPLEXITY_BASE_URL", "https://api.perplexity.ai"),
+            perplexity_max_connections=int(os.getenv("PERPLEXITY_MAX_CONNECTIONS", "20")),
+            perplexity_max_keepalive=int(os.getenv("PERPLEXITY_MAX_KEEPALIVE", "10")),
+            perplexity_keepalive_expiry=float(os.getenv("PERPLEXITY_KEEPALIVE_EXPIRY", "90")),
+            perplexity_http2=os.getenv("PERPLEXITY_HTTP2", "False").lower() == "true",
+            perplexity_connect_timeout=float(os.getenv("PERPLEXITY_CONNECT_TIMEOUT", "10")),
+            perplexity_keepalive_interval=float(os.getenv("PERPLEXITY_KEEPALIVE_INTERVAL", "60")),
+            perplexity_timeout=float(os.getenv("PERPLEXITY_TIMEOUT", "60")),
+            perplexity_max_retries=int(os.getenv("PERPLEXITY_MAX_RETRIES", "2")),
+            perplexity_retry_base_delay=float(os.getenv("PERPLEXITY_RETRY_BASE_DELAY", "0.5")),
+            perplexity_retry_max_delay=float(os.getenv("PERPLEXITY_RETRY_MAX_DELAY", "8")),
+            perplexity_breaker_threshold=int(os.getenv("PERPLEXITY_BREAKER_THRESHOLD", "5")),
+            perplexity_breaker_reset=float(os.getenv("PERPLEXITY_BREAKER_RESET", "30")),
+            perplexity_hedge_enabled=os.getenv("PERPLEXITY_HEDGE_ENABLED", "False").lower() == "true",
+            perplexity_hedge_min_delay=float(os.getenv("PERPLEXITY_HEDGE_MIN_DELAY", "2.0")),
+            fact_check_concurrency=int(os.getenv("FACT_CHECK_CONCURRENCY", "8")),
+            near_dup_enabled=os.getenv("NEAR_DUP_ENABLED", "True").lower() == "true",
+            near_dup_threshold=float(os.getenv("NEAR_DUP_THRESHOLD", "0.8")),
+            near_dup_capacity=int(os.getenv("NEAR_DUP_CAPACITY", "10000")),
+            near_dup_max_bytes=int(os.getenv("NEAR_DUP_MAX_BYTES", "10000000")),
+            near_dup_ttl=int(os.getenv("NEAR_DUP_TTL", "21600")),
+            streaming_enabled=os.getenv("STREAMING_ENABLED", "True").lower() == "true",
+            stream_edit_interval=float(os.getenv("STREAM_EDIT_INTERVAL", "1.0")),
+            telegram_api_url=os.getenv("TELEGRAM_API_URL") or None,
+            bot_mode=bot_mode,
+            webhook_url=webhook_url,
+            webhook_path=os.getenv("WEBHOOK_PATH", "/telegram/webhook"),
+            webhook_secret=webhook_secret,
+            webhook_max_connections=int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40")),
+            metrics_host=os.getenv("METRICS_HOST", "127.0.0.1"),
+            metrics_port=int(os.getenv("METRICS_PORT", "9100")),
+            outbound_global_rate=float(os.getenv("OUTBOUND_GLOBAL_RATE", "30")),
+            outbound_chat_rate=float(os.getenv("OUTBOUND_CHAT_RATE", "1")),
+            outbound_chat_burst=int(os.getenv("OUTBOUND_CHAT_BURST", "3")),
+            outbound_group_rate_per_minute=float(os.getenv("OUTBOUND_GROUP_RATE_PER_MINUTE", "20")),
+            outbound_max_retries=int(os.getenv("OUTBOUND_MAX_RETRIES", "3")),
+            expiry_load_limit=int(os.getenv("EXPIRY_LOAD_LIMIT", "10000")),
+            expiry_resync_seconds=float(os.getenv("EXPIRY_RESYNC_SECONDS", "600")),
+            cleanup_batch_size=int(os.getenv("CLEANUP_BATCH_SIZE", "500")),
+            outbox_batch_size=int(os.getenv("OUTBOX_BATCH_SIZE", "50")),
+            outbox_concurrency=int(os.getenv("OUTBOX_CONCURRENCY", "5")),
+            outbox_max_attempts=int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8")),
+            outbox_poll_seconds=float(os.getenv("OUTBOX_POLL_SECONDS", "5")),
+            workers=int(os.getenv("WORKERS", "1")),
             log_level=os.getenv("LOG_LEVEL", "INFO")
         )
 
@@ -25,4 +25,8 @@ DURATION_DESCRIPTIONS = {
 
 # Лимиты
 MAX_MESSAGE_LENGTH = 4096  # Максимальная длина сообщения в Telegram
-CLEANUP_INTERVAL_SECONDS = 60  # Интервал очистки подписок (1 минута)
+CLEANUP_INTERVAL_SECONDS = 60  # Пауза задачи очистки после ошибки (1 минута)
+
+# Приоритеты исходящих вызовов Telegram и уведомлений outbox (меньше - важнее)
+INTERACTIVE = 0  # Ответы пользователям
+BACKGROUND = 1  # Уведомления админам
@@ -0,0 +1,35 @@
+"""
+События изменения данных для синхронизации кэшей между репликами бота.
+Публикуются через PostgreSQL NOTIFY, принимаются фоновой задачей LISTEN.
+"""
+import json
+import uuid
+import asyncpg
+
+# Канал PostgreSQL для событий кэша
+CACHE_EVENTS_CHANNEL = "factchecker_cache_events"
+
+# Уникальный ID процесса - свои события слушатель пропускает
+INSTANCE_ID = uuid.uuid4().hex
+
+# Типы событий
+SUBSCRIPTION_UPDATED = "subscription_updated"
+SUBSCRIPTION_DELETED = "subscription_deleted"
+SUBSCRIPTIONS_CLEARED = "subscriptions_cleared"
+# Новые уведомления в outbox (обрабатывается и в процессе-отправителе)
+OUTBOX_ENQUEUED = "outbox_enqueued"
+
+
+async def publish_event(conn: asyncpg.Connection, event_type: str, **fields) -> None:
+    """
+    Публикует событие через pg_notify
+    
+    Если вызвано внутри транзакции, событие будет доставлено только после COMMIT.
+    
+    Args:
+        conn: Соединение, на котором выполнялось изменение
+        event_type: Тип события (SUBSCRIPTION_UPDATED и т.д.)
+        **fields: Данные события (должны сериализоваться в JSON)
+    """
+    payload = json.dumps({"type": event_type, "origin": INSTANCE_ID, **fields})
+    await conn.execute("SELECT pg_notify($1, $2)", CACHE_EVENTS_CHANNEL, payload)
@@ -1,22 +1,156 @@
+import asyncio
 import asyncpg
+import time
 from typing import Optional
 import logging
+from app.utils.metrics import registry
 
 logger = logging.getLogger(__name__)
 
-_pool: Optional[asyncpg.Pool] = None
+_pool: Optional["InstrumentedPool"] = None
+_database_url: Optional[str] = None
 
+DB_QUERY_SECONDS = registry.histogram(
+    "factchecker_db_query_seconds",
+    "Repository query latency (pool acquire and query, without hashing or cache hits)",
+    ("query",)
+)
+DB_ACQUIRE_SECONDS = registry.histogram(
+    "factchecker_db_acquire_seconds",
+    "Time spent waiting for a pool connection"
+)
 
-async def init_pool(database_url: str) -> asyncpg.Pool:
+# Горячие запросы чтения и безопасные аргументы для прогрева каждого соединения
+_warmup_queries: list[tuple[str, tuple]] = []
+
+
+class _InstrumentedAcquire:
+    """Контекстный менеджер acquire() с замером ожидания соединения"""
+
+    __slots__ = ('_owner', '_timeout', '_conn')
+
+    def __init__(self, owner: "InstrumentedPool", timeout: Optional[float]):
+        self._owner = owner
+        self._timeout = timeout
+        self._conn: Optional[asyncpg.Connection] = None
+
+    async def __aenter__(self) -> asyncpg.Connection:
+        owner = self._owner
+        timeout = self._timeout if self._timeout is not None else owner.default_acquire_timeout
+
+        # Ожидающим считается только acquire() при исчерпанном пуле: свободных
+        # соединений нет и новое открыть нельзя. Оценка до вызова acquire, без
+        # учета тех, кто уже взял свободное соединение, но еще не получил его
+        pool = owner.pool
+        blocked = not pool.get_idle_size() and pool.get_size() >= pool.get_max_size()
+        if blocked:
+            owner.waiters += 1
+        started = time.perf_counter()
+        try:
+            self._conn = await owner.pool.acquire(timeout=timeout)
+            return self._conn
+        except asyncio.TimeoutError:
+            owner.acquire_timeouts += 1
+            raise
+        finally:
+            if blocked:
+                owner.waiters -= 1
+            elapsed = time.perf_counter() - started
+            DB_ACQUIRE_SECONDS.observe(elapsed)
+            owner.acquire_count += 1
+            owner.acquire_time_total += elapsed
+            owner.acquire_time_max = max(owner.acquire_time_max, elapsed)
+
+    async def __aexit__(self, *exc_info) -> None:
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            await self._owner.pool.release(conn)
+
+
+class InstrumentedPool:
+    """
+    Пул asyncpg со статистикой ожидания соединений
+
+    Обертка над публичным API asyncpg.Pool: acquire() считает задачи,
+    ждущие соединения исчерпанного пула (waiters), время получения
+    соединения и таймауты. Если timeout в acquire() не
+    указан, применяется default_acquire_timeout. Остальные методы
+    (close, get_size, ...) вызываются у пула asyncpg напрямую.
+    """
+
+    def __init__(self, pool: asyncpg.Pool, default_acquire_timeout: Optional[float] = None):
+        self.pool = pool
+        self.default_acquire_timeout = default_acquire_timeout
+        self.waiters = 0
+        self.acquire_count = 0
+        self.acquire_timeouts = 0
+        self.acquire_time_total = 0.0
+        self.acquire_time_max = 0.0
+
+    def acquire(self, *, timeout: Optional[float] = None) -> _InstrumentedAcquire:
+        return _InstrumentedAcquire(self, timeout)
+
+    def __getattr__(self, name: str):
+        return getattr(self.pool, name)
+
+
+def register_warmup_query(query: str, *args) -> str:
+    """
+    Регистрирует запрос чтения для прогрева каждого нового соединения
+
+    args - аргументы, с которыми запрос выполняется при прогреве (например,
+    несуществующий хеш пользователя). Возвращает сам запрос, чтобы его можно
+    было объявить константой: SELECT_SQL = register_warmup_query("SELECT ...", "")
+    """
+    if all(registered != query for registered, _ in _warmup_queries):
+        _warmup_queries.append((query, args))
+    return query
+
+
+async def _init_connection(conn: asyncpg.Connection) -> None:
+    """
+    Выполняет горячие запросы чтения на новом соединении
+
+    Запрос выполняется через fetch(), поэтому попадает в кэш statement'ов
+    соединения, которым пользуются fetch/fetchrow/fetchval (conn.prepare()
+    этот кэш не заполняет). Отсутствующая таблица (миграция еще не
+    применена) не мешает открыть пул.
+    """
+    for query, args in _warmup_queries:
+        try:
+            await conn.fetch(query, *args)
+        except asyncpg.UndefinedTableError as e:
+            logger.warning(f"Прогрев запроса пропущен: {e}")
+
+
+async def init_pool(
+    database_url: str,
+    *,
+    min_size: int = 1,
+    max_size: int = 10,
+    command_timeout: float = 60,
+    acquire_timeout: Optional[float] = None,
+    max_inactive_lifetime: float = 300.0,
+    statement_cache_size: int = 100
+) -> InstrumentedPool:
     """Инициализирует пул соединений с PostgreSQL"""
-    global _pool
-    _pool = await asyncpg.create_pool(
-        database_url, 
-        min_size=1, 
-        max_size=10,
-        command_timeout=60
+    global _pool, _database_url
+    _database_url = database_url
+    pool = await asyncpg.create_pool(
+        database_url,
+        min_size=min_size,
+        max_size=max_size,
+        max_queries=50000,
+        max_inactive_connection_lifetime=max_inactive_lifetime,
+        init=_init_connection if statement_cache_size > 0 else None,
+        command_timeout=command_timeout,
+        statement_cache_size=statement_cache_size
+    )
+    _pool = InstrumentedPool(pool, default_acquire_timeout=acquire_timeout)
+    logger.info(
+        f"✅ Подключение к базе данных установлено "
+        f"(пул {min_size}-{max_size}, запросов для прогрева: {len(_warmup_queries)})"
     )
-    logger.info("✅ Подключение к базе данных установлено")
     return _pool
 
 
@@ -29,8 +163,47 @@ async def close_pool() -> None:
         logger.info("🔒 Соединение с базой данных закрыто")
 
 
-def get_pool() -> asyncpg.Pool:
+def get_pool() -> InstrumentedPool:
     """Получает текущий пул соединений"""
     if _pool is None:
         raise RuntimeError("Database pool не инициализирован")
     return _pool
+
+
+def get_pool_stats() -> dict:
+    """
+    Возвращает текущее состояние пула
+
+    Returns:
+        size, max_size, in_use, idle, waiters, acquire_count, acquire_timeouts,
+        acquire_avg_ms, acquire_max_ms (пустой dict, если пул не создан)
+    """
+    if _pool is None:
+        return {}
+
+    size = _pool.get_size()
+    idle = _pool.get_idle_size()
+    count = _pool.acquire_count
+    return {
+        "size": size,
+        "max_size": _pool.get_max_size(),
+        "in_use": size - idle,
+        "idle": idle,
+        "waiters": _pool.waiters,
+        "acquire_count": count,
+        "acquire_timeouts": _pool.acquire_timeouts,
+        "acquire_avg_ms": round(_pool.acquire_time_total / count * 1000, 3) if count else 0.0,
+        "acquire_max_ms": round(_pool.acquire_time_max * 1000, 3)
+    }
+
+
+async def connect_dedicated() -> asyncpg.Connection:
+    """
+    Открывает отдельное соединение вне пула
+
+    Нужно для LISTEN: соединение с подписками нельзя возвращать в пул.
+    Вызывающий код сам закрывает соединение.
+    """
+    if _database_url is None:
+        raise RuntimeError("Database pool не инициализирован")
+    return await asyncpg.connect(_database_url)
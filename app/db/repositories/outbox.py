@@ -0,0 +1,173 @@
+"""Репозиторий очереди уведомлений (transactional outbox)"""
+import json
+from typing import Optional, Sequence
+import asyncpg
+from app.db.events import publish_event, OUTBOX_ENQUEUED
+from app.db.pool import get_pool, DB_QUERY_SECONDS
+from app.models.outbox import OutboxMessage, OutboxRecord
+from app.utils.metrics import timed
+
+
+class OutboxRepository:
+    """
+    Уведомления записываются в notification_outbox в той же транзакции, что
+    и изменение, о котором они сообщают; доставляет их фоновая задача
+    app.background.outbox. Запись удаляется после успешной отправки.
+    
+    next_attempt_at везде считается по часам БД (now() AT TIME ZONE 'UTC'),
+    как и DEFAULT колонки: иначе при расхождении часов приложения и БД
+    записи из SETTLE_PAYMENT_SQL ждали бы, пока часы не сойдутся.
+    """
+    
+    @staticmethod
+    async def enqueue(conn: asyncpg.Connection, messages: Sequence[OutboxMessage]) -> None:
+        """
+        Добавляет уведомления в outbox на соединении вызывающего кода
+        
+        Вызывается внутри транзакции изменения: уведомление появится только
+        вместе с ним, а воркер будет разбужен после COMMIT.
+        """
+        if not messages:
+            return
+        
+        await conn.execute(
+            """
+            INSERT INTO notification_outbox (chat_id, kind, payload, priority)
+            SELECT * FROM unnest($1::bigint[], $2::text[], $3::jsonb[], $4::smallint[])
+            """,
+            [message["chat_id"] for message in messages],
+            [message["kind"] for message in messages],
+            [json.dumps(message["payload"], default=str) for message in messages],
+            [message["priority"] for message in messages]
+        )
+        await publish_event(conn, OUTBOX_ENQUEUED)
+    
+    @staticmethod
+    @timed(DB_QUERY_SECONDS, query="outbox.enqueue")
+    async def enqueue_now(messages: Sequence[OutboxMessage]) -> None:
+        """Добавляет уведомления, не связанные с изменением данных"""
+        pool = get_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                await OutboxRepository.enqueue(conn, messages)
+    
+    @staticmethod
+    @timed(DB_QUERY_SECONDS, query="outbox.claim")
+    async def claim(limit: int, lease_seconds: float) -> list[OutboxRecord]:
+        """
+        Берет до limit уведомлений, готовых к отправке
+        
+        Взятые записи откладываются на lease_seconds: если процесс упадет
+        во время доставки, их заберет следующий проход. SKIP LOCKED позволяет
+        нескольким репликам разбирать очередь без дублей.
+        """
+        pool = get_pool()
+        
+        async with pool.acquire() as conn:
+            rows = await conn.fetch(
+                """
+                UPDATE notification_outbox
+                SET attempts = attempts + 1, next_attempt_at = (now() AT TIME ZONE 'UTC') + $2::float8 * interval '1 second'
+                WHERE id IN (
+                    SELECT id
+                    FROM notification_outbox
+                    WHERE failed_at IS NULL AND next_attempt_at <= (now() AT TIME ZONE 'UTC')
+                    ORDER BY priority, next_attempt_at
+                    LIMIT $1
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id, chat_id, kind, payload, priority, attempts, created_at
+                """,
+                limit,
+                float(lease_seconds)
+            )
+        
+        records = [dict(row) for row in rows]
+        for record in records:
+            record["payload"] = json.loads(record["payload"])
+        records.sort(key=lambda record: (record["priority"], record["id"]))
+        return records  # type: ignore
+    
+    @staticmethod
+    @timed(DB_QUERY_SECONDS, query="outbox.complete")
+    async def complete(
+        delivered: Sequence[int],
+        retries: Sequence[tuple[int, float, str]],
+        failed: Sequence[tuple[int, str]]
+    ) -> list[float]:
+        """
+        Записывает результаты доставки одной пачки
+        
+        Args:
+            delivered: ID отправленных уведомлений (удаляются)
+            retries: (ID, через сколько секунд повторить, ошибка)
+            failed: (ID, ошибка) - больше не отправляются, остаются для разбора
+        
+        Returns:
+            Секунды от постановки в очередь до доставки для каждого
+            отправленного уведомления (по часам БД, как и created_at)
+        """
+        pool = get_pool()
+        delays: list[float] = []
+        
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                if delivered:
+                    rows = await conn.fetch(
+                        """
+                        DELETE FROM notification_outbox
+                        WHERE id = ANY($1::bigint[])
+                        RETURNING EXTRACT(EPOCH FROM (now() AT TIME ZONE 'UTC') - created_at)::float8 AS delay
+                        """,
+                        list(delivered)
+                    )
+                    delays = [row["delay"] for row in rows]
+                if retries:
+                    await conn.execute(
+                        """
+                        UPDATE notification_outbox AS o
+                        SET next_attempt_at = (now() AT TIME ZONE 'UTC') + r.delay * interval '1 second', last_error = r.error
+                        FROM unnest($1::bigint[], $2::float8[], $3::text[]) AS r(id, delay, error)
+                        WHERE o.id = r.id
+                        """,
+                        [item[0] for item in retries],
+                        [item[1] for item in retries],
+                        [item[2] for item in retries]
+                    )
+                if failed:
+                    await conn.execute(
+                        """
+                        UPDATE notification_outbox AS o
+                        SET failed_at = (now() AT TIME ZONE 'UTC'), last_error = f.error
+                        FROM unnest($1::bigint[], $2::text[]) AS f(id, error)
+                        WHERE o.id = f.id
+                        """,
+                        [item[0] for item in failed],
+                        [item[1] for item in failed]
+                    )
+        
+        return delays
+    
+    @staticmethod
+    @timed(DB_QUERY_SECONDS, query="outbox.seconds_until_next_attempt")
+    async def seconds_until_next_attempt() -> Optional[float]:
+        """Сколько секунд (по часам БД) до ближайшей попытки доставки (None - очередь пуста)"""
+        pool = get_pool()
+        async with pool.acquire() as conn:
+            return await conn.fetchval(
+                """
+                SELECT EXTRACT(EPOCH FROM min(next_attempt_at) - (now() AT TIME ZONE 'UTC'))::float8
+                FROM notification_outbox
+                WHERE failed_at IS NULL
+                """
+            )
+    
+    @staticmethod
+    @timed(DB_QUERY_SECONDS, query="outbox.count_pending")
+    async def count_pending() -> int:
+        """Количество недоставленных уведомлений"""
+        pool = get_pool()
+        async with pool.acquire() as conn:
+            return await conn.fetchval(
+                "SELECT count(*) FROM notification_outbox WHERE failed_at IS NULL"
+            )
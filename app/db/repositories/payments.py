@@ -1,16 +1,112 @@
 """Репозиторий для работы с платежами"""
-import asyncpg
 from typing import Optional
 from decimal import Decimal
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from app.constants import INTERACTIVE
+from app.db.events import CACHE_EVENTS_CHANNEL, INSTANCE_ID, SUBSCRIPTION_UPDATED, OUTBOX_ENQUEUED
+from app.db.pool import InstrumentedPool, register_warmup_query, DB_QUERY_SECONDS
+from app.models.outbox import PAYMENT_CONFIRMED
+from app.utils.entitlement_cache import store_access
+from app.utils.expiry_scheduler import schedule_expiry
+from app.utils.metrics import timed
+
+INSERT_PAYMENT_SQL = """
+    INSERT INTO payments (user_id, amount, duration, status, telegram_user_id)
+    VALUES ($1, $2, $3, 'pending', $4)
+    RETURNING invoice_id
+"""
+# Горячий запрос (выполняется с invoice_id 0 при открытии каждого соединения пула)
+SELECT_PAYMENT_SQL = register_warmup_query(
+    """
+    SELECT invoice_id, user_id, amount, duration, status, telegram_user_id, created_at, paid_at
+    FROM payments
+    WHERE invoice_id = $1
+    """,
+    0
+)
+# Проведение оплаты одним запросом: платеж помечается оплаченным только из
+# статуса pending, срок тарифа берется из переданных массивов ($3, $4, по
+# умолчанию $5), подписка продлевается от max(текущий срок, now),
+# подтверждение пользователю записывается в outbox, события
+# SUBSCRIPTION_UPDATED и OUTBOX_ENQUEUED (в формате publish_event) уходят
+# после COMMIT. Повторный ResultURL ждет блокировку строки платежа и не
+# находит pending.
+SETTLE_PAYMENT_SQL = """
+    WITH paid AS (
+        UPDATE payments
+        SET status = 'paid', paid_at = CURRENT_TIMESTAMP
+        WHERE invoice_id = $1 AND status = 'pending'
+        RETURNING invoice_id, user_id, amount, duration, telegram_user_id
+    ),
+    granted AS (
+        INSERT INTO subscriptions (user_id, expires_at, created_at)
+        SELECT
+            paid.user_id,
+            $2::timestamp + COALESCE(
+                (
+                    SELECT terms.term
+                    FROM unnest($3::text[], $4::interval[]) AS terms(duration, term)
+                    WHERE terms.duration = paid.duration
+                ),
+                $5::interval
+            ),
+            $2::timestamp
+        FROM paid
+        ON CONFLICT (user_id)
+        DO UPDATE SET expires_at = GREATEST(subscriptions.expires_at, $2::timestamp)
+            + (EXCLUDED.expires_at - $2::timestamp)
+        RETURNING user_id, expires_at
+    ),
+    confirmation AS (
+        INSERT INTO notification_outbox (chat_id, kind, payload, priority)
+        SELECT
+            paid.telegram_user_id,
+            $9::text,
+            jsonb_build_object(
+                'invoice_id', paid.invoice_id,
+                'duration', paid.duration,
+                'amount', paid.amount::text,
+                'expires_at', granted.expires_at
+            ),
+            $10::smallint
+        FROM paid
+        JOIN granted USING (user_id)
+        WHERE paid.telegram_user_id IS NOT NULL
+        RETURNING id
+    )
+    SELECT
+        paid.invoice_id,
+        paid.user_id,
+        paid.amount,
+        paid.duration,
+        paid.telegram_user_id,
+        granted.expires_at,
+        pg_notify(
+            $6::text,
+            json_build_object(
+                'type', $7::text,
+                'origin', $8::text,
+                'user_id', granted.user_id,
+                'expires_at', granted.expires_at
+            )::text
+        ) AS subscription_event,
+        (
+            SELECT pg_notify($6::text, json_build_object('type', $11::text, 'origin', $8::text)::text)
+            FROM confirmation
+            LIMIT 1
+        ) AS outbox_event
+    FROM paid
+    JOIN granted USING (user_id)
+"""
 
 
 class PaymentRepository:
     """Репозиторий для работы с платежами"""
     
-    def __init__(self, pool: asyncpg.Pool):
+    def __init__(self, pool: InstrumentedPool):
         self.pool = pool
     
+    @timed(DB_QUERY_SECONDS, query="payments.create_payment")
     async def create_payment(
         self,
         user_id: str,
@@ -32,40 +128,61 @@ class PaymentRepository:
         """
         async with self.pool.acquire() as conn:
             invoice_id = await conn.fetchval(
-                """
-                INSERT INTO payments (user_id, amount, duration, status, telegram_user_id)
-                VALUES ($1, $2, $3, 'pending', $4)
-                RETURNING invoice_id
-                """,
+                INSERT_PAYMENT_SQL,
                 user_id, amount, duration, telegram_user_id
             )
             return invoice_id
     
+    @timed(DB_QUERY_SECONDS, query="payments.get_payment")
     async def get_payment(self, invoice_id: int) -> Optional[dict]:
         """Получить платеж по ID"""
         async with self.pool.acquire() as conn:
-            result = await conn.fetchrow(
-                """
-                SELECT invoice_id, user_id, amount, duration, status, created_at, paid_at
-                FROM payments
-                WHERE invoice_id = $1
-                """,
-                invoice_id
-            )
+            result = await conn.fetchrow(SELECT_PAYMENT_SQL, invoice_id)
             return dict(result) if result else None
     
-    async def mark_as_paid(self, invoice_id: int) -> None:
-        """Отметить платеж как оплаченный"""
+    @timed(DB_QUERY_SECONDS, query="payments.settle")
+    async def settle(
+        self,
+        invoice_id: int,
+        terms: dict[str, timedelta],
+        default_term: timedelta
+    ) -> Optional[dict]:
+        """
+        Проводит оплату: платеж -> paid, выдача подписки и подтверждение
+        пользователю (через outbox) в одной транзакции
+        
+        Один запрос на одном соединении: оплата не может быть отмечена без
+        выдачи подписки, а повторная доставка ResultURL ничего не меняет.
+        
+        Args:
+            invoice_id: ID платежа
+            terms: Срок подписки для тарифа платежа (1m, 6m, 1y)
+            default_term: Срок для неизвестного тарифа
+        
+        Returns:
+            invoice_id, user_id, amount, duration, telegram_user_id, expires_at
+            или None, если платеж не найден или уже не в статусе pending
+        """
+        now_naive = datetime.now(timezone.utc).replace(tzinfo=None)
+        
         async with self.pool.acquire() as conn:
-            await conn.execute(
-                """
-                UPDATE payments
-                SET status = 'paid', paid_at = CURRENT_TIMESTAMP
-                WHERE invoice_id = $1
-                """,
-                invoice_id
+            result = await conn.fetchrow(
+                SETTLE_PAYMENT_SQL,
+                invoice_id, now_naive, list(terms), list(terms.values()), default_term,
+                CACHE_EVENTS_CHANNEL, SUBSCRIPTION_UPDATED, INSTANCE_ID,
+                PAYMENT_CONFIRMED, INTERACTIVE, OUTBOX_ENQUEUED
             )
+        
+        if not result:
+            return None
+        
+        settled = dict(result)
+        del settled["subscription_event"], settled["outbox_event"]
+        store_access(settled["user_id"], settled["expires_at"])
+        schedule_expiry(settled["user_id"], settled["expires_at"])
+        return settled
     
+    @timed(DB_QUERY_SECONDS, query="payments.mark_as_failed")
     async def mark_as_failed(self, invoice_id: int) -> None:
         """Отметить платеж как неудавшийся"""
         async with self.pool.acquire() as conn:
@@ -78,6 +195,7 @@ class PaymentRepository:
                 invoice_id
             )
     
+    @timed(DB_QUERY_SECONDS, query="payments.get_user_payments")
     async def get_user_payments(self, user_id: str) -> list[dict]:
         """Получить все платежи пользователя"""
         async with self.pool.acquire() as conn:
@@ -1,10 +1,33 @@
 from datetime import datetime, timezone
-from typing import Optional
+from typing import Callable, Optional, Sequence
 import asyncpg
-from app.db.pool import get_pool
+from app.db.pool import get_pool, register_warmup_query, DB_QUERY_SECONDS
+from app.db.events import (
+    publish_event,
+    SUBSCRIPTION_UPDATED,
+    SUBSCRIPTION_DELETED,
+    SUBSCRIPTIONS_CLEARED
+)
+from app.db.repositories.outbox import OutboxRepository
+from app.models.outbox import OutboxMessage
 from app.models.subscription import SubscriptionRecord
-from app.utils.crypto import hash_user_id
+from app.utils.crypto import hash_user_id_async
+from app.utils.entitlement_cache import (
+    get_cached_access,
+    store_access,
+    clear_access_cache
+)
+from app.utils.expiry_scheduler import schedule_expiry, cancel_expiry, clear_expiries
 from app.config import config
+from app.utils.metrics import timed
+
+# Горячие запросы (выполняются с пустым хешем при открытии каждого соединения пула)
+SELECT_EXPIRES_AT_SQL = register_warmup_query(
+    "SELECT expires_at FROM subscriptions WHERE user_id = $1", ""
+)
+SELECT_BY_HASH_SQL = register_warmup_query(
+    "SELECT user_id, expires_at, created_at FROM subscriptions WHERE user_id = $1", ""
+)
 
 
 class SubscriptionRepository:
@@ -12,63 +35,99 @@ class SubscriptionRepository:
     
     @staticmethod
     async def check_active(user_id: int) -> bool:
-        """Проверяет наличие активной подписки"""
+        """Проверяет наличие активной подписки (сначала по кэшу)"""
+        hashed_id = await hash_user_id_async(user_id, config.hash_salt)
+        return await SubscriptionRepository.check_active_by_hash(hashed_id)
+    
+    @staticmethod
+    async def check_active_by_hash(hashed_id: str) -> bool:
+        """Проверяет наличие активной подписки по хешу (сначала по кэшу)"""
+        cached = get_cached_access(hashed_id)
+        if cached is not None:
+            return cached
+        
+        # В гистограмму запросов попадает только обращение к БД, без попаданий в кэш
         pool = get_pool()
-        hashed_id = hash_user_id(user_id, config.hash_salt)
+        with DB_QUERY_SECONDS.time(query="subscriptions.check_active_by_hash"):
+            async with pool.acquire() as conn:
+                result = await conn.fetchrow(SELECT_EXPIRES_AT_SQL, hashed_id)
         
-        async with pool.acquire() as conn:
-            result = await conn.fetchrow(
-                "SELECT expires_at FROM subscriptions WHERE user_id = $1",
-                hashed_id
-            )
-            
-            if not result:
-                return False
-            
-            # БД возвращает naive datetime (UTC), сравниваем с naive UTC
-            expires_at = result['expires_at']
-            now_utc_naive = datetime.now(timezone.utc).replace(tzinfo=None)
-            return now_utc_naive < expires_at
+        if not result:
+            store_access(hashed_id, None)
+            return False
+        
+        # БД возвращает naive datetime (UTC), сравниваем с naive UTC
+        expires_at = result['expires_at']
+        store_access(hashed_id, expires_at)
+        now_utc_naive = datetime.now(timezone.utc).replace(tzinfo=None)
+        return now_utc_naive < expires_at
     
     @staticmethod
     async def create_or_update(
         user_id: int, 
-        expires_at: datetime
+        expires_at: datetime,
+        outbox: Sequence[OutboxMessage] = ()
     ) -> None:
-        """Создает или обновляет подписку"""
+        """Создает или обновляет подписку (outbox - уведомления в той же транзакции)"""
         pool = get_pool()
-        hashed_id = hash_user_id(user_id, config.hash_salt)
+        hashed_id = await hash_user_id_async(user_id, config.hash_salt)
         
-        # Конвертируем в naive UTC datetime для PostgreSQL TIMESTAMP
-        naive_expires = expires_at.replace(tzinfo=None) if expires_at.tzinfo else expires_at
+        # Конвертируем в naive UTC datetime для PostgreSQL TIMESTAMP: одно и то же
+        # значение уходит в БД, в кэш доступа и в расписание истечения
+        if expires_at.tzinfo:
+            naive_expires = expires_at.astimezone(timezone.utc).replace(tzinfo=None)
+        else:
+            naive_expires = expires_at
         # created_at тоже берем из Python, чтобы синхронизировать время
         now_naive = datetime.now(timezone.utc).replace(tzinfo=None)
         
-        async with pool.acquire() as conn:
-            await conn.execute(
-                """
-                INSERT INTO subscriptions (user_id, expires_at, created_at)
-                VALUES ($1, $2, $3)
-                ON CONFLICT (user_id) 
-                DO UPDATE SET expires_at = $2
-                """,
-                hashed_id, naive_expires, now_naive
-            )
+        # Scrypt выше не входит в замер запроса
+        with DB_QUERY_SECONDS.time(query="subscriptions.create_or_update"):
+            async with pool.acquire() as conn:
+                async with conn.transaction():
+                    await conn.execute(
+                        """
+                        INSERT INTO subscriptions (user_id, expires_at, created_at)
+                        VALUES ($1, $2, $3)
+                        ON CONFLICT (user_id) 
+                        DO UPDATE SET expires_at = $2
+                        """,
+                        hashed_id, naive_expires, now_naive
+                    )
+                    await publish_event(
+                        conn,
+                        SUBSCRIPTION_UPDATED,
+                        user_id=hashed_id,
+                        expires_at=naive_expires.isoformat()
+                    )
+                    await OutboxRepository.enqueue(conn, outbox)
+        
+        store_access(hashed_id, naive_expires)
+        schedule_expiry(hashed_id, naive_expires)
     
     @staticmethod
-    async def delete(user_id: int) -> bool:
-        """Удаляет подписку пользователя"""
+    async def delete(user_id: int, outbox: Sequence[OutboxMessage] = ()) -> bool:
+        """Удаляет подписку пользователя (outbox отправляется, только если она была)"""
         pool = get_pool()
-        hashed_id = hash_user_id(user_id, config.hash_salt)
+        hashed_id = await hash_user_id_async(user_id, config.hash_salt)
         
-        async with pool.acquire() as conn:
-            result = await conn.execute(
-                "DELETE FROM subscriptions WHERE user_id = $1",
-                hashed_id
-            )
-            return result != "DELETE 0"
+        with DB_QUERY_SECONDS.time(query="subscriptions.delete"):
+            async with pool.acquire() as conn:
+                async with conn.transaction():
+                    result = await conn.execute(
+                        "DELETE FROM subscriptions WHERE user_id = $1",
+                        hashed_id
+                    )
+                    await publish_event(conn, SUBSCRIPTION_DELETED, user_id=hashed_id)
+                    if result != "DELETE 0":
+                        await OutboxRepository.enqueue(conn, outbox)
+        
+        store_access(hashed_id, None)
+        cancel_expiry(hashed_id)
+        return result != "DELETE 0"
     
     @staticmethod
+    @timed(DB_QUERY_SECONDS, query="subscriptions.get_all")
     async def get_all() -> list[SubscriptionRecord]:
         """Получает все подписки"""
         pool = get_pool()
@@ -85,60 +144,104 @@ class SubscriptionRepository:
     @staticmethod
     async def get_by_user_id(user_id: int) -> Optional[SubscriptionRecord]:
         """Получает подписку по user_id"""
+        hashed_id = await hash_user_id_async(user_id, config.hash_salt)
+        return await SubscriptionRepository.get_by_hash(hashed_id)
+    
+    @staticmethod
+    @timed(DB_QUERY_SECONDS, query="subscriptions.get_by_hash")
+    async def get_by_hash(hashed_id: str) -> Optional[SubscriptionRecord]:
+        """Получает подписку по хешу user_id (заодно обновляет кэш подписок)"""
         pool = get_pool()
-        hashed_id = hash_user_id(user_id, config.hash_salt)
         
         async with pool.acquire() as conn:
-            result = await conn.fetchrow(
-                "SELECT user_id, expires_at, created_at FROM subscriptions WHERE user_id = $1",
-                hashed_id
-            )
-            return dict(result) if result else None  # type: ignore
+            result = await conn.fetchrow(SELECT_BY_HASH_SQL, hashed_id)
+        
+        store_access(hashed_id, result['expires_at'] if result else None)
+        return dict(result) if result else None  # type: ignore
     
     @staticmethod
-    async def get_expired() -> list[SubscriptionRecord]:
-        """Получает список истекших подписок перед удалением"""
+    @timed(DB_QUERY_SECONDS, query="subscriptions.pop_expired")
+    async def pop_expired(
+        limit: int = 500,
+        outbox: Optional[Callable[[list[SubscriptionRecord]], list[OutboxMessage]]] = None
+    ) -> list[SubscriptionRecord]:
+        """
+        Удаляет до limit истекших подписок и возвращает удаленные строки
+        
+        Один запрос вместо выборки и отдельного удаления: строка, истекшая
+        между ними, не пропадет без уведомления. SKIP LOCKED позволяет
+        нескольким репликам разбирать истекшие подписки параллельно - каждая
+        строка достается ровно одной из них.
+        
+        Args:
+            outbox: Уведомления по удаленным строкам, записываются в той же
+                транзакции. Вызывается и для пустой пачки (последней в цикле
+                очистки), может вернуть пустой список
+        """
         pool = get_pool()
         now_utc_naive = datetime.now(timezone.utc).replace(tzinfo=None)
         
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                rows = await conn.fetch(
+                    """
+                    DELETE FROM subscriptions
+                    WHERE user_id IN (
+                        SELECT user_id
+                        FROM subscriptions
+                        WHERE expires_at < $1
+                        ORDER BY expires_at
+                        LIMIT $2
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING user_id, expires_at, created_at
+                    """,
+                    now_utc_naive,
+                    limit
+                )
+                expired = [dict(row) for row in rows]
+                if outbox is not None:
+                    await OutboxRepository.enqueue(conn, outbox(expired))  # type: ignore
+            return expired  # type: ignore
+    
+    @staticmethod
+    @timed(DB_QUERY_SECONDS, query="subscriptions.get_upcoming_expirations")
+    async def get_upcoming_expirations(limit: int = 10_000) -> list[dict]:
+        """Ближайшие истечения подписок по возрастанию (по индексу idx_expires_at)"""
+        pool = get_pool()
+        
         async with pool.acquire() as conn:
             rows = await conn.fetch(
-                """
-                SELECT user_id, expires_at, created_at
-                FROM subscriptions
-                WHERE expires_at < $1
-                """,
-                now_utc_naive
+                "SELECT user_id, expires_at FROM subscriptions ORDER BY expires_at LIMIT $1",
+                limit
             )
-            return [dict(row) for row in rows]  # type: ignore
+            return [dict(row) for row in rows]
     
     @staticmethod
-    async def delete_expired() -> int:
-        """Удаляет истекшие подписки, возвращает количество удаленных"""
+    @timed(DB_QUERY_SECONDS, query="subscriptions.count_active")
+    async def count_active() -> int:
+        """Количество действующих подписок"""
         pool = get_pool()
-        # Используем naive UTC datetime для PostgreSQL
         now_utc_naive = datetime.now(timezone.utc).replace(tzinfo=None)
         
         async with pool.acquire() as conn:
-            result = await conn.execute(
-                "DELETE FROM subscriptions WHERE expires_at < $1",
+            return await conn.fetchval(
+                "SELECT count(*) FROM subscriptions WHERE expires_at > $1",
                 now_utc_naive
             )
-            
-            if result == "DELETE 0":
-                return 0
-            
-            # Извлекаем число из "DELETE N"
-            count = int(result.split()[-1])
-            return count
     
     @staticmethod
+    @timed(DB_QUERY_SECONDS, query="subscriptions.delete_all")
     async def delete_all() -> int:
         """Удаляет ВСЕ подписки, возвращает количество удаленных"""
         pool = get_pool()
         
         async with pool.acquire() as conn:
-            result = await conn.execute("DELETE FROM subscriptions")
+            async with conn.transaction():
+                result = await conn.execute("DELETE FROM subscriptions")
+                await publish_event(conn, SUBSCRIPTIONS_CLEARED)
+            clear_access_cache()
+            clear_expiries()
             
             if result == "DELETE 0":
                 return 0
@@ -2,31 +2,26 @@ import logging
 from aiogram import Router
 from aiogram.filters import Command
 from aiogram.types import Message
-from aiogram import Bot
 
-from app.config import config
+from app.middlewares.access import AccessContext
 from app.services.subscriptions import SubscriptionService
-from app.services.notifications import NotificationService
+from app.utils.crypto import hash_user_id_async
 from app.utils.text import split_message
 from app.utils.notification_cache import clear_user_notification
+from app.config import config
 
 logger = logging.getLogger(__name__)
 
 admin_router = Router()
 
 
-def is_admin(user_id: int) -> bool:
-    """Проверяет, является ли пользователь администратором"""
-    return user_id in config.admin_chat_ids
-
-
 @admin_router.message(Command("grant"))
-async def cmd_grant(message: Message, bot: Bot):
+async def cmd_grant(message: Message, access: AccessContext):
     """Команда выдачи подписки (только для админов)"""
     if not message.from_user or not message.text:
         return
     
-    if not is_admin(message.from_user.id):
+    if not access.is_admin:
         await message.answer("❌ У вас нет прав для выполнения этой команды.")
         return
     
@@ -49,19 +44,17 @@ async def cmd_grant(message: Message, bot: Bot):
         user_id = int(parts[1])
         duration = parts[2]
         
-        success, expires_at = await SubscriptionService.grant(user_id, duration)
+        # Уведомление пользователю записывается в outbox вместе с подпиской
+        success, expires_at = await SubscriptionService.grant(user_id, duration, notify_user=True)
         
         if success and expires_at:
             # Очищаем кэш уведомлений - если подписка истечет, админ снова получит уведомление
-            clear_user_notification(user_id)
+            # (в других процессах сброс приходит событием SUBSCRIPTION_UPDATED)
+            clear_user_notification(await hash_user_id_async(user_id, config.hash_salt))
             
             await message.answer(
                 f"✅ Подписка успешно выдана пользователю {user_id} на период {duration}"
             )
-            
-            # Уведомляем пользователя
-            notification_service = NotificationService(bot)
-            await notification_service.notify_subscription_granted(user_id, duration, expires_at)
         else:
             await message.answer("❌ Неверный период подписки")
     
@@ -73,12 +66,12 @@ async def cmd_grant(message: Message, bot: Bot):
 
 
 @admin_router.message(Command("revoke"))
-async def cmd_revoke(message: Message, bot: Bot):
+async def cmd_revoke(message: Message, access: AccessContext):
     """Команда отзыва подписки (только для админов)"""
     if not message.from_user or not message.text:
         return
     
-    if not is_admin(message.from_user.id):
+    if not access.is_admin:
         await message.answer("❌ У вас нет прав для выполнения этой команды.")
         return
     
@@ -92,14 +85,11 @@ async def cmd_revoke(message: Message, bot: Bot):
             return
         
         user_id = int(parts[1])
-        success = await SubscriptionService.revoke(user_id)
+        # Уведомление пользователю записывается в outbox вместе с удалением
+        success = await SubscriptionService.revoke(user_id, notify_user=True)
         
         if success:
             await message.answer(f"✅ Подписка отозвана у пользователя {user_id}")
-            
-            # Уведомляем пользователя
-            notification_service = NotificationService(bot)
-            await notification_service.notify_subscription_revoked(user_id)
         else:
             await message.answer("❌ Подписка не найдена")
     
@@ -111,12 +101,12 @@ async def cmd_revoke(message: Message, bot: Bot):
 
 
 @admin_router.message(Command("hash"))
-async def cmd_hash(message: Message):
+async def cmd_hash(message: Message, access: AccessContext):
     """Команда получения хеша по user_id (только для админов)"""
     if not message.from_user or not message.text:
         return
     
-    if not is_admin(message.from_user.id):
+    if not access.is_admin:
         await message.answer("❌ У вас нет прав для выполнения этой команды.")
         return
     
@@ -152,12 +142,12 @@ async def cmd_hash(message: Message):
 
 
 @admin_router.message(Command("revokeall"))
-async def cmd_revokeall(message: Message):
+async def cmd_revokeall(message: Message, access: AccessContext):
     """Команда отзыва ВСЕХ подписок (только для админов)"""
     if not message.from_user:
         return
     
-    if not is_admin(message.from_user.id):
+    if not access.is_admin:
         await message.answer("❌ У вас нет прав для выполнения этой команды.")
         return
     
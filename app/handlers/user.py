@@ -1,5 +1,5 @@
 import logging
-import asyncio
+from contextlib import aclosing
 from aiogram import Router
 from aiogram.filters import Command
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
@@ -7,26 +7,25 @@ from aiogram import Bot
 from decimal import Decimal
 
 from app.config import config
-from app.services.subscriptions import SubscriptionService
-from app.services.notifications import NotificationService
-from app.clients.perplexity import check_fact
+from app.services.notifications import NotificationService, notify_in_background
+from app.services.progressive_reply import ProgressiveReply
+from app.services.fact_scheduler import PositionCallback, get_scheduler
+from app.services.outbound import outbound_priority
+from app.clients.perplexity import check_fact, stream_fact
 from app.clients.robokassa_client import robokassa_client
 from app.db.repositories.payments import PaymentRepository
 from app.db.pool import get_pool
 from app.utils.text import split_message
 from app.utils.notification_cache import is_user_notified, mark_user_notified
-from app.utils.crypto import hash_user_id
-from app.constants import MOSCOW_TZ
+from app.middlewares.access import AccessContext
+from app.constants import BACKGROUND, MOSCOW_TZ
 from datetime import timezone
 
 logger = logging.getLogger(__name__)
 
 user_router = Router()
 
-
-def is_admin(user_id: int) -> bool:
-    """Проверяет, является ли пользователь администратором"""
-    return user_id in config.admin_chat_ids
+PROCESSING_TEXT = "⏳ Анализирую ваш запрос..."
 
 
 def get_payment_keyboard() -> InlineKeyboardMarkup:
@@ -39,14 +38,12 @@ def get_payment_keyboard() -> InlineKeyboardMarkup:
 
 
 @user_router.message(Command("start"))
-async def cmd_start(message: Message):
+async def cmd_start(message: Message, access: AccessContext):
     """Команда /start - приветствие и информация о боте"""
     if not message.from_user:
         return
     
-    user_id = message.from_user.id
-    
-    if is_admin(user_id):
+    if access.is_admin:
         response = "👋 Привет! Я бот для проверки фактов.\n\n"
         response += "👑 Вы администратор бота.\n\n"
         response += "У вас безграничный доступ ко всем функциям.\n\n"
@@ -58,7 +55,7 @@ async def cmd_start(message: Message):
         response += "• /mystatus - Проверить свою подписку"
         await message.answer(response, parse_mode="HTML")
     else:
-        has_subscription = await SubscriptionService.check_active(user_id)
+        has_subscription = await access.has_access()
         
         if has_subscription:
             response = "👋 Привет! Я закрытый инструмент для проверки информационного фона.\n\n"
@@ -81,7 +78,7 @@ async def cmd_start(message: Message):
 
 
 @user_router.callback_query(lambda c: c.data and c.data.startswith("pay:"))
-async def process_payment(callback: CallbackQuery):
+async def process_payment(callback: CallbackQuery, access: AccessContext):
     """Обработчик выбора тарифа и генерации платежной ссылки"""
     if not callback.data or not callback.from_user or not callback.message:
         return
@@ -98,9 +95,10 @@ async def process_payment(callback: CallbackQuery):
     price = int(parts[2])  # 1000, 3600, 6000
     
     user_id = callback.from_user.id
-    hashed_id = hash_user_id(user_id, config.hash_salt)
     
     try:
+        hashed_id = await access.get_hashed_id()
+        
         # Создаем платеж в БД
         pool = get_pool()
         payment_repo = PaymentRepository(pool)
@@ -149,13 +147,13 @@ async def process_payment(callback: CallbackQuery):
 
 
 @user_router.message(Command("mystatus"))
-async def cmd_mystatus(message: Message):
+async def cmd_mystatus(message: Message, access: AccessContext):
     """Команда проверки статуса подписки"""
     if not message.from_user:
         return
     
     try:
-        sub = await SubscriptionService.get_user_subscription(message.from_user.id)
+        sub = await access.get_subscription()
         
         if sub:
             # БД возвращает naive datetime (UTC), конвертируем в московское время
@@ -179,46 +177,78 @@ async def cmd_mystatus(message: Message):
         await message.answer(f"❌ Ошибка: {str(e)}")
 
 
+async def reject_unsubscribed(message: Message, access: AccessContext, bot: Bot) -> None:
+    """Ответ пользователю без подписки (вызывается из AccessMiddleware и handle_message)"""
+    if not message.from_user:
+        return
+    
+    user_id = message.from_user.id
+    await message.answer(
+        f"❌ У вас нет активной подписки.\n\n"
+        f"💳 <b>Выберите тариф для оплаты:</b>",
+        reply_markup=get_payment_keyboard(),
+        parse_mode="HTML"
+    )
+    
+    # Уведомляем админов о новом пользователе в фоне (без упоминания пользователю)
+    hashed_id = await access.get_hashed_id()
+    if not is_user_notified(hashed_id):
+        mark_user_notified(hashed_id)
+        
+        notify_in_background(NotificationService.notify_admins_new_user(
+            config.admin_chat_ids,
+            user_id,
+            message.from_user.username or "без username",
+            message.from_user.full_name or "Unknown"
+        ))
+        logger.info(f"📢 Запущено уведомление админов о новом пользователе {user_id}")
+
+
 @user_router.message()
-async def handle_message(message: Message, bot: Bot):
+async def handle_message(message: Message, bot: Bot, access: AccessContext):
     """Обработчик всех текстовых сообщений"""
     if not message.text or not message.from_user:
         return
     
     user_id = message.from_user.id
     
-    # Админ имеет безграничный доступ без проверки подписки
-    if not is_admin(user_id):
-        has_subscription = await SubscriptionService.check_active(user_id)
-        
-        if not has_subscription:
-            await message.answer(
-                f"❌ У вас нет активной подписки.\n\n"
-                f"💳 <b>Выберите тариф для оплаты:</b>",
-                reply_markup=get_payment_keyboard(),
-                parse_mode="HTML"
-            )
-            
-            # Уведомляем админов о новом пользователе в фоне (без упоминания пользователю)
-            if not is_user_notified(user_id):
-                mark_user_notified(user_id)
-                
-                notification_service = NotificationService(bot)
-                await notification_service.notify_admins_new_user(
-                    config.admin_chat_ids,
-                    user_id,
-                    message.from_user.username or "без username",
-                    message.from_user.full_name or "Unknown"
-                )
-                logger.info(f"📢 Отправлено уведомление админам о новом пользователе {user_id}")
-            
+    # Админ имеет безграничный доступ без проверки подписки.
+    # Обычный текст уже отфильтрован AccessMiddleware, здесь остаются неизвестные команды.
+    if not await access.has_access():
+        await reject_unsubscribed(message, access, bot)
+        return
+    
+    processing_msg = await message.answer(PROCESSING_TEXT)
+    reply = ProgressiveReply(processing_msg, config.stream_edit_interval)
+    
+    async def show_queue_position(position: int) -> None:
+        if position == 0:
+            await reply.set_status(PROCESSING_TEXT)
             return
+        # Позиция в очереди не должна отнимать лимит Bot API у ответов
+        with outbound_priority(BACKGROUND):
+            await reply.set_status(f"⏳ Ваш запрос в очереди: {position}-й. Ответ начнется автоматически...")
     
-    processing_msg = await message.answer("⏳ Анализирую ваш запрос...")
+    # Слот планировщика нужен только если ответа нет в кэше. Позиция приходит
+    # через общий запрос: если этот пользователь уйдет, её получат остальные
+    scheduler = get_scheduler()
+    
+    def gate(on_position: PositionCallback):
+        return scheduler.slot(user_id, priority=access.is_admin, on_position=on_position)
     
     try:
+        if config.streaming_enabled:
+            # Ответ появляется в сообщении-заглушке по мере генерации.
+            # aclosing: при ошибке отправки или отмене слот и подписка на запрос
+            # освобождаются сразу, а не при сборке мусора
+            async with aclosing(stream_fact(message.text, gate=gate, on_position=show_queue_position)) as deltas:
+                async for delta in deltas:
+                    await reply.append(delta)
+            await reply.finish()
+            return
+        
         # Проверяем факт через Perplexity AI
-        result = await check_fact(message.text)
+        result = await check_fact(message.text, gate=gate, on_position=show_queue_position)
         
         # Безопасно удаляем сообщение о загрузке
         try:
@@ -227,24 +257,23 @@ async def handle_message(message: Message, bot: Bot):
             logger.warning(f"Не удалось удалить сообщение о загрузке: {del_error}")
         
         # Отправляем результат (с разбивкой на части если длинный)
-        chunks = split_message(result)
-        for i, chunk in enumerate(chunks):
+        # (темп отправки задает очередь исходящих вызовов, см. app/services/outbound.py)
+        for chunk in split_message(result):
             try:
                 await message.answer(chunk, parse_mode="HTML")
             except Exception as send_error:
                 # Если HTML парсинг не сработал, отправляем без парсинга
                 logger.error(f"Ошибка отправки с HTML: {send_error}")
                 await message.answer(chunk)
-            
-            if i < len(chunks) - 1:
-                await asyncio.sleep(0.1)
     
     except Exception as e:
         logger.error(f"Ошибка обработки сообщения: {e}")
-        try:
-            await processing_msg.delete()
-        except:
-            pass
+        # Уже показанную часть потокового ответа не удаляем
+        if not reply.has_content:
+            try:
+                await processing_msg.delete()
+            except:
+                pass
         await message.answer(
             f"❌ Произошла ошибка при обработке вашего запроса: {str(e)}"
         )
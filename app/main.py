@@ -1,45 +1,219 @@
 import asyncio
 import logging
+import signal
 from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiohttp import web
 
 from app.config import config, logger
 from app.db.pool import init_pool, close_pool
 from app.clients import perplexity
 from app.handlers.admin import admin_router
-from app.handlers.user import user_router
+from app.handlers.user import user_router, reject_unsubscribed
+from app.middlewares.access import AccessMiddleware
+from app.middlewares.outbound import OutboundRateLimitMiddleware
+from app.middlewares.telegram_metrics import TelegramMetricsMiddleware, UpdateMetricsMiddleware
+from app.services.fact_scheduler import init_scheduler
+from app.services.outbound import init_outbound
+from app.services.notifications import drain_background_notifications
 from app.background.cleanup import subscription_cleanup_task
+from app.background.outbox import notification_outbox_task
+from app.background.cache_listener import cache_invalidation_listener
+from app.background.keepalive import perplexity_keepalive_task
+from app.webhook.metrics import start_metrics_server
 from app.webhook.robokassa_webhook import create_webhook_app
+from app.webhook.telegram_webhook import setup_telegram_webhook, set_telegram_webhook
+from app.utils.crypto import init_hash_executor, init_hash_cache, shutdown_hash_executor
+from app.utils.entitlement_cache import init_entitlement_cache
 
 
-async def main():
-    """Главная функция запуска бота"""
-    logger.info("🚀 Запуск fact-checker бота...")
+async def init_database() -> None:
+    """Пул соединений с PostgreSQL и кэш подписок"""
+    await init_pool(
+        config.database_url,
+        min_size=config.db_pool_min_size,
+        max_size=config.db_pool_max_size,
+        command_timeout=config.db_command_timeout,
+        acquire_timeout=config.db_acquire_timeout,
+        max_inactive_lifetime=config.db_max_inactive_lifetime,
+        statement_cache_size=config.db_statement_cache_size
+    )
     
-    # Инициализация базы данных
-    await init_pool(config.database_url)
+    # Кэш подписок (check_active без запроса к БД)
+    init_entitlement_cache(
+        config.entitlement_cache_size,
+        config.entitlement_cache_ttl,
+        config.entitlement_negative_ttl
+    )
+
+
+async def init_fact_checking() -> None:
+    """Всё, что нужно для обработки сообщений: хеширование, Perplexity, очередь"""
+    # Пул для хеширования user ID вне event loop
+    init_hash_executor(config.hash_executor, config.hash_workers)
+    init_hash_cache(config.hash_cache_size, config.hash_cache_ttl)
     
     # Инициализация Perplexity клиента
-    perplexity.init_client(config.perplexity_api_key)
+    perplexity.init_client(
+        config.perplexity_api_key,
+        base_url=config.perplexity_base_url,
+        max_connections=config.perplexity_max_connections,
+        max_keepalive_connections=config.perplexity_max_keepalive,
+        keepalive_expiry=config.perplexity_keepalive_expiry,
+        http2=config.perplexity_http2,
+        timeout=config.perplexity_timeout,
+        connect_timeout=config.perplexity_connect_timeout
+    )
     perplexity.load_system_prompt()
+    perplexity.init_resilience(
+        timeout=config.perplexity_timeout,
+        max_retries=config.perplexity_max_retries,
+        retry_base_delay=config.perplexity_retry_base_delay,
+        retry_max_delay=config.perplexity_retry_max_delay,
+        breaker_threshold=config.perplexity_breaker_threshold,
+        breaker_reset_timeout=config.perplexity_breaker_reset,
+        hedge_enabled=config.perplexity_hedge_enabled,
+        hedge_min_delay=config.perplexity_hedge_min_delay
+    )
+    perplexity.init_response_cache(
+        config.fact_cache_size,
+        config.fact_cache_ttl,
+        config.fact_cache_max_chars
+    )
     
-    # Создание бота и диспетчера
-    bot = Bot(token=config.telegram_bot_token)
+    if config.near_dup_enabled:
+        perplexity.init_near_duplicate_index(
+            config.near_dup_capacity,
+            config.near_dup_threshold,
+            config.near_dup_ttl,
+            config.near_dup_max_bytes
+        )
+    
+    # Общий лимит и честная очередь запросов к Perplexity
+    init_scheduler(config.fact_check_concurrency)
+    
+    # TLS handshake до первого пользовательского запроса
+    await perplexity.warm_up()
+
+
+async def close_services() -> None:
+    """Закрывает клиенты, пул БД и пул хеширования"""
+    await perplexity.close_client()
+    await close_pool()
+    shutdown_hash_executor()
+
+
+def create_bot() -> Bot:
+    """Бот с очередью исходящих вызовов и метриками Bot API"""
+    # В режиме нескольких процессов общий лимит делится между supervisor и воркерами
+    processes = config.workers + 1 if config.workers > 1 else 1
+    outbound = init_outbound(
+        global_rate=config.outbound_global_rate / processes,
+        chat_rate=config.outbound_chat_rate,
+        chat_burst=config.outbound_chat_burst,
+        group_rate=config.outbound_group_rate_per_minute / 60
+    )
+    
+    session = None
+    if config.telegram_api_url:
+        # Собственный Bot API сервер (или тестовый из loadtest)
+        session = AiohttpSession(api=TelegramAPIServer.from_base(config.telegram_api_url))
+    bot = Bot(token=config.telegram_bot_token, session=session)
+    # Первый middleware - внешний: метрики измеряют сам HTTP вызов без ожидания в очереди
+    bot.session.middleware(OutboundRateLimitMiddleware(outbound, config.outbound_max_retries))
+    bot.session.middleware(TelegramMetricsMiddleware())
+    return bot
+
+
+def create_dispatcher() -> Dispatcher:
+    """Диспетчер с роутерами и middleware"""
     dp = Dispatcher()
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
     
     # Регистрация роутеров (порядок важен: сначала admin, потом user)
     dp.include_router(admin_router)
     dp.include_router(user_router)
     
-    # Запуск фоновой задачи очистки подписок с передачей бота для уведомлений
-    cleanup_task = asyncio.create_task(subscription_cleanup_task(bot))
+    # Контекст доступа (админ, хеш, подписка) вычисляется один раз на апдейт
+    dp.message.outer_middleware(AccessMiddleware(on_denied=reject_unsubscribed))
+    dp.callback_query.outer_middleware(AccessMiddleware())
+    return dp
+
+
+def start_background_tasks(bot: Bot, *, singletons: bool = True, keepalive: bool = True) -> list[asyncio.Task]:
+    """
+    Запускает фоновые задачи
+    
+    Args:
+        singletons: Задачи, которые должны работать в одном процессе
+            (очистка подписок, доставка уведомлений из outbox)
+        keepalive: Поддержание соединений с Perplexity
+    """
+    # Синхронизация кэшей между процессами и репликами (PostgreSQL LISTEN/NOTIFY)
+    background_tasks = [asyncio.create_task(cache_invalidation_listener())]
+    
+    if singletons:
+        # Очистка истекших подписок и доставка уведомлений из outbox
+        # (несколько реплик разбирают таблицы через SKIP LOCKED)
+        background_tasks.append(asyncio.create_task(subscription_cleanup_task()))
+        background_tasks.append(asyncio.create_task(notification_outbox_task(bot)))
+    
+    # Поддержание соединений с Perplexity в простое
+    if keepalive and config.perplexity_keepalive_interval > 0:
+        background_tasks.append(
+            asyncio.create_task(perplexity_keepalive_task(config.perplexity_keepalive_interval))
+        )
+    return background_tasks
+
+
+async def stop_background_tasks(background_tasks: list[asyncio.Task]) -> None:
+    """Отменяет фоновые задачи и дожидается их завершения"""
+    for task in background_tasks:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+
+async def wait_for_stop_signal() -> None:
+    """Ждет SIGINT/SIGTERM"""
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+    await stop_event.wait()
+
+
+async def main():
+    """Главная функция запуска бота"""
+    if config.workers > 1:
+        # Импорт здесь: supervisor сам использует функции этого модуля
+        from app.supervisor import run_supervisor
+        await run_supervisor(config.workers)
+        return
+    
+    logger.info("🚀 Запуск fact-checker бота...")
+    
+    await init_database()
+    await init_fact_checking()
+    
+    # Создание бота и диспетчера
+    bot = create_bot()
+    dp = create_dispatcher()
+    
+    background_tasks = start_background_tasks(bot)
     
     # Создание и запуск webhook сервера для Robokassa
     webhook_app = create_webhook_app(bot)
+    if config.bot_mode == "webhook":
+        setup_telegram_webhook(webhook_app, dp, bot, config.webhook_path, config.webhook_secret)
     runner = web.AppRunner(webhook_app)
     await runner.setup()
     site = web.TCPSite(runner, '0.0.0.0', 5000)
     await site.start()
+    metrics_runner = await start_metrics_server(config.metrics_host, config.metrics_port)
     
     logger.info(f"✅ Бот инициализирован")
     logger.info(f"👤 Admin IDs: {', '.join(map(str, config.admin_chat_ids))}")
@@ -47,19 +221,33 @@ async def main():
     logger.info(f"   - ResultURL: http://your-domain.com/robokassa/result")
     logger.info(f"   - SuccessURL: http://your-domain.com/robokassa/success")
     logger.info(f"   - FailURL: http://your-domain.com/robokassa/fail")
+    logger.info(f"📊 Метрики: http://{config.metrics_host}:{config.metrics_port}/metrics")
     
     try:
-        # Запуск long polling
-        await dp.start_polling(bot, skip_updates=True)
+        if config.bot_mode == "webhook":
+            webhook_url = config.webhook_url.rstrip("/") + config.webhook_path
+            await set_telegram_webhook(
+                bot,
+                dp,
+                webhook_url,
+                config.webhook_secret,
+                config.webhook_max_connections
+            )
+            
+            # Апдейты обрабатывает aiohttp сервер, ждем сигнала остановки
+            await wait_for_stop_signal()
+        else:
+            # Webhook, оставшийся от режима webhook, мешает getUpdates
+            await bot.delete_webhook()
+            # Запуск long polling
+            await dp.start_polling(bot, skip_updates=True)
     finally:
         # Очистка ресурсов
-        cleanup_task.cancel()
-        try:
-            await cleanup_task
-        except asyncio.CancelledError:
-            pass
+        await stop_background_tasks(background_tasks)
         await runner.cleanup()
-        await close_pool()
+        await metrics_runner.cleanup()
+        await drain_background_notifications()
+        await close_services()
         await bot.session.close()
         logger.info("👋 Бот остановлен")
 
@@ -0,0 +1 @@
+"""Middleware для aiogram"""
@@ -0,0 +1,103 @@
+"""Middleware контекста доступа: администратор, хеш ID и подписка пользователя"""
+import logging
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Optional
+from aiogram import BaseMiddleware, Bot
+from aiogram.types import Message, TelegramObject
+
+from app.config import config
+from app.models.subscription import SubscriptionRecord
+from app.services.subscriptions import SubscriptionService
+from app.utils.crypto import hash_user_id_async
+
+logger = logging.getLogger(__name__)
+
+
+def is_admin(user_id: int) -> bool:
+    """Проверяет, является ли пользователь администратором"""
+    return user_id in config.admin_chat_ids
+
+
+class AccessContext:
+    """
+    Данные о доступе пользователя в рамках одного апдейта
+    
+    Хеш и подписка вычисляются лениво и не более одного раза,
+    сколько бы раз их ни запрашивали обработчики.
+    """
+    
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.is_admin = is_admin(user_id)
+        self._hashed_id: Optional[str] = None
+        self._subscription: Optional[SubscriptionRecord] = None
+        self._subscription_loaded = False
+        self._has_access: Optional[bool] = None
+    
+    async def get_hashed_id(self) -> str:
+        """Возвращает Scrypt хеш user_id"""
+        if self._hashed_id is None:
+            self._hashed_id = await hash_user_id_async(self.user_id, config.hash_salt)
+        return self._hashed_id
+    
+    async def get_subscription(self) -> Optional[SubscriptionRecord]:
+        """Возвращает запись подписки из БД (или None)"""
+        if not self._subscription_loaded:
+            hashed_id = await self.get_hashed_id()
+            self._subscription = await SubscriptionService.get_subscription_by_hash(hashed_id)
+            self._subscription_loaded = True
+        return self._subscription
+    
+    async def has_access(self) -> bool:
+        """Есть ли доступ к проверке фактов (админ или активная подписка)"""
+        if self._has_access is None:
+            if self.is_admin:
+                self._has_access = True
+            elif self._subscription_loaded:
+                now_utc_naive = datetime.now(timezone.utc).replace(tzinfo=None)
+                self._has_access = bool(
+                    self._subscription and now_utc_naive < self._subscription['expires_at']
+                )
+            else:
+                hashed_id = await self.get_hashed_id()
+                self._has_access = await SubscriptionService.check_active_by_hash(hashed_id)
+        return self._has_access
+
+
+DeniedHandler = Callable[[Message, AccessContext, Bot], Awaitable[Any]]
+
+
+class AccessMiddleware(BaseMiddleware):
+    """
+    Outer middleware: кладет AccessContext в data["access"]
+    
+    Если задан on_denied, обычные текстовые сообщения (не команды) от
+    пользователей без доступа отклоняются до запуска обработчиков.
+    """
+    
+    def __init__(self, on_denied: Optional[DeniedHandler] = None):
+        self.on_denied = on_denied
+    
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any]
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is None:
+            return await handler(event, data)
+        
+        access = AccessContext(user.id)
+        data["access"] = access
+        
+        if (
+            self.on_denied is not None
+            and isinstance(event, Message)
+            and event.text
+            and not event.text.startswith("/")
+            and not await access.has_access()
+        ):
+            return await self.on_denied(event, access, data["bot"])
+        
+        return await handler(event, data)
@@ -0,0 +1,51 @@
+"""Request middleware aiogram: все вызовы Bot API в чаты проходят через очередь с лимитами"""
+import asyncio
+import logging
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+
+from app.services.outbound import OutboundDispatcher
+
+logger = logging.getLogger(__name__)
+
+
+class OutboundRateLimitMiddleware(BaseRequestMiddleware):
+    """
+    Ограничивает частоту вызовов и повторяет их после 429
+    
+    Вызовы с chat_id (sendMessage, editMessageText, deleteMessage, ...) ждут
+    токен в OutboundDispatcher. На TelegramRetryAfter чат блокируется на
+    retry_after секунд, и вызов повторяется (до max_retries раз).
+    """
+    
+    def __init__(self, dispatcher: OutboundDispatcher, max_retries: int = 3):
+        self.dispatcher = dispatcher
+        self.max_retries = max_retries
+    
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType]
+    ) -> Response[TelegramType]:
+        chat_id = getattr(method, "chat_id", None)
+        attempt = 0
+        while True:
+            if chat_id is not None:
+                await self.dispatcher.acquire(chat_id)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                self.dispatcher.retry_after(chat_id, e.retry_after)
+                if attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                logger.warning(
+                    f"Telegram 429 для {type(method).__name__} (чат {chat_id}): "
+                    f"повтор {attempt}/{self.max_retries} через {e.retry_after} с"
+                )
+                if chat_id is None:
+                    await asyncio.sleep(e.retry_after)
@@ -0,0 +1,61 @@
+"""Метрики Telegram: латентность вызовов Bot API и обработки апдейтов"""
+import time
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import TelegramObject, Update
+
+from app.utils.metrics import ERRORS, registry
+
+TELEGRAM_REQUEST_SECONDS = registry.histogram(
+    "factchecker_telegram_request_seconds",
+    "Telegram Bot API call latency",
+    ("method",)
+)
+UPDATE_SECONDS = registry.histogram(
+    "factchecker_update_seconds",
+    "Telegram update handling latency",
+    ("type",)
+)
+
+
+class TelegramMetricsMiddleware(BaseRequestMiddleware):
+    """Request middleware сессии бота: длительность каждого вызова (SendMessage, EditMessageText, ...)"""
+    
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType]
+    ) -> Response[TelegramType]:
+        name = type(method).__name__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception:
+            ERRORS.inc(component="telegram")
+            raise
+        finally:
+            TELEGRAM_REQUEST_SECONDS.observe(time.perf_counter() - started, method=name)
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Outer middleware на dp.update: полное время обработки апдейта хендлерами"""
+    
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        update_type = event.event_type if isinstance(event, Update) else type(event).__name__
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            ERRORS.inc(component="handlers")
+            raise
+        finally:
+            UPDATE_SECONDS.observe(time.perf_counter() - started, type=update_type)
@@ -0,0 +1,28 @@
+"""Модели для очереди уведомлений (outbox)"""
+from typing import TypedDict, Any
+from datetime import datetime
+
+# Виды уведомлений: текст формируется при доставке по kind и payload
+TEXT = "text"  # payload: text, parse_mode
+PAYMENT_CONFIRMED = "payment_confirmed"  # payload: invoice_id, duration, amount, expires_at
+SUBSCRIPTION_GRANTED = "subscription_granted"  # payload: duration, expires_at
+SUBSCRIPTION_REVOKED = "subscription_revoked"  # payload: {}
+
+
+class OutboxMessage(TypedDict):
+    """Уведомление для записи в outbox"""
+    chat_id: int
+    kind: str
+    payload: dict[str, Any]
+    priority: int  # INTERACTIVE / BACKGROUND из app.constants
+
+
+class OutboxRecord(TypedDict):
+    """Запись outbox, взятая воркером на доставку"""
+    id: int
+    chat_id: int
+    kind: str
+    payload: dict[str, Any]
+    priority: int
+    attempts: int
+    created_at: datetime
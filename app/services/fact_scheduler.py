@@ -0,0 +1,224 @@
+"""
+Планировщик запросов к Perplexity: общий лимит параллельных запросов,
+честная очередь по пользователям (round-robin) и приоритет для админов.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+PositionCallback = Callable[[int], Awaitable[None]]
+
+
+class _Ticket:
+    """Запрос, ожидающий слот"""
+
+    __slots__ = ("user_id", "priority", "future", "on_position", "position", "notified", "notifier")
+
+    def __init__(self, user_id: int, priority: bool, on_position: Optional[PositionCallback]):
+        self.user_id = user_id
+        self.priority = priority
+        self.future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self.on_position = on_position
+        self.position = 0
+        self.notified = 0
+        self.notifier: Optional[asyncio.Task] = None
+
+
+class FactCheckScheduler:
+    """
+    Ограничивает число одновременных запросов к Perplexity
+
+    Пока есть свободные слоты, запросы проходят сразу. Остальные ждут:
+    сначала обслуживается очередь админов, затем пользователи по кругу -
+    по одному запросу от каждого, поэтому 30 сообщений одного пользователя
+    не задерживают остальных.
+
+    Позиции в очереди пересчитываются не чаще position_interval секунд, а
+    пользователю сообщается только заметное изменение позиции (от 20%):
+    каждое освобождение слота сдвигает всю очередь, и уведомление на каждый
+    сдвиг стоило бы O(n^2) правок сообщений при разборе очереди из n запросов.
+    """
+
+    def __init__(self, max_concurrent: int, position_interval: float = 3.0):
+        self.max_concurrent = max_concurrent
+        self.position_interval = position_interval
+        self.active = 0
+        self._priority: deque[_Ticket] = deque()
+        self._users: OrderedDict[int, deque[_Ticket]] = OrderedDict()
+        self._refresher: Optional[asyncio.Task] = None
+        self._last_refresh = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        """Количество запросов в очереди"""
+        return len(self._priority) + sum(len(q) for q in self._users.values())
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        user_id: int,
+        priority: bool = False,
+        on_position: Optional[PositionCallback] = None
+    ) -> AsyncIterator[None]:
+        """
+        Занимает слот на время выполнения запроса
+
+        Args:
+            user_id: Telegram ID пользователя (ключ честной очереди)
+            priority: Обслужить вне общей очереди (для админов)
+            on_position: Вызывается с позицией в очереди при её изменении
+                и с 0, когда очередь дошла до запроса
+        """
+        if self.active < self.max_concurrent and not self.queue_depth:
+            self.active += 1
+        else:
+            await self._wait(_Ticket(user_id, priority, on_position))
+
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def _wait(self, ticket: _Ticket) -> None:
+        if ticket.priority:
+            self._priority.append(ticket)
+        else:
+            self._users.setdefault(ticket.user_id, deque()).append(ticket)
+        self._positions_changed()
+
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            if ticket.future.done() and not ticket.future.cancelled():
+                # Слот уже выдан, но запрос отменили - возвращаем слот
+                self._release()
+            else:
+                self._remove(ticket)
+                self._positions_changed()
+            raise
+
+        self._notify(ticket, 0)
+
+    def _release(self) -> None:
+        self.active -= 1
+        while self.active < self.max_concurrent:
+            ticket = self._pop_next()
+            if ticket is None:
+                break
+            if ticket.future.done():
+                continue
+            self.active += 1
+            ticket.future.set_result(None)
+        self._positions_changed()
+
+    def _pop_next(self) -> Optional[_Ticket]:
+        if self._priority:
+            return self._priority.popleft()
+        if not self._users:
+            return None
+
+        user_id, queue = self._users.popitem(last=False)
+        ticket = queue.popleft()
+        if queue:
+            # Пользователь уходит в конец круга
+            self._users[user_id] = queue
+        return ticket
+
+    def _remove(self, ticket: _Ticket) -> None:
+        if ticket.priority:
+            try:
+                self._priority.remove(ticket)
+            except ValueError:
+                pass
+            return
+
+        queue = self._users.get(ticket.user_id)
+        if queue is None:
+            return
+        try:
+            queue.remove(ticket)
+        except ValueError:
+            pass
+        if not queue:
+            del self._users[ticket.user_id]
+
+    def _positions_changed(self) -> None:
+        """Планирует пересчет позиций: одна задача на интервал, а не пересчет на каждое событие"""
+        if self._refresher is None or self._refresher.done():
+            self._refresher = asyncio.create_task(self._refresh_positions())
+
+    async def _refresh_positions(self) -> None:
+        delay = self._last_refresh + self.position_interval - time.monotonic()
+        if delay > 0:
+            # События за время ожидания учтет один пересчет
+            await asyncio.sleep(delay)
+        self._last_refresh = time.monotonic()
+        self._update_positions()
+
+    def _update_positions(self) -> None:
+        """Пересчитывает позиции в том порядке, в котором запросы будут обслужены"""
+        position = 0
+        for ticket in self._priority:
+            position += 1
+            self._notify(ticket, position)
+
+        queues = [list(q) for q in self._users.values()]
+        depth = 0
+        while queues:
+            remaining = []
+            for queue in queues:
+                position += 1
+                self._notify(queue[depth], position)
+                if len(queue) > depth + 1:
+                    remaining.append(queue)
+            queues = remaining
+            depth += 1
+
+    def _notify(self, ticket: _Ticket, position: int) -> None:
+        if ticket.on_position is None or ticket.notified == position:
+            ticket.position = position
+            return
+        if position and ticket.notified and abs(position - ticket.notified) * 5 < ticket.notified:
+            # Сдвиг меньше 20% от показанной позиции не стоит правки сообщения
+            return
+        ticket.position = position
+
+        if position == 0 and ticket.notifier is not None and not ticket.notifier.done():
+            # Очередь дошла до запроса: устаревшая позиция не должна задерживать ответ
+            ticket.notifier.cancel()
+            ticket.notifier = None
+        # Одна задача уведомления на запрос: частые изменения схлопываются
+        if ticket.notifier is None or ticket.notifier.done():
+            ticket.notifier = asyncio.create_task(self._deliver_position(ticket))
+
+    @staticmethod
+    async def _deliver_position(ticket: _Ticket) -> None:
+        while ticket.notified != ticket.position:
+            position = ticket.position
+            try:
+                await ticket.on_position(position)  # type: ignore[misc]
+            except Exception as e:
+                logger.debug(f"Не удалось обновить позицию в очереди: {e}")
+            ticket.notified = position
+
+
+_scheduler: Optional[FactCheckScheduler] = None
+
+
+def init_scheduler(max_concurrent: int, position_interval: float = 3.0) -> FactCheckScheduler:
+    """Инициализирует планировщик запросов к Perplexity"""
+    global _scheduler
+    _scheduler = FactCheckScheduler(max_concurrent, position_interval)
+    return _scheduler
+
+
+def get_scheduler() -> FactCheckScheduler:
+    """Получает текущий планировщик"""
+    if _scheduler is None:
+        raise RuntimeError("Fact-check scheduler не инициализирован")
+    return _scheduler
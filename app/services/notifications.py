@@ -1,92 +1,172 @@
+import asyncio
+import html
 import logging
 from datetime import datetime
-from typing import Optional
-from aiogram import Bot
+from typing import Any, Coroutine, Optional
+from app.db.repositories.outbox import OutboxRepository
+from app.models.outbox import (
+    OutboxMessage,
+    TEXT,
+    PAYMENT_CONFIRMED,
+    SUBSCRIPTION_GRANTED,
+    SUBSCRIPTION_REVOKED
+)
 from app.services.subscriptions import SubscriptionService
+from app.constants import BACKGROUND
+from app.utils.text import paginate_lines
 
 logger = logging.getLogger(__name__)
 
+# Названия оплаченных тарифов (payments.duration)
+PAYMENT_DURATION_TEXT = {
+    "1m": "1 месяц",
+    "6m": "6 месяцев",
+    "1y": "1 год"
+}
+
 
 class NotificationService:
-    """Сервис для отправки уведомлений пользователям"""
+    """
+    Тексты уведомлений и их постановка в очередь доставки
     
-    def __init__(self, bot: Bot):
-        self.bot = bot
+    Уведомления не отправляются из хендлеров напрямую: они записываются в
+    outbox (см. OutboxRepository) и доставляются фоновой задачей
+    app.background.outbox. Текст формируется при доставке по kind и payload.
+    """
     
-    async def notify_subscription_granted(
-        self, 
-        user_id: int, 
-        duration: str, 
-        expires_at: datetime
-    ) -> bool:
-        """Уведомляет пользователя о выдаче подписки"""
-        try:
-            duration_text = SubscriptionService.format_duration(duration)
-            expires_str = SubscriptionService.format_datetime_moscow(expires_at)
-            
-            await self.bot.send_message(
-                user_id,
+    @staticmethod
+    def render(kind: str, payload: dict[str, Any]) -> tuple[str, Optional[str]]:
+        """
+        Текст уведомления из outbox
+        
+        Returns:
+            (текст, parse_mode)
+        
+        Raises:
+            KeyError: Неизвестный вид уведомления или неполный payload
+        """
+        if kind == TEXT:
+            return payload["text"], payload.get("parse_mode")
+        
+        if kind == PAYMENT_CONFIRMED:
+            duration = payload["duration"]
+            expires_at = datetime.fromisoformat(payload["expires_at"])
+            return (
+                f"✅ <b>Оплата успешно принята!</b>\n\n"
+                f"📋 Номер счёта: #{payload['invoice_id']}\n"
+                f"📅 Подписка: {PAYMENT_DURATION_TEXT.get(duration, duration)}\n"
+                f"💵 Сумма: {payload['amount']}₽\n\n"
+                f"Ваша подписка активирована до {SubscriptionService.format_datetime_moscow(expires_at)} (МСК)",
+                "HTML"
+            )
+        
+        if kind == SUBSCRIPTION_GRANTED:
+            duration_text = SubscriptionService.format_duration(payload["duration"])
+            expires_str = SubscriptionService.format_datetime_moscow(datetime.fromisoformat(payload["expires_at"]))
+            return (
                 f"🎉 Вам выдана подписка на бота!\n\n"
                 f"⏰ Срок: {duration_text}\n"
                 f"📅 Действует до: {expires_str} (МСК)\n\n"
-                f"Теперь вы можете отправлять мне любые утверждения для проверки фактов."
+                f"Теперь вы можете отправлять мне любые утверждения для проверки фактов.",
+                None
             )
-            return True
-        except Exception as e:
-            logger.error(f"Не удалось уведомить пользователя {user_id}: {e}")
-            return False
-    
-    async def notify_subscription_revoked(self, user_id: int) -> bool:
-        """Уведомляет пользователя об отзыве подписки"""
-        try:
-            await self.bot.send_message(
-                user_id,
+        
+        if kind == SUBSCRIPTION_REVOKED:
+            return (
                 f"❌ Ваша подписка на бота была отозвана.\n\n"
-                f"Для продления доступа обратитесь к администратору."
+                f"Для продления доступа обратитесь к администратору.",
+                None
             )
-            return True
-        except Exception as e:
-            logger.error(f"Не удалось уведомить пользователя {user_id}: {e}")
-            return False
+        
+        raise KeyError(f"Неизвестный вид уведомления: {kind}")
     
+    @staticmethod
+    def admin_messages(admin_ids: list[int], text: str) -> list[OutboxMessage]:
+        """Одно и то же HTML-сообщение каждому админу (после ответов пользователям)"""
+        return [
+            OutboxMessage(
+                chat_id=admin_id,
+                kind=TEXT,
+                payload={"text": text, "parse_mode": "HTML"},
+                priority=BACKGROUND
+            )
+            for admin_id in admin_ids
+        ]
+    
+    @staticmethod
     async def notify_admins_new_user(
-        self, 
-        admin_ids: list[int], 
-        user_id: int, 
-        username: str, 
+        admin_ids: list[int],
+        user_id: int,
+        username: str,
         full_name: str
     ) -> None:
         """Уведомляет админов о новом пользователе без подписки"""
-        for admin_id in admin_ids:
-            try:
-                await self.bot.send_message(
-                    admin_id,
-                    f"🔔 Новый запрос от пользователя без подписки:\n\n"
-                    f"ID: <code>{user_id}</code>\n"
-                    f"Username: @{username}\n"
-                    f"Имя: {full_name}\n\n"
-                    f"Для выдачи подписки используйте:\n"
-                    f"<code>/grant {user_id} 1M</code>",
-                    parse_mode="HTML"
-                )
-            except Exception as e:
-                logger.error(f"Не удалось уведомить админа {admin_id}: {e}")
+        # username и имя задает пользователь: без экранирования "<" или "&" ломают HTML
+        await OutboxRepository.enqueue_now(NotificationService.admin_messages(
+            admin_ids,
+            f"🔔 Новый запрос от пользователя без подписки:\n\n"
+            f"ID: <code>{user_id}</code>\n"
+            f"Username: @{html.escape(username)}\n"
+            f"Имя: {html.escape(full_name)}\n\n"
+            f"Для выдачи подписки используйте:\n"
+            f"<code>/grant {user_id} 1M</code>"
+        ))
     
+    @staticmethod
+    def expiry_digest_messages(
+        admin_ids: list[int],
+        expired: list[tuple[str, datetime]]
+    ) -> list[OutboxMessage]:
+        """
+        Сводка об истекших подписках для каждого админа
+        
+        Args:
+            expired: (хеш пользователя, expires_at) истекших подписок
+        
+        Returns:
+            Сообщения сводки (с разбивкой по 4096 символов) для всех админов
+        """
+        if not expired:
+            return []
+        
+        header = (
+            f"⏰ Истекло подписок: {len(expired)}\n"
+            f"Запросите у пользователей их ID для продления.\n"
+        )
+        lines = [
+            f"• <code>{user_id_hash[:16]}...</code> ({SubscriptionService.format_datetime_moscow(expires_at)} МСК)"
+            for user_id_hash, expires_at in expired
+        ]
+        
+        messages = []
+        for page in paginate_lines(header, lines):
+            messages.extend(NotificationService.admin_messages(admin_ids, page))
+        return messages
+
+
+# Ссылки на фоновые задачи, чтобы их не собрал GC до завершения
+_background_tasks: set[asyncio.Task] = set()
+
+
+def notify_in_background(coro: Coroutine[Any, Any, Any]) -> asyncio.Task:
+    """
+    Запускает постановку уведомления отдельной задачей, не задерживая хендлер
     
-    async def notify_admins_subscription_expired(
-        self, 
-        admin_ids: list[int], 
-        user_id_hash: str
-    ) -> None:
-        """Уведомляет админов об истечении подписки пользователя"""
-        for admin_id in admin_ids:
-            try:
-                await self.bot.send_message(
-                    admin_id,
-                    f"⏰ Подписка пользователя истекла:\n\n"
-                    f"ID Hash: <code>{user_id_hash[:16]}...</code>\n\n"
-                    f"Запросите у пользователя его ID для продления.",
-                    parse_mode="HTML"
-                )
-            except Exception as e:
-                logger.error(f"Не удалось уведомить админа {admin_id} об истечении подписки: {e}")
+    Пример: notify_in_background(NotificationService.notify_admins_new_user(...))
+    """
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_on_background_done)
+    return task
+
+
+def _on_background_done(task: asyncio.Task) -> None:
+    _background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Ошибка фонового уведомления: {task.exception()}")
+
+
+async def drain_background_notifications(timeout: float = 10) -> None:
+    """Дожидается фоновых задач уведомлений при остановке (не дольше timeout)"""
+    if _background_tasks:
+        await asyncio.wait(set(_background_tasks), timeout=timeout)
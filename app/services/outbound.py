@@ -0,0 +1,250 @@
+"""
+Очередь исходящих вызовов Telegram с ограничением частоты.
+
+Лимиты Bot API: около 30 сообщений в секунду на бота, около одного
+сообщения в секунду в личный чат (короткие всплески допустимы) и 20 в
+минуту в группу. Перед каждым вызовом, адресованным чату, берется токен
+из общего бакета и из бакета чата. Ожидающие вызовы обслуживаются по
+приоритету: ответы пользователям раньше уведомлений админам.
+"""
+import asyncio
+import bisect
+import contextvars
+import itertools
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional, Union
+
+from app.constants import BACKGROUND, INTERACTIVE
+
+_priority: contextvars.ContextVar[int] = contextvars.ContextVar("outbound_priority", default=INTERACTIVE)
+
+# Бакеты чатов, не использовавшиеся дольше этого времени, удаляются
+IDLE_BUCKET_SECONDS = 300
+
+
+@contextmanager
+def outbound_priority(priority: int) -> Iterator[None]:
+    """
+    Задает приоритет вызовов Bot API внутри блока (и в созданных в нем задачах)
+
+        with outbound_priority(BACKGROUND):
+            await bot.send_message(admin_id, ...)
+    """
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+class TokenBucket:
+    """Бакет токенов: rate токенов в секунду, не больше capacity"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated", "blocked_until")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Через сколько секунд будет доступен токен (0 - доступен сейчас)"""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def block(self, seconds: float) -> None:
+        """Запрещает выдачу токенов на seconds (ответ 429 с retry_after)"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+    def is_idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity and now >= self.blocked_until
+
+
+class _Waiter:
+    __slots__ = ("key", "chat_id", "future")
+
+    def __init__(self, key: tuple[int, int], chat_id: Union[int, str], future: asyncio.Future):
+        self.key = key
+        self.chat_id = chat_id
+        self.future = future
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return self.key < other.key
+
+
+class OutboundDispatcher:
+    """
+    Выдает разрешения на вызовы Bot API с учетом лимитов
+
+    Ожидающие упорядочены по (приоритет, очередь поступления). Разрешение
+    получает первый ожидающий, у чата которого есть токен: занятый чат не
+    задерживает сообщения в другие чаты.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = 30,
+        chat_rate: float = 1,
+        chat_burst: float = 3,
+        group_rate: float = 20 / 60
+    ):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats: dict[Union[int, str], TokenBucket] = {}
+        self._waiters: list[_Waiter] = []
+        self._sequence = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._pump_task: Optional[asyncio.Task] = None
+        self._last_prune = time.monotonic()
+        self.retry_after_count = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def queue_depth_by_priority(self) -> dict[int, int]:
+        depth = {INTERACTIVE: 0, BACKGROUND: 0}
+        for waiter in self._waiters:
+            depth[waiter.key[0]] = depth.get(waiter.key[0], 0) + 1
+        return depth
+
+    async def acquire(self, chat_id: Union[int, str], priority: Optional[int] = None) -> None:
+        """Ждет разрешения отправить вызов в чат chat_id"""
+        if priority is None:
+            priority = current_priority()
+
+        now = time.monotonic()
+        bucket = self._chat_bucket(chat_id)
+        if not self._waiters and not self._global.wait_time(now) and not bucket.wait_time(now):
+            self._global.consume(now)
+            bucket.consume(now)
+            self._prune(now)
+            return
+
+        waiter = _Waiter((priority, next(self._sequence)), chat_id, asyncio.get_running_loop().create_future())
+        bisect.insort(self._waiters, waiter)
+        self._ensure_pump()
+        self._wakeup.set()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.cancelled():
+                self._remove(waiter)
+            raise
+
+    def retry_after(self, chat_id: Optional[Union[int, str]], seconds: float) -> None:
+        """Учитывает ответ 429: чат (или весь бот, если чат неизвестен) ждет seconds"""
+        self.retry_after_count += 1
+        if chat_id is None:
+            self._global.block(seconds)
+        else:
+            self._chat_bucket(chat_id).block(seconds)
+        self._wakeup.set()
+
+    def _chat_bucket(self, chat_id: Union[int, str]) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            # Отрицательный ID и @username - группы и каналы
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            rate = self.group_rate if is_group else self.chat_rate
+            bucket = self._chats[chat_id] = TokenBucket(rate, 1 if is_group else self.chat_burst)
+        return bucket
+
+    def _remove(self, waiter: _Waiter) -> None:
+        index = bisect.bisect_left(self._waiters, waiter)
+        if index < len(self._waiters) and self._waiters[index] is waiter:
+            del self._waiters[index]
+
+    def _ensure_pump(self) -> None:
+        if self._pump_task is None or self._pump_task.done():
+            self._pump_task = asyncio.create_task(self._pump())
+
+    async def _pump(self) -> None:
+        """Раздает разрешения ожидающим, пока очередь не опустеет"""
+        while self._waiters:
+            self._wakeup.clear()
+            now = time.monotonic()
+
+            global_wait = self._global.wait_time(now)
+            if global_wait:
+                await self._sleep(global_wait)
+                continue
+
+            next_ready: Optional[float] = None
+            for index, waiter in enumerate(self._waiters):
+                bucket = self._chat_bucket(waiter.chat_id)
+                chat_wait = bucket.wait_time(now)
+                if chat_wait:
+                    next_ready = chat_wait if next_ready is None else min(next_ready, chat_wait)
+                    continue
+                del self._waiters[index]
+                self._global.consume(now)
+                bucket.consume(now)
+                if not waiter.future.done():
+                    waiter.future.set_result(None)
+                break
+            else:
+                await self._sleep(next_ready)
+            # Даем разбуженному вызову стартовать до следующего круга
+            await asyncio.sleep(0)
+
+        self._prune(time.monotonic())
+
+    async def _sleep(self, seconds: Optional[float]) -> None:
+        """Спит до seconds, просыпается раньше при новом ожидающем или 429"""
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    def _prune(self, now: float) -> None:
+        if now - self._last_prune < IDLE_BUCKET_SECONDS:
+            return
+        self._last_prune = now
+        for chat_id in [chat_id for chat_id, bucket in self._chats.items() if bucket.is_idle(now)]:
+            del self._chats[chat_id]
+
+
+_dispatcher: Optional[OutboundDispatcher] = None
+
+
+def init_outbound(
+    global_rate: float = 30,
+    chat_rate: float = 1,
+    chat_burst: float = 3,
+    group_rate: float = 20 / 60
+) -> OutboundDispatcher:
+    """Инициализирует очередь исходящих вызовов"""
+    global _dispatcher
+    _dispatcher = OutboundDispatcher(global_rate, chat_rate, chat_burst, group_rate)
+    return _dispatcher
+
+
+def get_outbound() -> OutboundDispatcher:
+    """Получает текущую очередь исходящих вызовов"""
+    if _dispatcher is None:
+        raise RuntimeError("Outbound dispatcher не инициализирован")
+    return _dispatcher
@@ -0,0 +1,91 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import Message
+
+from app.constants import MAX_MESSAGE_LENGTH
+from app.utils.text import split_position
+
+logger = logging.getLogger(__name__)
+
+
+class ProgressiveReply:
+    """
+    Ответ, который дописывается по мере генерации
+
+    Редактирует сообщение-заглушку не чаще edit_interval секунд. Когда текст
+    превышает лимит Telegram, сообщение фиксируется и продолжение идет в новое.
+    Пока идет генерация, текст отправляется без разметки (HTML может быть
+    незакрытым), в конце каждое сообщение один раз рендерится с HTML.
+    """
+
+    def __init__(
+        self,
+        placeholder: Message,
+        edit_interval: float = 1.0,
+        max_length: int = MAX_MESSAGE_LENGTH
+    ):
+        self.edit_interval = edit_interval
+        self.max_length = max_length
+        self._message = placeholder
+        self._text = ""
+        self._shown_text = ""
+        self._last_edit = 0.0
+        self._lock = asyncio.Lock()
+
+    @property
+    def has_content(self) -> bool:
+        return bool(self._text)
+
+    async def append(self, delta: str) -> None:
+        """Добавляет фрагмент текста, при необходимости обновляет сообщение"""
+        self._text += delta
+
+        while len(self._text) > self.max_length:
+            # Граница по строке или пробелу, не внутри HTML-тега (как в split_message)
+            cut = split_position(self._text, self.max_length)
+            head, self._text = self._text[:cut], self._text[cut:].lstrip()
+            await self._finalize(head)
+            self._message = await self._message.answer(self._text[:self.max_length] or "…")
+            self._shown_text = self._text[:self.max_length]
+            self._last_edit = time.monotonic()
+
+        if time.monotonic() - self._last_edit >= self.edit_interval:
+            await self._edit(self._text)
+
+    async def set_status(self, text: str) -> None:
+        """Показывает служебный статус (очередь и т.п.), пока ответа еще нет"""
+        async with self._lock:
+            if self._text:
+                return
+            try:
+                await self._message.edit_text(text)
+                self._shown_text = text
+            except Exception as e:
+                logger.debug(f"Не удалось обновить статус: {e}")
+
+    async def finish(self, fallback: str = "Нет ответа от AI") -> None:
+        """Фиксирует последнее сообщение (с HTML разметкой)"""
+        await self._finalize(self._text or fallback)
+
+    async def _edit(self, text: str, parse_mode: Optional[str] = None) -> None:
+        if text == self._shown_text and parse_mode is None:
+            return
+        async with self._lock:
+            try:
+                await self._message.edit_text(text, parse_mode=parse_mode)
+            except TelegramBadRequest as e:
+                if "message is not modified" not in str(e):
+                    raise
+        self._shown_text = text
+        self._last_edit = time.monotonic()
+
+    async def _finalize(self, text: str) -> None:
+        try:
+            await self._edit(text, parse_mode="HTML")
+        except Exception as html_error:
+            # Если HTML парсинг не сработал, оставляем текст без разметки
+            logger.error(f"Ошибка отправки с HTML: {html_error}")
+            await self._edit(text)
@@ -3,7 +3,8 @@ from typing import Optional
 import logging
 
 from app.db.repositories.subscriptions import SubscriptionRepository
-from app.constants import SUBSCRIPTION_DURATIONS, MOSCOW_TZ, DURATION_DESCRIPTIONS
+from app.constants import SUBSCRIPTION_DURATIONS, MOSCOW_TZ, DURATION_DESCRIPTIONS, INTERACTIVE
+from app.models.outbox import OutboxMessage, SUBSCRIPTION_GRANTED, SUBSCRIPTION_REVOKED
 from app.models.subscription import SubscriptionRecord, SubscriptionInfo
 
 logger = logging.getLogger(__name__)
@@ -18,22 +19,39 @@ class SubscriptionService:
         return await SubscriptionRepository.check_active(user_id)
     
     @staticmethod
-    async def grant(user_id: int, duration: str) -> tuple[bool, Optional[datetime]]:
-        """Выдает подписку пользователю"""
+    async def check_active_by_hash(hashed_id: str) -> bool:
+        """Проверяет активность подписки по хешу user_id"""
+        return await SubscriptionRepository.check_active_by_hash(hashed_id)
+    
+    @staticmethod
+    async def grant(user_id: int, duration: str, notify_user: bool = False) -> tuple[bool, Optional[datetime]]:
+        """Выдает подписку пользователю (notify_user - уведомление через outbox)"""
         if duration not in SUBSCRIPTION_DURATIONS:
             return False, None
         
         expires_at = datetime.now(timezone.utc) + SUBSCRIPTION_DURATIONS[duration]
-        await SubscriptionRepository.create_or_update(user_id, expires_at)
+        outbox = [OutboxMessage(
+            chat_id=user_id,
+            kind=SUBSCRIPTION_GRANTED,
+            payload={"duration": duration, "expires_at": expires_at.isoformat()},
+            priority=INTERACTIVE
+        )] if notify_user else []
+        await SubscriptionRepository.create_or_update(user_id, expires_at, outbox)
         
         logger.info(f"✅ Выдана подписка: user_id={user_id}, duration={duration}, expires_at={expires_at}")
         
         return True, expires_at
     
     @staticmethod
-    async def revoke(user_id: int) -> bool:
-        """Отзывает подписку"""
-        return await SubscriptionRepository.delete(user_id)
+    async def revoke(user_id: int, notify_user: bool = False) -> bool:
+        """Отзывает подписку (notify_user - уведомление через outbox)"""
+        outbox = [OutboxMessage(
+            chat_id=user_id,
+            kind=SUBSCRIPTION_REVOKED,
+            payload={},
+            priority=INTERACTIVE
+        )] if notify_user else []
+        return await SubscriptionRepository.delete(user_id, outbox)
     
     @staticmethod
     async def revoke_all() -> int:
@@ -69,6 +87,11 @@ class SubscriptionService:
         """Получает подписку конкретного пользователя"""
         return await SubscriptionRepository.get_by_user_id(user_id)
     
+    @staticmethod
+    async def get_subscription_by_hash(hashed_id: str) -> Optional[SubscriptionRecord]:
+        """Получает подписку по хешу user_id"""
+        return await SubscriptionRepository.get_by_hash(hashed_id)
+    
     
     @staticmethod
     def format_duration(duration: str) -> str:
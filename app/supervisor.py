@@ -0,0 +1,280 @@
+"""
+Режим нескольких процессов (WORKERS > 1).
+
+Supervisor принимает апдейты Telegram (long polling или webhook) и
+раскладывает их по очередям воркеров по chat ID: все апдейты одного чата
+попадают в один процесс и обрабатываются в порядке поступления. Воркеры
+выполняют хендлеры (хеширование, Perplexity, ответы пользователю).
+
+Задачи, которые должны работать в одном экземпляре (очистка подписок,
+доставка уведомлений из outbox), а также сервер Robokassa на порту 5000
+работают только в supervisor.
+Кэши процессов синхронизируются через PostgreSQL LISTEN/NOTIFY.
+"""
+import asyncio
+import logging
+import multiprocessing
+import signal
+from collections import deque
+from multiprocessing.context import SpawnContext, SpawnProcess
+from typing import Awaitable, Callable, Optional
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiohttp import web
+
+from app import main as bootstrap
+from app.config import config
+from app.services.notifications import drain_background_notifications
+from app.webhook.metrics import start_metrics_server
+from app.webhook.robokassa_webhook import create_webhook_app
+from app.webhook.telegram_webhook import setup_update_forwarding, set_telegram_webhook
+
+logger = logging.getLogger(__name__)
+
+WORKER_CHECK_INTERVAL_SECONDS = 5
+WORKER_STOP_TIMEOUT_SECONDS = 30
+POLLING_TIMEOUT_SECONDS = 10
+POLLING_MAX_BACKOFF_SECONDS = 60
+
+
+def update_chat_id(update: dict) -> int:
+    """
+    Chat ID апдейта для выбора воркера
+
+    Для callback_query берется чат сообщения с кнопкой, для апдейтов без
+    чата (inline-запросы и т.п.) - ID пользователя, иначе 0.
+    """
+    for key, payload in update.items():
+        if key == "update_id" or not isinstance(payload, dict):
+            continue
+        chat = payload.get("chat") or (payload.get("message") or {}).get("chat")
+        if chat and "id" in chat:
+            return chat["id"]
+        user = payload.get("from") or payload.get("user")
+        if user and "id" in user:
+            return user["id"]
+    return 0
+
+
+class UpdateRouter:
+    """Раскладывает апдейты по очередям воркеров"""
+
+    def __init__(self, queues: list[multiprocessing.Queue]):
+        self.queues = queues
+        self.routed = 0
+
+    def route(self, update: dict) -> None:
+        # put() не блокирует: запись в pipe делает фоновый поток очереди
+        self.queues[update_chat_id(update) % len(self.queues)].put(update)
+        self.routed += 1
+
+
+class ChatSerializer:
+    """
+    Последовательная обработка апдейтов внутри чата
+
+    Апдейты одного чата обрабатываются по одному в порядке поступления,
+    разные чаты - параллельно. Для чата с необработанными апдейтами
+    работает одна задача-потребитель; она завершается, когда очередь
+    чата опустеет.
+    """
+
+    def __init__(self, handler: Callable[[dict], Awaitable[None]]):
+        self._handler = handler
+        self._pending: dict[int, deque[dict]] = {}
+        self._consumers: set[asyncio.Task] = set()
+
+    @property
+    def active_chats(self) -> int:
+        return len(self._pending)
+
+    def submit(self, update: dict) -> None:
+        chat_id = update_chat_id(update)
+        pending = self._pending.get(chat_id)
+        if pending is not None:
+            pending.append(update)
+            return
+
+        self._pending[chat_id] = deque([update])
+        task = asyncio.create_task(self._consume(chat_id))
+        self._consumers.add(task)
+        task.add_done_callback(self._consumers.discard)
+
+    async def _consume(self, chat_id: int) -> None:
+        pending = self._pending[chat_id]
+        try:
+            while pending:
+                # Апдейт остается в очереди до конца обработки: пока она не пуста,
+                # новые апдейты чата дописываются сюда, а не в новую задачу
+                await self._handler(pending[0])
+                pending.popleft()
+        finally:
+            del self._pending[chat_id]
+
+    async def join(self, timeout: Optional[float] = None) -> None:
+        """Ждет обработки всех принятых апдейтов (не дольше timeout)"""
+        if self._consumers:
+            await asyncio.wait(set(self._consumers), timeout=timeout)
+
+
+def _worker_process(index: int, queue: multiprocessing.Queue) -> None:
+    """Точка входа процесса-воркера"""
+    # Остановкой управляет supervisor (через None в очереди)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    asyncio.run(_run_worker(index, queue))
+
+
+async def _process_update(dp: Dispatcher, bot: Bot, update: dict) -> None:
+    try:
+        await dp.feed_raw_update(bot, update)
+    except Exception as e:
+        logger.error(f"Ошибка обработки апдейта {update.get('update_id')}: {e}")
+
+
+async def _run_worker(index: int, queue: multiprocessing.Queue) -> None:
+    logger.info(f"🧩 Воркер #{index} запускается")
+
+    await bootstrap.init_database()
+    await bootstrap.init_fact_checking()
+
+    bot = bootstrap.create_bot()
+    dp = bootstrap.create_dispatcher()
+    background_tasks = bootstrap.start_background_tasks(bot, singletons=False)
+
+    # Воркер i отдает метрики на METRICS_PORT + 1 + i (порт supervisor'а - METRICS_PORT)
+    metrics_port = config.metrics_port + 1 + index
+    runner = await start_metrics_server(config.metrics_host, metrics_port)
+
+    logger.info(f"✅ Воркер #{index} готов (метрики: http://{config.metrics_host}:{metrics_port}/metrics)")
+
+    loop = asyncio.get_running_loop()
+    chats = ChatSerializer(lambda update: _process_update(dp, bot, update))
+    try:
+        while True:
+            update = await loop.run_in_executor(None, queue.get)
+            if update is None:
+                break
+            # Разные чаты обрабатываются параллельно, апдейты одного чата - по очереди
+            chats.submit(update)
+    finally:
+        await chats.join(timeout=WORKER_STOP_TIMEOUT_SECONDS)
+        await bootstrap.stop_background_tasks(background_tasks)
+        await runner.cleanup()
+        await drain_background_notifications()
+        await bootstrap.close_services()
+        await bot.session.close()
+        logger.info(f"👋 Воркер #{index} остановлен")
+
+
+def _start_worker(ctx: SpawnContext, index: int, queue: multiprocessing.Queue) -> SpawnProcess:
+    process = ctx.Process(target=_worker_process, args=(index, queue), name=f"factchecker-worker-{index}")
+    process.start()
+    return process
+
+
+async def _watch_workers(ctx: SpawnContext, processes: list[SpawnProcess], queues: list[multiprocessing.Queue]) -> None:
+    """Перезапускает упавших воркеров (апдейты в их очередях сохраняются)"""
+    while True:
+        await asyncio.sleep(WORKER_CHECK_INTERVAL_SECONDS)
+        for index, process in enumerate(processes):
+            if not process.is_alive():
+                logger.error(f"💥 Воркер #{index} завершился (код {process.exitcode}), перезапуск")
+                processes[index] = _start_worker(ctx, index, queues[index])
+
+
+async def _poll_updates(bot: Bot, allowed_updates: list[str], router: UpdateRouter) -> None:
+    """Long polling в supervisor: апдейты не обрабатываются, а передаются воркерам"""
+    offset: Optional[int] = None
+    failures = 0
+    while True:
+        try:
+            updates: list[Update] = await bot.get_updates(
+                offset=offset,
+                timeout=POLLING_TIMEOUT_SECONDS,
+                allowed_updates=allowed_updates,
+                request_timeout=POLLING_TIMEOUT_SECONDS + 10
+            )
+        except Exception as e:
+            delay = min(POLLING_MAX_BACKOFF_SECONDS, 2 ** failures)
+            failures += 1
+            logger.error(f"Ошибка getUpdates: {e}; повтор через {delay} с")
+            await asyncio.sleep(delay)
+            continue
+
+        failures = 0
+        for update in updates:
+            router.route(update.model_dump(mode="json", exclude_unset=True, by_alias=True))
+            offset = update.update_id + 1
+
+
+async def _stop_workers(processes: list[SpawnProcess], queues: list[multiprocessing.Queue]) -> None:
+    for queue in queues:
+        queue.put(None)
+
+    loop = asyncio.get_running_loop()
+    for index, process in enumerate(processes):
+        await loop.run_in_executor(None, process.join, WORKER_STOP_TIMEOUT_SECONDS)
+        if process.is_alive():
+            logger.warning(f"Воркер #{index} не остановился за {WORKER_STOP_TIMEOUT_SECONDS} с, завершаем")
+            process.terminate()
+
+
+async def run_supervisor(workers: int) -> None:
+    """Запускает supervisor и workers процессов-обработчиков"""
+    logger.info(f"🚀 Запуск fact-checker бота: supervisor и {workers} воркеров")
+
+    # spawn, а не fork: воркеры не наследуют event loop и соединения supervisor
+    ctx = multiprocessing.get_context("spawn")
+    queues = [ctx.Queue() for _ in range(workers)]
+    processes = [_start_worker(ctx, index, queue) for index, queue in enumerate(queues)]
+    router = UpdateRouter(queues)
+
+    await bootstrap.init_database()
+    bot = bootstrap.create_bot()
+    # Диспетчер supervisor'а апдейты не обрабатывает, он нужен для allowed_updates
+    dp = bootstrap.create_dispatcher()
+
+    # Одиночные задачи работают только здесь
+    background_tasks = bootstrap.start_background_tasks(bot, keepalive=False)
+    background_tasks.append(asyncio.create_task(_watch_workers(ctx, processes, queues)))
+
+    webhook_app = create_webhook_app(bot)
+    if config.bot_mode == "webhook":
+        setup_update_forwarding(webhook_app, config.webhook_path, config.webhook_secret, router.route)
+    runner = web.AppRunner(webhook_app)
+    await runner.setup()
+    site = web.TCPSite(runner, '0.0.0.0', 5000)
+    await site.start()
+    metrics_runner = await start_metrics_server(config.metrics_host, config.metrics_port)
+
+    logger.info(f"🌐 Webhook сервер запущен на http://0.0.0.0:5000")
+    logger.info(f"📊 Метрики: http://{config.metrics_host}:{config.metrics_port}/metrics")
+
+    try:
+        if config.bot_mode == "webhook":
+            webhook_url = config.webhook_url.rstrip("/") + config.webhook_path
+            await set_telegram_webhook(
+                bot,
+                dp,
+                webhook_url,
+                config.webhook_secret,
+                config.webhook_max_connections
+            )
+        else:
+            # Webhook, оставшийся от режима webhook, мешает getUpdates
+            await bot.delete_webhook()
+            background_tasks.append(
+                asyncio.create_task(_poll_updates(bot, dp.resolve_used_update_types(), router))
+            )
+
+        await bootstrap.wait_for_stop_signal()
+    finally:
+        await bootstrap.stop_background_tasks(background_tasks)
+        await runner.cleanup()
+        await metrics_runner.cleanup()
+        await _stop_workers(processes, queues)
+        await drain_background_notifications()
+        await bootstrap.close_services()
+        await bot.session.close()
+        logger.info(f"👋 Бот остановлен (передано апдейтов: {router.routed})")
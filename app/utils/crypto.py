@@ -1,6 +1,15 @@
+import asyncio
 import hashlib
+import logging
 import secrets
-from typing import Union
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional, Union
+
+from app.utils.metrics import registry
+from app.utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
 
 
 SCRYPT_N = 8192
@@ -9,6 +18,18 @@ SCRYPT_P = 1
 SCRYPT_DKLEN = 64
 SALT_LENGTH = 16
 
+_executor: Optional[Executor] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+
+HASH_SECONDS = registry.histogram(
+    "factchecker_hash_user_id_seconds",
+    "Scrypt user ID hashing latency on cache miss (including wait for a worker)"
+)
+
+# Кэш "user_id -> хеш" для горячих пользователей (хеш детерминирован для данного pepper)
+_hash_cache: TTLCache[str, str] = TTLCache(max_size=10_000, ttl=3600)
+_hash_cache_pepper: Optional[bytes] = None
+
 
 def hash_user_id(user_id: Union[int, str], pepper: str = "") -> str:
     """
@@ -49,6 +70,109 @@ def hash_user_id(user_id: Union[int, str], pepper: str = "") -> str:
     return scrypt_hash.hex()
 
 
+def init_hash_executor(kind: str = "thread", max_workers: int = 4) -> Executor:
+    """
+    Инициализирует пул для вычисления Scrypt вне event loop
+    
+    Каждое вычисление занимает ~8 МБ памяти, поэтому число одновременных
+    вычислений ограничено max_workers. Остальные запросы ждут в event loop
+    на семафоре и не занимают память пула.
+    
+    Args:
+        kind: "thread" (hashlib.scrypt отпускает GIL) или "process"
+        max_workers: Максимум одновременных вычислений
+    
+    Returns:
+        Созданный executor
+    """
+    global _executor, _semaphore
+    
+    shutdown_hash_executor()
+    
+    if kind == "process":
+        _executor = ProcessPoolExecutor(max_workers=max_workers)
+    else:
+        _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scrypt")
+    _semaphore = asyncio.Semaphore(max_workers)
+    
+    logger.info(f"🔐 Пул хеширования: {kind}, воркеров: {max_workers}")
+    return _executor
+
+
+def shutdown_hash_executor() -> None:
+    """Останавливает пул хеширования"""
+    global _executor, _semaphore
+    if _executor:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+        _semaphore = None
+
+
+def init_hash_cache(max_size: int = 10_000, ttl: Optional[float] = 3600) -> None:
+    """
+    Настраивает кэш хешей
+    
+    Args:
+        max_size: Максимум пользователей в кэше (0 - кэш отключен)
+        ttl: Время жизни записи в секундах
+    """
+    global _hash_cache, _hash_cache_pepper
+    _hash_cache = TTLCache(max_size=max_size, ttl=ttl)
+    _hash_cache_pepper = None
+
+
+def get_hash_cache_stats() -> dict:
+    """Возвращает статистику кэша хешей (size, hits, misses, evictions)"""
+    return _hash_cache.stats()
+
+
+def _check_cache_pepper(pepper: str) -> None:
+    """Сбрасывает кэш, если pepper изменился (старые хеши больше не валидны)"""
+    global _hash_cache_pepper
+    fingerprint = hashlib.sha256(pepper.encode('utf-8')).digest()
+    if fingerprint != _hash_cache_pepper:
+        if _hash_cache_pepper is not None:
+            logger.warning("🔄 HASH_SALT изменился - кэш хешей очищен")
+        _hash_cache.clear()
+        _hash_cache_pepper = fingerprint
+
+
+async def hash_user_id_async(user_id: Union[int, str], pepper: str = "") -> str:
+    """
+    Асинхронная версия hash_user_id - не блокирует event loop
+    
+    Результат берется из кэша, если пользователь недавно хешировался.
+    Если пул не был инициализирован, создается пул потоков по умолчанию.
+    
+    Args:
+        user_id: Telegram user ID (int или str)
+        pepper: Секретный ключ (из переменной окружения HASH_SALT)
+    
+    Returns:
+        Scrypt хеш в hex формате (128 символов)
+    """
+    _check_cache_pepper(pepper)
+    key = str(user_id)
+    cached = _hash_cache.get(key)
+    if cached is not None:
+        return cached
+    
+    if _executor is None or _semaphore is None:
+        init_hash_executor()
+    
+    executor, semaphore = _executor, _semaphore
+    started = time.perf_counter()
+    async with semaphore:  # type: ignore[union-attr]
+        loop = asyncio.get_running_loop()
+        hashed = await loop.run_in_executor(executor, hash_user_id, user_id, pepper)
+    HASH_SECONDS.observe(time.perf_counter() - started)
+    
+    # Pepper мог смениться, пока шло вычисление
+    _check_cache_pepper(pepper)
+    _hash_cache.set(key, hashed)
+    return hashed
+
+
 def verify_user_id(user_id: Union[int, str], hash_value: str, pepper: str = "") -> bool:
     """
     Проверяет соответствие user_id и хеша с использованием защищенного сравнения
@@ -68,6 +192,15 @@ def verify_user_id(user_id: Union[int, str], hash_value: str, pepper: str = "")
         return False
 
 
+async def verify_user_id_async(user_id: Union[int, str], hash_value: str, pepper: str = "") -> bool:
+    """Асинхронная версия verify_user_id - не блокирует event loop"""
+    try:
+        expected_hash = await hash_user_id_async(user_id, pepper)
+        return secrets.compare_digest(expected_hash, hash_value)
+    except Exception:
+        return False
+
+
 def _generate_deterministic_salt(user_id_bytes: bytes, pepper_bytes: bytes) -> bytes:
     """
     Генерирует детерминированную соль из user_id + pepper
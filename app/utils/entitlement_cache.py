@@ -0,0 +1,78 @@
+"""
+Кэш прав доступа (подписок) в памяти процесса.
+Хранит expires_at по хешу пользователя, чтобы check_active не ходил в БД
+на каждое сообщение. Обновляется при выдаче/отзыве/истечении подписки.
+"""
+from datetime import datetime, timezone
+from typing import Optional
+
+from app.utils.ttl_cache import TTLCache
+
+# Маркер "подписки нет" (отрицательный результат тоже кэшируется, но недолго)
+_NO_SUBSCRIPTION = datetime.min
+
+_cache: TTLCache[str, datetime] = TTLCache(max_size=10_000)
+_max_ttl: float = 300
+_negative_ttl: float = 30
+
+
+def init_entitlement_cache(max_size: int = 10_000, ttl: float = 300, negative_ttl: float = 30) -> None:
+    """
+    Настраивает кэш подписок
+
+    Args:
+        max_size: Максимум пользователей в кэше (0 - кэш отключен)
+        ttl: Максимальное время жизни записи об активной подписке
+        negative_ttl: Время жизни записи об отсутствии подписки
+    """
+    global _cache, _max_ttl, _negative_ttl
+    _cache = TTLCache(max_size=max_size)
+    _max_ttl = ttl
+    _negative_ttl = negative_ttl
+
+
+def get_cached_access(hashed_id: str) -> Optional[bool]:
+    """Возвращает True/False из кэша или None, если нужно идти в БД"""
+    expires_at = _cache.get(hashed_id)
+    if expires_at is None:
+        return None
+    if expires_at == _NO_SUBSCRIPTION:
+        return False
+    return _utcnow_naive() < expires_at
+
+
+def store_access(hashed_id: str, expires_at: Optional[datetime]) -> None:
+    """
+    Сохраняет срок подписки (naive UTC, как в БД) или её отсутствие
+
+    Активная подписка кэшируется не дольше, чем до момента истечения.
+    """
+    if expires_at is not None and expires_at.tzinfo is not None:
+        expires_at = expires_at.astimezone(timezone.utc).replace(tzinfo=None)
+
+    now = _utcnow_naive()
+    if expires_at is None or expires_at <= now:
+        _cache.set(hashed_id, _NO_SUBSCRIPTION, ttl=_negative_ttl)
+        return
+
+    ttl = min(_max_ttl, (expires_at - now).total_seconds())
+    _cache.set(hashed_id, expires_at, ttl=ttl)
+
+
+def invalidate_access(hashed_id: str) -> None:
+    """Удаляет пользователя из кэша (следующая проверка пойдет в БД)"""
+    _cache.pop(hashed_id)
+
+
+def clear_access_cache() -> None:
+    """Полностью очищает кэш подписок"""
+    _cache.clear()
+
+
+def get_access_cache_stats() -> dict:
+    """Возвращает статистику кэша подписок"""
+    return _cache.stats()
+
+
+def _utcnow_naive() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
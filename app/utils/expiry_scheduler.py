@@ -0,0 +1,166 @@
+"""
+Расписание истечения подписок (min-heap по expires_at).
+
+Задача очистки спит ровно до ближайшего истечения, а не опрашивает таблицу
+по таймеру. Куча загружается из БД (ORDER BY expires_at по idx_expires_at)
+и дополняется при выдаче/отзыве подписки - в этом процессе напрямую из
+репозитория, из других процессов и реплик через события кэша.
+
+Расписание работает только там, где запущена задача очистки; в остальных
+процессах schedule_expiry/cancel_expiry ничего не делают.
+"""
+import asyncio
+import heapq
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Optional
+
+# Загрузчик ближайших истечений: limit -> [{"user_id", "expires_at"}, ...] по возрастанию
+ExpiryLoader = Callable[[int], Awaitable[list[dict]]]
+
+# Запас после дедлайна: в БД удаляются строки с expires_at < now
+_DEADLINE_SLACK_SECONDS = 0.05
+
+
+def _naive_utc(value: datetime) -> datetime:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class ExpiryScheduler:
+    """
+    Куча ближайших истечений
+
+    В памяти держится не больше load_limit ближайших записей. Если в БД их
+    больше, loaded_until - последний загруженный срок: более поздние
+    подписки не добавляются в кучу, а подгружаются, когда она опустеет.
+    Отозванные и продленные подписки удаляются из кучи лениво.
+    resync_interval - страховочная проверка таблицы на случай пропущенных
+    событий (например, при переподключении LISTEN).
+    """
+
+    def __init__(self, loader: ExpiryLoader, load_limit: int = 10_000, resync_interval: float = 600):
+        self.loader = loader
+        self.load_limit = load_limit
+        self.resync_interval = resync_interval
+        self._heap: list[tuple[datetime, str]] = []
+        self._deadlines: dict[str, datetime] = {}
+        self._loaded_until: Optional[datetime] = None
+        self._needs_reload = True
+        self._last_run = time.monotonic()
+        self._wakeup = asyncio.Event()
+
+    @property
+    def size(self) -> int:
+        return len(self._deadlines)
+
+    def schedule(self, user_id_hash: str, expires_at: datetime) -> None:
+        """Добавляет или переносит истечение подписки"""
+        expires_at = _naive_utc(expires_at)
+        if self._loaded_until is not None and expires_at > self._loaded_until:
+            # Будет загружено из БД, когда дойдет очередь
+            self._deadlines.pop(user_id_hash, None)
+            return
+
+        self._deadlines[user_id_hash] = expires_at
+        heapq.heappush(self._heap, (expires_at, user_id_hash))
+        if self._heap[0][1] == user_id_hash:
+            self._wakeup.set()
+
+    def cancel(self, user_id_hash: str) -> None:
+        """Подписка отозвана: запись в куче станет неактуальной"""
+        self._deadlines.pop(user_id_hash, None)
+
+    def clear(self) -> None:
+        """Все подписки удалены"""
+        self._heap.clear()
+        self._deadlines.clear()
+        self._loaded_until = None
+
+    def next_deadline(self) -> Optional[datetime]:
+        """Ближайшее актуальное истечение (неактуальные записи выбрасываются)"""
+        while self._heap:
+            expires_at, user_id_hash = self._heap[0]
+            if self._deadlines.get(user_id_hash) == expires_at:
+                return expires_at
+            heapq.heappop(self._heap)
+        return None
+
+    async def reload(self) -> None:
+        """Загружает ближайшие истечения из БД"""
+        rows = await self.loader(self.load_limit)
+        self._deadlines = {row["user_id"]: _naive_utc(row["expires_at"]) for row in rows}
+        self._heap = [(expires_at, user_id_hash) for user_id_hash, expires_at in self._deadlines.items()]
+        heapq.heapify(self._heap)
+        # Строки отсортированы по expires_at: последняя - граница загруженной части
+        self._loaded_until = _naive_utc(rows[-1]["expires_at"]) if rows and len(rows) >= self.load_limit else None
+        self._needs_reload = False
+
+    async def wait_until_due(self) -> None:
+        """Ждет ближайшего истечения (или страховочной проверки)"""
+        while True:
+            if self._needs_reload:
+                await self.reload()
+
+            now = datetime.now(timezone.utc).replace(tzinfo=None)
+            timeout = self.resync_interval - (time.monotonic() - self._last_run)
+            deadline = self.next_deadline()
+            if deadline is not None:
+                timeout = min(timeout, (deadline - now).total_seconds() + _DEADLINE_SLACK_SECONDS)
+            elif self._loaded_until is not None:
+                # Загруженная часть закончилась, в БД есть более поздние
+                self._needs_reload = True
+                continue
+
+            if timeout <= 0:
+                return
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def mark_processed(self) -> None:
+        """Истекшие подписки обработаны: убирает прошедшие сроки из кучи"""
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        while self._heap and self._heap[0][0] < now:
+            _, user_id_hash = heapq.heappop(self._heap)
+            if self._deadlines.get(user_id_hash, now) < now:
+                del self._deadlines[user_id_hash]
+
+        if time.monotonic() - self._last_run >= self.resync_interval:
+            # Страховочная проверка заодно перечитывает кучу из БД
+            self._needs_reload = True
+        self._last_run = time.monotonic()
+
+
+_scheduler: Optional[ExpiryScheduler] = None
+
+
+def init_expiry_scheduler(loader: ExpiryLoader, load_limit: int = 10_000, resync_interval: float = 600) -> ExpiryScheduler:
+    """Создает расписание (вызывается задачей очистки)"""
+    global _scheduler
+    _scheduler = ExpiryScheduler(loader, load_limit, resync_interval)
+    return _scheduler
+
+
+def get_expiry_scheduler() -> Optional[ExpiryScheduler]:
+    """Текущее расписание или None, если задача очистки работает в другом процессе"""
+    return _scheduler
+
+
+def schedule_expiry(user_id_hash: str, expires_at: datetime) -> None:
+    if _scheduler is not None:
+        _scheduler.schedule(user_id_hash, expires_at)
+
+
+def cancel_expiry(user_id_hash: str) -> None:
+    if _scheduler is not None:
+        _scheduler.cancel(user_id_hash)
+
+
+def clear_expiries() -> None:
+    if _scheduler is not None:
+        _scheduler.clear()
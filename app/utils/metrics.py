@@ -0,0 +1,223 @@
+"""
+Метрики в формате Prometheus (text exposition 0.0.4) без внешних зависимостей.
+
+Запись метрики - это несколько операций со словарем и bisect, поэтому её
+можно вызывать на горячем пути. Значения, которые дорого считать (размер
+пула, глубина очереди, число подписок), собираются коллекторами только
+в момент запроса /metrics.
+"""
+import functools
+import time
+from bisect import bisect_left
+from typing import Awaitable, Callable, Iterable, Optional, Union
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Результат коллектора: (метки, значение)
+Sample = tuple[dict[str, str], float]
+Collector = Callable[[], Union[Iterable[Sample], Awaitable[Iterable[Sample]]]]
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _labels(self, key: tuple[str, ...], extra: Optional[dict[str, str]] = None) -> str:
+        pairs = list(zip(self.labelnames, key))
+        if extra:
+            pairs.extend(extra.items())
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._render_samples())
+        return lines
+
+    def _render_samples(self) -> list[str]:
+        raise NotImplementedError
+
+
+class _ValueMetric(_Metric):
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def set(self, value: float, **labels: str) -> None:
+        self._values[self._key(labels)] = value
+
+    def _render_samples(self) -> list[str]:
+        return [f"{self.name}{self._labels(key)} {_format(value)}" for key, value in self._values.items()]
+
+
+class Counter(_ValueMetric):
+    """
+    Монотонно растущий счетчик
+
+    set() используется только коллекторами, которые читают готовый
+    счетчик (например, попадания в кэш из TTLCache.stats()).
+    """
+
+    type_name = "counter"
+
+
+class Gauge(_ValueMetric):
+    """Значение, которое может расти и уменьшаться"""
+
+    type_name = "gauge"
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Гистограмма с фиксированными корзинами (секунды по умолчанию)"""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [счетчики по корзинам (+Inf последняя), сумма, количество]
+        self._values: dict[tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        state = self._values.get(key)
+        if state is None:
+            state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    def time(self, **labels: str) -> "_Timer":
+        """Контекстный менеджер: with HISTOGRAM.time(label=...): ..."""
+        return _Timer(self, labels)
+
+    def _render_samples(self) -> list[str]:
+        lines = []
+        for key, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else _format(bound)
+                lines.append(f"{self.name}_bucket{self._labels(key, {'le': le})} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(key)} {_format(total)}")
+            lines.append(f"{self.name}_count{self._labels(key)} {count}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram: Histogram, labels: dict[str, str]):
+        self.histogram = histogram
+        self.labels = labels
+        self.started = 0.0
+
+    def __enter__(self) -> "_Timer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+def timed(histogram: Histogram, **labels: str):
+    """Декоратор для async функций: записывает длительность вызова в гистограмму"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started, **labels)
+        return wrapper
+    return decorator
+
+
+class Registry:
+    """Набор метрик и коллекторов, отдаваемых на /metrics"""
+
+    def __init__(self):
+        self._metrics: list[_Metric] = []
+        self._collectors: list[tuple[_ValueMetric, Collector]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))  # type: ignore[return-value]
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))  # type: ignore[return-value]
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))  # type: ignore[return-value]
+
+    def add_collector(self, metric: _ValueMetric, collector: Collector) -> None:
+        """
+        Коллектор вызывается при каждом запросе /metrics (может быть async)
+        и возвращает значения метрики: [({метки}, значение), ...]
+        """
+        self._collectors.append((metric, collector))
+
+    async def render(self) -> str:
+        for metric, collector in self._collectors:
+            try:
+                result = collector()
+                if isinstance(result, Awaitable):
+                    result = await result
+                for labels, value in result:
+                    metric.set(value, **labels)
+            except Exception:
+                # Сбой коллектора не должен ломать отдачу остальных метрик
+                continue
+
+        lines: list[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format(value: float) -> str:
+    if isinstance(value, int) or (float(value).is_integer() and abs(value) < 1e15):
+        return str(int(value))
+    return repr(float(value))
+
+
+# Глобальный реестр приложения
+registry = Registry()
+
+# Ошибки по компонентам (общий счетчик для всего приложения)
+ERRORS = registry.counter("factchecker_errors_total", "Errors by component", ("component",))
@@ -0,0 +1,261 @@
+"""
+Индекс похожих утверждений (MinHash + LSH).
+Находит ранее проверенное утверждение, отличающееся пунктуацией, эмодзи,
+ссылками или мелкими правками, и отдает сохраненный ответ.
+"""
+import hashlib
+import re
+import time
+import zlib
+from array import array
+from typing import Optional
+
+_URL_RE = re.compile(r"https?://\S+|www\.\S+")
+_NON_WORD_RE = re.compile(r"[^\w]+")
+# Английские отрицания-сокращения (isn't, don't) до удаления апострофов
+_CONTRACTION_RE = re.compile(r"\w+n['’]t\b")
+
+# Слова, от которых зависит вердикт: отрицания, числа и названия месяцев
+_NEGATIONS = frozenset((
+    "не", "ни", "нет", "без", "нельзя", "никогда", "никто", "ничто", "ничего",
+    "нигде", "никак", "нисколько", "ложь", "неправда",
+    "not", "no", "never", "none", "nobody", "nothing", "neither", "nor",
+    "without", "cannot", "false"
+))
+_GUARD_RE = re.compile(
+    r"[^\d]*\d.*"
+    r"|(?:январ|феврал|апрел|июн|июл|сентябр|октябр|ноябр|декабр)[ьяеюи]?"
+    r"|(?:март|август)[ауе]?|ма[йяею]"
+    r"|january|february|march|april|may|june|july|august|september|october|november|december"
+)
+
+
+def normalize_for_similarity(text: str) -> str:
+    """Убирает регистр, ссылки, эмодзи и пунктуацию"""
+    text = _URL_RE.sub(" ", text.casefold())
+    return " ".join(_NON_WORD_RE.sub(" ", text).split())
+
+
+def shingles(text: str, size: int = 2) -> set[str]:
+    """Словесные n-граммы нормализованного текста"""
+    return _shingles(normalize_for_similarity(text).split(), size)
+
+
+def guard_tokens(text: str) -> tuple[str, ...]:
+    """
+    Слова, которые должны совпадать у похожих утверждений
+
+    Отрицания, числа и даты меняют вердикт, даже если остальной текст
+    совпадает, поэтому ответ переиспользуется только при равенстве этих
+    слов (с учетом повторов).
+    """
+    folded = _URL_RE.sub(" ", text.casefold())
+    tokens = ["not"] * len(_CONTRACTION_RE.findall(folded))
+    tokens.extend(
+        word for word in _NON_WORD_RE.sub(" ", folded).split()
+        if word in _NEGATIONS or _GUARD_RE.fullmatch(word)
+    )
+    return tuple(sorted(tokens))
+
+
+def _shingles(words: list[str], size: int) -> set[str]:
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+class Fingerprint:
+    """Сигнатура утверждения: считается один раз и для поиска, и для добавления"""
+
+    __slots__ = ("signature", "shingles", "guard")
+
+    def __init__(self, signature: array, shingles: frozenset[int], guard: tuple[str, ...]):
+        self.signature = signature
+        self.shingles = shingles
+        self.guard = guard
+
+
+class NearDuplicateIndex:
+    """
+    MinHash/LSH индекс последних проверенных утверждений
+
+    LSH только подбирает кандидатов. Ответ отдается, если у кандидата те же
+    отрицания, числа и даты (guard_tokens), а точный Jaccard по сохраненным
+    хешам шинглов не ниже threshold.
+
+    Память ограничена capacity: сигнатуры хранятся в одном array('I')
+    (num_perm * 4 байта на утверждение), старые записи перезаписываются по
+    кругу. Ответы хранятся сжатыми zlib, их суммарный размер вместе с хешами
+    шинглов ограничен max_bytes: при превышении удаляются самые старые
+    записи. В каждой LSH-корзине хранится до bucket_size последних
+    утверждений: при большом capacity (сотни тысяч) более старые похожие
+    утверждения тоже находятся, а размер корзин остается ограниченным.
+    По умолчанию capacity 10 000: сигнатуры выделяются сразу при создании
+    индекса (~2.5 МБ), для большего индекса capacity задается в настройках.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 10_000,
+        threshold: float = 0.8,
+        num_perm: int = 64,
+        bands: int = 8,
+        ttl: Optional[float] = 6 * 3600,
+        min_shingles: int = 3,
+        max_bytes: Optional[int] = 10_000_000,
+        bucket_size: int = 4
+    ):
+        if num_perm % bands:
+            raise ValueError("num_perm должно делиться на bands")
+
+        self.capacity = capacity
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.ttl = ttl
+        self.min_shingles = min_shingles
+        self.max_bytes = max_bytes
+        self.bucket_size = bucket_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._signatures = array("I", bytes(4 * num_perm * capacity))
+        self._created = array("d", bytes(8 * capacity))
+        self._answers: list[Optional[bytes]] = [None] * capacity
+        self._shingles: list[Optional[array]] = [None] * capacity
+        self._guards: list[tuple[str, ...]] = [()] * capacity
+        self._buckets: list[dict[int, list[int]]] = [{} for _ in range(bands)]
+        self._next_slot = 0
+        self._size = 0
+        self._bytes = 0
+
+    def fingerprint(self, text: str) -> Optional[Fingerprint]:
+        """
+        Сигнатура утверждения или None, если текст слишком короткий
+
+        Значения num_perm хеш-функций для шингла берутся из одного вызова
+        shake_128, минимум по каждой функции - срезом общего массива, так что
+        цикл по перестановкам и шинглам не выполняется в Python.
+        """
+        items = shingles(text)
+        if len(items) < self.min_shingles:
+            return None
+
+        num_perm = self.num_perm
+        encoded = [item.encode("utf-8") for item in items]
+        hashes = array("I", b"".join([hashlib.shake_128(item).digest(4 * num_perm) for item in encoded]))
+        signature = array("I", [min(hashes[i::num_perm]) for i in range(num_perm)])
+        return Fingerprint(signature, frozenset(map(zlib.crc32, encoded)), guard_tokens(text))
+
+    def lookup(self, fingerprint: Optional[Fingerprint]) -> Optional[str]:
+        """Возвращает ответ на похожее утверждение или None"""
+        if fingerprint is None or not self._size:
+            return None
+
+        best_slot, best_score = -1, 0.0
+        for slot in self._candidates(fingerprint.signature):
+            # Истекшая запись не должна заслонять действующую с меньшим сходством
+            if self._expired(slot) or self._guards[slot] != fingerprint.guard:
+                continue
+            score = self._jaccard(fingerprint.shingles, slot)
+            if score > best_score:
+                best_slot, best_score = slot, score
+
+        if best_slot < 0 or best_score < self.threshold:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return zlib.decompress(self._answers[best_slot]).decode("utf-8")  # type: ignore[arg-type]
+
+    def add(self, fingerprint: Optional[Fingerprint], answer: str) -> None:
+        """Добавляет проверенное утверждение с ответом"""
+        if fingerprint is None or self.capacity <= 0:
+            return
+
+        compressed = zlib.compress(answer.encode("utf-8"))
+        stored_shingles = array("I", fingerprint.shingles)
+        weight = len(compressed) + len(stored_shingles) * stored_shingles.itemsize
+        if self.max_bytes is not None and weight > self.max_bytes:
+            return
+
+        slot = self._next_slot
+        self._next_slot = (slot + 1) % self.capacity
+        if self._answers[slot] is not None:
+            self._remove(slot)
+
+        offset = slot * self.num_perm
+        self._signatures[offset:offset + self.num_perm] = fingerprint.signature
+        self._created[slot] = time.monotonic()
+        self._answers[slot] = compressed
+        self._shingles[slot] = stored_shingles
+        self._guards[slot] = fingerprint.guard
+        self._size += 1
+        self._bytes += weight
+
+        for band, key in enumerate(self._band_keys(fingerprint.signature)):
+            bucket = self._buckets[band].setdefault(key, [])
+            bucket.append(slot)
+            if len(bucket) > self.bucket_size:
+                del bucket[0]
+
+        # Заполненные слоты идут по кругу подряд, самый старый - size слотов назад
+        while self.max_bytes is not None and self._bytes > self.max_bytes:
+            self._remove((self._next_slot - self._size) % self.capacity)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        return {
+            "size": self._size,
+            "capacity": self.capacity,
+            "weight": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+    def _band_keys(self, signature: array) -> list[int]:
+        rows = self.rows
+        return [hash(tuple(signature[i:i + rows])) for i in range(0, self.num_perm, rows)]
+
+    def _candidates(self, signature: array) -> set[int]:
+        found = set()
+        for band, key in enumerate(self._band_keys(signature)):
+            found.update(self._buckets[band].get(key, ()))
+        return found
+
+    def _jaccard(self, items: frozenset[int], slot: int) -> float:
+        """Точное сходство по хешам шинглов (MinHash - только оценка)"""
+        stored = self._shingles[slot]
+        common = len(items.intersection(stored))  # type: ignore[arg-type]
+        return common / (len(items) + len(stored) - common)  # type: ignore[arg-type]
+
+    def _weight(self, slot: int) -> int:
+        """Размер записи в пределах max_bytes: сжатый ответ и хеши шинглов"""
+        stored_shingles = self._shingles[slot]
+        return len(self._answers[slot]) + len(stored_shingles) * stored_shingles.itemsize  # type: ignore[arg-type, union-attr]
+
+    def _expired(self, slot: int) -> bool:
+        return self.ttl is not None and time.monotonic() - self._created[slot] > self.ttl
+
+    def _remove(self, slot: int) -> None:
+        """Освобождает слот: убирает запись из корзин и ответ из памяти"""
+        self._unlink(slot)
+        self._bytes -= self._weight(slot)
+        self._answers[slot] = None
+        self._shingles[slot] = None
+        self._guards[slot] = ()
+        self._size -= 1
+
+    def _unlink(self, slot: int) -> None:
+        """Убирает старую запись слота из корзин (если корзина еще указывает на неё)"""
+        offset = slot * self.num_perm
+        old_signature = self._signatures[offset:offset + self.num_perm]
+        for band, key in enumerate(self._band_keys(old_signature)):
+            bucket = self._buckets[band].get(key)
+            if bucket is not None and slot in bucket:
+                bucket.remove(slot)
+                if not bucket:
+                    del self._buckets[band][key]
@@ -1,25 +1,29 @@
 """
 Кэш для отслеживания уведомлений админам о новых пользователях.
 Защита от спама незарегистрированных пользователей.
+
+Ключ - хеш user_id: сброс при выдаче подписки приходит и из других
+процессов/реплик через события кэша (SUBSCRIPTION_UPDATED), а в них
+передается только хеш.
 """
 
-# Кэш пользователей, которым уже отправили уведомление админу
-_notified_users: set[int] = set()
+# Хеши пользователей, о которых админам уже отправили уведомление
+_notified_users: set[str] = set()
 
 
-def is_user_notified(user_id: int) -> bool:
+def is_user_notified(hashed_id: str) -> bool:
     """Проверяет, было ли уже отправлено уведомление о пользователе"""
-    return user_id in _notified_users
+    return hashed_id in _notified_users
 
 
-def mark_user_notified(user_id: int) -> None:
+def mark_user_notified(hashed_id: str) -> None:
     """Отмечает, что пользователю отправлено уведомление"""
-    _notified_users.add(user_id)
+    _notified_users.add(hashed_id)
 
 
-def clear_user_notification(user_id: int) -> None:
+def clear_user_notification(hashed_id: str) -> None:
     """Очищает статус уведомления для пользователя (при выдаче подписки)"""
-    _notified_users.discard(user_id)
+    _notified_users.discard(hashed_id)
 
 
 def get_notified_count() -> int:
@@ -1,13 +1,105 @@
+import re
+
 from app.constants import MAX_MESSAGE_LENGTH
 
+# HTML-тег; без ">" - тег, не закончившийся до конца окна
+_TAG_RE = re.compile(r"<[^<>]*>?")
+
+
+def split_position(text: str, max_length: int = MAX_MESSAGE_LENGTH) -> int:
+    """
+    Длина первой части при разбиении текста с HTML разметкой
+
+    Текст делится после последнего перевода строки или пробела в пределах
+    лимита, предпочтительно там, где все HTML-элементы закрыты. Граница
+    не попадает внутрь тега (<a href="...">) и HTML-сущности (&amp;).
+    Слишком близкая к началу граница не используется, если есть более
+    дальняя; без пробелов текст режется по лимиту.
+    """
+    if len(text) <= max_length:
+        return len(text)
+    
+    # Участки текста между тегами и глубина вложенности элементов в них
+    segments = []
+    position = 0
+    depth = 0
+    tag_start = -1
+    for match in _TAG_RE.finditer(text, 0, max_length):
+        segments.append((position, match.start(), depth))
+        tag = match.group()
+        if not tag.endswith(">"):
+            tag_start = match.start()
+            break
+        if tag.startswith("</"):
+            depth = max(0, depth - 1)
+        elif not tag.endswith("/>"):
+            depth += 1
+        position = match.end()
+    else:
+        segments.append((position, max_length, depth))
+    
+    # Кандидаты в порядке предпочтения: строка / пробел вне элементов, строка / пробел внутри элемента
+    candidates = [0, 0, 0, 0]
+    for start, end, level in reversed(segments):
+        for rank, separator in ((0, "\n"), (1, " ")):
+            index = rank if level == 0 else rank + 2
+            if not candidates[index]:
+                found = text.rfind(separator, start, end)
+                if found >= 0:
+                    candidates[index] = found + 1
+        if all(candidates):
+            break
+    
+    for position in candidates:
+        if position > max_length // 2:
+            return position
+    for position in candidates:
+        if position:
+            return position
+    
+    cut = tag_start if tag_start > 0 else max_length
+    entity = text.rfind("&", max(0, cut - 10), cut)
+    if entity > 0 and ";" not in text[entity:cut]:
+        cut = entity
+    return cut
+
 
 def split_message(text: str, max_length: int = MAX_MESSAGE_LENGTH) -> list[str]:
-    """Разбивает длинное сообщение на части"""
+    """Разбивает длинное сообщение на части (границы - см. split_position)"""
     if len(text) <= max_length:
         return [text]
     
     chunks = []
-    for i in range(0, len(text), max_length):
-        chunks.append(text[i:i + max_length])
+    while len(text) > max_length:
+        cut = split_position(text, max_length)
+        chunks.append(text[:cut])
+        text = text[cut:]
+    if text:
+        chunks.append(text)
     
     return chunks
+
+
+def paginate_lines(header: str, lines: list[str], max_length: int = MAX_MESSAGE_LENGTH) -> list[str]:
+    """
+    Собирает строки в сообщения не длиннее max_length, не разрывая строки
+    
+    Заголовок повторяется в начале каждого сообщения. Строка длиннее
+    лимита обрезается (HTML-теги в строках не должны быть длиннее лимита).
+    """
+    pages = []
+    current = header
+    for line in lines:
+        line = line[:max_length - len(header) - 1]
+        if len(current) + 1 + len(line) > max_length and current != header:
+            pages.append(current)
+            current = header
+        current += "\n" + line
+    if current != header or not pages:
+        pages.append(current)
+    return pages
+
+
+def normalize_claim(text: str) -> str:
+    """Нормализует текст утверждения для кэширования (регистр и пробелы)"""
+    return " ".join(text.casefold().split())
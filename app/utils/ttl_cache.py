@@ -0,0 +1,122 @@
+"""
+LRU кэш с ограничением размера и временем жизни записей.
+Используется для кэшей в памяти процесса (хеши ID, подписки, ответы AI).
+"""
+import time
+from collections import OrderedDict
+from typing import Callable, Generic, Hashable, Optional, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class TTLCache(Generic[K, V]):
+    """
+    LRU кэш с TTL
+
+    Записи вытесняются в порядке LRU, когда превышен max_size (количество)
+    или max_weight (суммарный вес по weigher, например длина текста); срок
+    жизни на порядок вытеснения не влияет. Устаревшие записи не удаляются
+    при чтении (их отдает get_stale) и не продвигаются в LRU, поэтому
+    постепенно смещаются к началу очереди вытеснения, но живую запись,
+    которую давно не читали, могут опередить.
+    Не потокобезопасен - рассчитан на использование из event loop.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: Optional[float] = None,
+        weigher: Optional[Callable[[V], int]] = None,
+        max_weight: Optional[int] = None
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.weigher = weigher
+        self.max_weight = max_weight
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._weight = 0
+        # key -> (value, expires_at по monotonic или None, вес)
+        self._data: OrderedDict[K, tuple[V, Optional[float], int]] = OrderedDict()
+
+    def get(self, key: K) -> Optional[V]:
+        """Возвращает значение или None, если записи нет или она устарела"""
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        value, expires_at, _ = entry
+        if expires_at is not None and time.monotonic() >= expires_at:
+            # Устаревшая запись остается до вытеснения (см. get_stale)
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def get_stale(self, key: K) -> Optional[V]:
+        """Возвращает значение, даже если TTL истек (запасной ответ при сбоях)"""
+        entry = self._data.get(key)
+        return entry[0] if entry is not None else None
+
+    def set(self, key: K, value: V, ttl: Optional[float] = None) -> None:
+        """Сохраняет значение; ttl переопределяет TTL кэша для этой записи"""
+        if self.max_size <= 0:
+            return
+
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        weight = self.weigher(value) if self.weigher else 0
+
+        if self.max_weight is not None and weight > self.max_weight:
+            return
+
+        if key in self._data:
+            self._remove(key)
+
+        self._data[key] = (value, expires_at, weight)
+        self._weight += weight
+        self._evict()
+
+    def pop(self, key: K) -> Optional[V]:
+        """Удаляет запись, возвращает значение (если было)"""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        self._remove(key)
+        return entry[0]
+
+    def clear(self) -> None:
+        """Очищает кэш (счетчики попаданий сохраняются)"""
+        self._data.clear()
+        self._weight = 0
+
+    def stats(self) -> dict:
+        """Возвращает статистику кэша"""
+        return {
+            "size": len(self._data),
+            "weight": self._weight,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _remove(self, key: K) -> None:
+        _, _, weight = self._data.pop(key)
+        self._weight -= weight
+
+    def _evict(self) -> None:
+        while self._data and (
+            len(self._data) > self.max_size
+            or (self.max_weight is not None and self._weight > self.max_weight)
+        ):
+            _, (_, _, weight) = self._data.popitem(last=False)
+            self._weight -= weight
+            self.evictions += 1
@@ -0,0 +1,193 @@
+"""Эндпоинт /metrics и замер времени обработки HTTP запросов webhook сервера"""
+import logging
+import time
+from aiohttp import web
+
+from app.clients import perplexity
+from app.clients.resilience import CircuitBreaker
+from app.db.pool import get_pool_stats
+from app.db.repositories.outbox import OutboxRepository
+from app.db.repositories.subscriptions import SubscriptionRepository
+from app.services.fact_scheduler import get_scheduler
+from app.constants import BACKGROUND, INTERACTIVE
+from app.services.outbound import get_outbound
+from app.utils.crypto import get_hash_cache_stats
+from app.utils.entitlement_cache import get_access_cache_stats
+from app.utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Число подписок и очередь outbox считаются запросом к БД, поэтому кэшируются между опросами
+ACTIVE_SUBSCRIPTIONS_REFRESH_SECONDS = 60
+
+WEBHOOK_SECONDS = registry.histogram(
+    "factchecker_webhook_seconds",
+    "HTTP request handling latency of the webhook server",
+    ("route", "status")
+)
+
+CACHE_HITS = registry.counter("factchecker_cache_hits_total", "Cache hits", ("cache",))
+CACHE_MISSES = registry.counter("factchecker_cache_misses_total", "Cache misses", ("cache",))
+CACHE_SIZE = registry.gauge("factchecker_cache_entries", "Entries currently held in cache", ("cache",))
+POOL_CONNECTIONS = registry.gauge("factchecker_db_pool_connections", "Database pool connections", ("state",))
+POOL_WAITERS = registry.gauge("factchecker_db_pool_waiters", "Coroutines waiting for a pool connection")
+SCHEDULER_QUEUE_DEPTH = registry.gauge("factchecker_scheduler_queue_depth", "Fact checks waiting for a slot")
+SCHEDULER_ACTIVE = registry.gauge("factchecker_scheduler_active", "Fact checks currently holding a slot")
+BREAKER_OPEN = registry.gauge(
+    "factchecker_circuit_breaker_state",
+    "Perplexity circuit breaker state (1 for the current state)",
+    ("state",)
+)
+OUTBOUND_QUEUE_DEPTH = registry.gauge(
+    "factchecker_outbound_queue_depth",
+    "Bot API calls waiting for a rate limit token",
+    ("priority",)
+)
+OUTBOUND_RETRY_AFTER = registry.counter("factchecker_telegram_retry_after_total", "Bot API 429 responses")
+ACTIVE_SUBSCRIPTIONS = registry.gauge("factchecker_active_subscriptions", "Subscriptions that have not expired")
+OUTBOX_PENDING = registry.gauge("factchecker_outbox_pending", "Notifications waiting in the outbox (not failed)")
+
+_active_subscriptions: tuple[float, int] = (0.0, 0)
+_outbox_pending: tuple[float, int] = (0.0, 0)
+
+
+def _cache_stats() -> dict[str, dict]:
+    stats = {
+        "hash": get_hash_cache_stats(),
+        "entitlement": get_access_cache_stats(),
+        "response": perplexity.get_response_cache_stats()
+    }
+    near_duplicate = perplexity.get_near_duplicate_stats()
+    if near_duplicate:
+        stats["near_duplicate"] = near_duplicate
+    return stats
+
+
+def _collect_cache_hits():
+    return [({"cache": name}, stats["hits"]) for name, stats in _cache_stats().items()]
+
+
+def _collect_cache_misses():
+    return [({"cache": name}, stats["misses"]) for name, stats in _cache_stats().items()]
+
+
+def _collect_cache_size():
+    return [({"cache": name}, stats["size"]) for name, stats in _cache_stats().items()]
+
+
+def _collect_pool_connections():
+    stats = get_pool_stats()
+    if not stats:
+        return []
+    return [
+        ({"state": "in_use"}, stats["in_use"]),
+        ({"state": "idle"}, stats["idle"]),
+        ({"state": "max"}, stats["max_size"])
+    ]
+
+
+def _collect_pool_waiters():
+    stats = get_pool_stats()
+    return [({}, stats["waiters"])] if stats else []
+
+
+def _collect_queue_depth():
+    return [({}, get_scheduler().queue_depth)]
+
+
+def _collect_scheduler_active():
+    return [({}, get_scheduler().active)]
+
+
+def _collect_breaker_state():
+    current = perplexity.get_breaker_state()
+    states = (CircuitBreaker.CLOSED, CircuitBreaker.OPEN, CircuitBreaker.HALF_OPEN)
+    return [({"state": state}, 1 if state == current else 0) for state in states]
+
+
+def _collect_outbound_queue_depth():
+    names = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+    depth = get_outbound().queue_depth_by_priority()
+    return [({"priority": names.get(priority, str(priority))}, count) for priority, count in depth.items()]
+
+
+def _collect_retry_after():
+    return [({}, get_outbound().retry_after_count)]
+
+
+async def _collect_active_subscriptions():
+    global _active_subscriptions
+    refreshed_at, count = _active_subscriptions
+    if time.monotonic() - refreshed_at >= ACTIVE_SUBSCRIPTIONS_REFRESH_SECONDS:
+        count = await SubscriptionRepository.count_active()
+        _active_subscriptions = (time.monotonic(), count)
+    return [({}, count)]
+
+
+async def _collect_outbox_pending():
+    global _outbox_pending
+    refreshed_at, count = _outbox_pending
+    if time.monotonic() - refreshed_at >= ACTIVE_SUBSCRIPTIONS_REFRESH_SECONDS:
+        count = await OutboxRepository.count_pending()
+        _outbox_pending = (time.monotonic(), count)
+    return [({}, count)]
+
+
+registry.add_collector(CACHE_HITS, _collect_cache_hits)
+registry.add_collector(CACHE_MISSES, _collect_cache_misses)
+registry.add_collector(CACHE_SIZE, _collect_cache_size)
+registry.add_collector(POOL_CONNECTIONS, _collect_pool_connections)
+registry.add_collector(POOL_WAITERS, _collect_pool_waiters)
+registry.add_collector(SCHEDULER_QUEUE_DEPTH, _collect_queue_depth)
+registry.add_collector(SCHEDULER_ACTIVE, _collect_scheduler_active)
+registry.add_collector(BREAKER_OPEN, _collect_breaker_state)
+registry.add_collector(OUTBOUND_QUEUE_DEPTH, _collect_outbound_queue_depth)
+registry.add_collector(OUTBOUND_RETRY_AFTER, _collect_retry_after)
+registry.add_collector(ACTIVE_SUBSCRIPTIONS, _collect_active_subscriptions)
+registry.add_collector(OUTBOX_PENDING, _collect_outbox_pending)
+
+
+@web.middleware
+async def metrics_middleware(request: web.Request, handler) -> web.StreamResponse:
+    """Записывает время обработки запроса (метка route - шаблон маршрута, а не URL)"""
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    finally:
+        resource = request.match_info.route.resource
+        route = resource.canonical if resource is not None else "unmatched"
+        WEBHOOK_SECONDS.observe(time.perf_counter() - started, route=route, status=str(status))
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    """Отдает метрики в формате Prometheus"""
+    return web.Response(body=(await registry.render()).encode("utf-8"), headers={"Content-Type": CONTENT_TYPE})
+
+
+def create_metrics_app() -> web.Application:
+    """Отдельное приложение только с /metrics"""
+    app = web.Application(middlewares=[metrics_middleware])
+    app.router.add_get('/metrics', handle_metrics)
+    return app
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """
+    Запускает сервер /metrics на отдельном адресе
+
+    Метрики (платежи, подписки, очереди) не отдаются на публичном сервере
+    webhook'ов; по умолчанию сервер слушает только 127.0.0.1.
+    Остановка - runner.cleanup().
+    """
+    runner = web.AppRunner(create_metrics_app())
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
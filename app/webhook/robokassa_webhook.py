@@ -4,12 +4,20 @@ from aiohttp import web
 from app.clients.robokassa_client import RobokassaClient
 from app.db.repositories.payments import PaymentRepository
 from app.db.pool import get_pool
-from app.services.subscriptions import SubscriptionService
-from app.config import config
+from app.constants import SUBSCRIPTION_DURATIONS
+from app.utils.notification_cache import clear_user_notification
+from app.webhook.metrics import metrics_middleware
 from aiogram import Bot
 
 logger = logging.getLogger(__name__)
 
+# Тарифы оплаты (1m - месяц) -> сроки подписки
+PAYMENT_TERMS = {
+    '1m': SUBSCRIPTION_DURATIONS['1M'],
+    '6m': SUBSCRIPTION_DURATIONS['6M'],
+    '1y': SUBSCRIPTION_DURATIONS['1y']
+}
+
 
 async def handle_result_url(request: web.Request) -> web.Response:
     """
@@ -36,77 +44,44 @@ async def handle_result_url(request: web.Request) -> web.Response:
     
     try:
         invoice_id = int(inv_id)
-        
-        # Получаем платеж из БД
+    except ValueError:
+        logger.error(f"Некорректный InvId в webhook: {inv_id!r}")
+        return web.Response(text="bad InvId", status=400)
+    
+    try:
         pool = get_pool()
         payment_repo = PaymentRepository(pool)
-        payment = await payment_repo.get_payment(invoice_id)
         
-        if not payment:
-            logger.error(f"Платеж #{invoice_id} не найден в БД")
-            return web.Response(text=f"OK{inv_id}", status=200)
+        # Платеж -> paid, подписка и подтверждение в outbox одним запросом (идемпотентно)
+        settled = await payment_repo.settle(invoice_id, PAYMENT_TERMS, SUBSCRIPTION_DURATIONS['1M'])
         
-        # Проверяем, не был ли уже обработан
-        if payment['status'] == 'paid':
-            logger.info(f"Платеж #{invoice_id} уже обработан")
+        if not settled:
+            # Не pending: платеж не найден или ResultURL доставлен повторно
+            payment = await payment_repo.get_payment(invoice_id)
+            if not payment:
+                logger.error(f"Платеж #{invoice_id} не найден в БД")
+            else:
+                logger.info(f"Платеж #{invoice_id} уже обработан (статус: {payment['status']})")
             return web.Response(text=f"OK{inv_id}", status=200)
         
-        # Отмечаем платеж как оплаченный
-        await payment_repo.mark_as_paid(invoice_id)
-        
-        # Выдаем подписку пользователю
-        duration = payment['duration']
-        user_hashed_id = payment['user_id']
+        user_hashed_id = settled['user_id']
+        clear_user_notification(user_hashed_id)
         
-        # Определяем длительность подписки
-        duration_mapping = {
-            '1m': '1M',
-            '6m': '6M',
-            '1y': '1y'
-        }
-        subscription_duration = duration_mapping.get(duration, '1M')
-        
-        # Создаем подписку
-        expires_at = await SubscriptionService.grant_subscription(
-            user_hashed_id,
-            subscription_duration
+        # Подтверждение пользователю уже в outbox, Telegram здесь не ждем
+        logger.info(
+            f"✅ Подписка выдана для платежа #{invoice_id} "
+            f"(хеш: {user_hashed_id[:16]}..., до {settled['expires_at']})"
         )
-        
-        logger.info(f"✅ Подписка выдана для платежа #{invoice_id} (хеш: {user_hashed_id[:16]}..., до {expires_at})")
-        
-        # Отправляем уведомление пользователю
-        bot: Bot = request.app['bot']
-        telegram_user_id = payment.get('telegram_user_id')
-        
-        if telegram_user_id:
-            duration_text = {
-                "1m": "1 месяц",
-                "6m": "6 месяцев",
-                "1y": "1 год"
-            }.get(duration, duration)
-            
-            try:
-                await bot.send_message(
-                    chat_id=telegram_user_id,
-                    text=f"✅ <b>Оплата успешно принята!</b>\n\n"
-                         f"📋 Номер счёта: #{invoice_id}\n"
-                         f"📅 Подписка: {duration_text}\n"
-                         f"💵 Сумма: {out_sum}₽\n\n"
-                         f"Ваша подписка активирована до {expires_at.strftime('%Y-%m-%d %H:%M')} (МСК)",
-                    parse_mode="HTML"
-                )
-                logger.info(f"📨 Уведомление о платеже #{invoice_id} отправлено пользователю {telegram_user_id}")
-            except Exception as notify_error:
-                logger.error(f"Ошибка отправки уведомления пользователю {telegram_user_id}: {notify_error}")
-        
         logger.info(f"💰 Оплата успешно обработана для платежа #{invoice_id}")
         
         # Возвращаем обязательный ответ Robokassa
         return web.Response(text=f"OK{inv_id}", status=200)
     
     except Exception as e:
-        logger.error(f"Ошибка обработки webhook: {e}")
-        return web.Response(text=f"OK{inv_id}", status=200)
+        # Ничего не зафиксировано (settle - один атомарный запрос): без OK
+        # Robokassa повторит ResultURL, повтор безопасен (settle идемпотентен)
+        logger.error(f"Ошибка обработки webhook для платежа #{invoice_id}: {e}")
+        return web.Response(text="error", status=500)
 
 
 async def handle_success_url(request: web.Request) -> web.Response:
@@ -128,7 +103,7 @@ async def handle_fail_url(request: web.Request) -> web.Response:
 
 def create_webhook_app(bot: Bot) -> web.Application:
     """Создает aiohttp приложение для webhook"""
-    app = web.Application()
+    app = web.Application(middlewares=[metrics_middleware])
     app['bot'] = bot
     
     app.router.add_route('*', '/robokassa/result', handle_result_url)
@@ -0,0 +1,82 @@
+"""Прием апдейтов Telegram через webhook на общем aiohttp сервере"""
+import hmac
+import logging
+from typing import Callable
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def setup_telegram_webhook(app: web.Application, dp: Dispatcher, bot: Bot, path: str, secret_token: str) -> None:
+    """
+    Регистрирует маршрут для апдейтов Telegram
+    
+    Запросы без верного X-Telegram-Bot-Api-Secret-Token получают 401.
+    Апдейт передается в Dispatcher фоновой задачей, а Telegram сразу
+    получает 200 - долгая проверка факта не держит соединение webhook.
+    """
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        handle_in_background=True,
+        secret_token=secret_token
+    ).register(app, path=path)
+
+
+def setup_update_forwarding(
+    app: web.Application,
+    path: str,
+    secret_token: str,
+    forward: Callable[[dict], None]
+) -> None:
+    """
+    Регистрирует маршрут, который не обрабатывает апдейты, а передает их дальше
+    
+    Используется supervisor'ом: апдейт уходит в очередь воркера, а Telegram
+    сразу получает 200. Проверка секрета такая же, как в setup_telegram_webhook.
+    Некорректное тело тоже получает 200 и не передается: иначе Telegram
+    повторял бы доставку того же апдейта.
+    """
+    async def handle_update(request: web.Request) -> web.Response:
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), secret_token):
+            return web.Response(text="Unauthorized", status=401)
+        try:
+            update = await request.json()
+        except ValueError as e:
+            # json.JSONDecodeError и ошибки декодирования тела - подклассы ValueError
+            logger.warning(f"Некорректный апдейт Telegram (не JSON): {e}")
+            return web.json_response({})
+        if not isinstance(update, dict):
+            logger.warning(f"Некорректный апдейт Telegram: ожидался объект, получен {type(update).__name__}")
+            return web.json_response({})
+        forward(update)
+        return web.json_response({})
+    
+    app.router.add_post(path, handle_update)
+
+
+async def set_telegram_webhook(
+    bot: Bot,
+    dp: Dispatcher,
+    url: str,
+    secret_token: str,
+    max_connections: int = 40
+) -> None:
+    """
+    Регистрирует webhook в Telegram
+    
+    Накопившиеся апдейты не сбрасываются: после перезапуска Telegram
+    досылает всё, что пришло, пока бот был недоступен.
+    """
+    await bot.set_webhook(
+        url=url,
+        secret_token=secret_token,
+        max_connections=max_connections,
+        allowed_updates=dp.resolve_used_update_types(),
+        drop_pending_updates=False
+    )
+    logger.info(f"🔗 Telegram webhook установлен: {url}")
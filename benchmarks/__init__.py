@@ -0,0 +1,6 @@
+"""
+Бенчмарки горячих путей бота: python -m benchmarks
+
+Импорт пакета и harness не меняет окружение: тестовые значения
+переменных выставляет только точка входа (__main__).
+"""
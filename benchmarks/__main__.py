@@ -0,0 +1,114 @@
+"""
+Запуск бенчмарков
+
+    python -m benchmarks                          # все, результат в benchmarks/results/<коммит>.json
+    python -m benchmarks -k dispatcher            # только имена, содержащие подстроку
+    python -m benchmarks --scale 0.1              # быстрый прогон (меньше вызовов в раунде)
+    python -m benchmarks --compare base.json      # код выхода 1 при регрессии медианы > 10%
+"""
+import argparse
+import os
+import sys
+
+from dotenv import load_dotenv
+
+from benchmarks.harness import (
+    DEFAULT_REGRESSION_THRESHOLD,
+    compare,
+    environment_info,
+    format_seconds,
+    load_results,
+    registered_benchmarks,
+    run_all,
+    write_results
+)
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def _default_output() -> str:
+    env = environment_info()
+    commit = (env["commit"] or "unknown")[:12]
+    suffix = "-dirty" if env["dirty"] else ""
+    return os.path.join(RESULTS_DIR, f"{commit}{suffix}.json")
+
+
+def configure_environment() -> None:
+    """
+    Переменные окружения бота для замера (до импорта app.config)
+
+    Конфиг читается из окружения и .env; недостающие обязательные
+    переменные заполняются тестовыми значениями - сеть и БД не используются.
+    """
+    load_dotenv()
+    for name, value in {
+        "TELEGRAM_BOT_TOKEN": "123456:benchmark",
+        "PERPLEXITY_API_KEY": "benchmark",
+        "DATABASE_URL": "postgresql://benchmark@localhost/benchmark",
+        "ADMIN_CHAT_ID": "1",
+        "HASH_SALT": "benchmark-pepper-benchmark-pepper",
+        "ROBOKASSA_MERCHANT_LOGIN": "benchmark",
+        "ROBOKASSA_PASSWORD1": "benchmark",
+        "ROBOKASSA_PASSWORD2": "benchmark",
+        # Логи хендлеров в цикле замера искажают время
+        "LOG_LEVEL": "WARNING"
+    }.items():
+        os.environ.setdefault(name, value)
+
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Бенчмарки горячих путей бота")
+    parser.add_argument("-k", "--filter", action="append", default=[], help="подстрока имени (можно несколько)")
+    parser.add_argument("-o", "--output", help="файл результатов JSON (по умолчанию benchmarks/results/<коммит>.json)")
+    parser.add_argument("--scale", type=float, default=1.0, help="множитель числа вызовов в раунде")
+    parser.add_argument("--compare", metavar="BASELINE", help="JSON предыдущего прогона для сравнения")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_REGRESSION_THRESHOLD,
+        help="допустимое замедление медианы (доля, по умолчанию 0.10)"
+    )
+    parser.add_argument("--list", action="store_true", help="показать бенчмарки и выйти")
+    args = parser.parse_args(argv)
+
+    # Регистрация бенчмарков (импортирует приложение, поэтому после настройки окружения)
+    configure_environment()
+    import benchmarks.cases  # noqa: F401
+
+    selected = [
+        bench for bench in registered_benchmarks()
+        if not args.filter or any(part in bench.name for part in args.filter)
+    ]
+    if args.list:
+        for bench in selected:
+            print(f"{bench.name}  (number={bench.number}, rounds={bench.rounds})")
+        return 0
+    if not selected:
+        print("Нет бенчмарков, подходящих под фильтр", file=sys.stderr)
+        return 2
+
+    def report(result: dict) -> None:
+        spread = result["stdev"] / result["mean"] * 100 if result["mean"] else 0.0
+        print(f"{result['name']:<45} {format_seconds(result['median']):>12}  ±{spread:.1f}%", flush=True)
+
+    data = run_all(selected, scale=args.scale, report=report)
+    output = args.output or _default_output()
+    write_results(data, output)
+    print(f"\nРезультаты: {output}")
+
+    if not args.compare:
+        return 0
+
+    rows = compare(load_results(args.compare), data, args.threshold)
+    print(f"\nСравнение с {args.compare} (порог {args.threshold:.0%}):")
+    for row in rows:
+        mark = "РЕГРЕССИЯ" if row["regression"] else ""
+        print(
+            f"{row['name']:<45} {format_seconds(row['baseline']):>12} -> "
+            f"{format_seconds(row['current']):>12}  {row['change']:+.1%}  {mark}"
+        )
+    return 1 if any(row["regression"] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
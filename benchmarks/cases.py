@@ -0,0 +1,231 @@
+"""
+Бенчмарки горячих путей бота.
+
+Данные генерируются детерминированно (фиксированный seed), чтобы прогоны
+на разных коммитах измеряли одно и то же. Внешние сервисы не используются:
+Bot API заменен сессией без HTTP, выборка подписок - заранее собранными
+строками (измеряется обработка в Python, а не PostgreSQL).
+"""
+import hashlib
+import json
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncGenerator, Optional
+from unittest import mock
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import SendMessage, TelegramMethod
+from aiogram.types import CallbackQuery, Chat, Message, Update, User
+
+from app.clients.robokassa_client import RobokassaClient
+from app.config import config
+from app.db.repositories.subscriptions import SubscriptionRepository
+from app.main import create_dispatcher
+from app.services.subscriptions import SubscriptionService
+from app.utils.crypto import hash_user_id, verify_user_id
+from app.utils.text import split_message
+from benchmarks.harness import benchmark
+
+SEED = 20240601
+
+_WORDS = (
+    "утверждение источник данные исследование официальный заявление министерство "
+    "публикация агентство статистика отчет проверка факт контекст эксперт дата "
+    "регион правительство сообщил подтверждает опровергает частично вводит заблуждение "
+    "цитата оригинал архив интервью документ сайт версия событие году процентов"
+).split()
+
+_VERDICTS = ("✅ Правда", "❌ Ложь", "⚠️ Частично правда", "❓ Недостаточно данных")
+
+
+def fact_check_response(length: int, seed: int = SEED) -> str:
+    """
+    Текст, похожий на ответ модели: вердикт, разделы с абзацами и источники
+
+    Длина в символах примерно равна length (кириллица, markdown, ссылки).
+    """
+    rnd = random.Random(seed + length)
+    parts = [f"**Вердикт:** {rnd.choice(_VERDICTS)}\n"]
+    section = 0
+    while sum(map(len, parts)) < length * 0.85:
+        section += 1
+        parts.append(f"\n**{section}. {' '.join(rnd.choices(_WORDS, k=3)).capitalize()}**\n")
+        for _ in range(rnd.randint(1, 3)):
+            sentences = [
+                " ".join(rnd.choices(_WORDS, k=rnd.randint(8, 18))).capitalize() + "."
+                for _ in range(rnd.randint(2, 5))
+            ]
+            parts.append(" ".join(sentences) + "\n")
+    parts.append("\n**Источники:**\n")
+    index = 0
+    while sum(map(len, parts)) < length:
+        index += 1
+        parts.append(f"{index}. https://example.org/{rnd.choice(_WORDS)}/{rnd.randint(1000, 99999)}\n")
+    return "".join(parts)[:length]
+
+
+class NullSession(BaseSession):
+    """
+    Сессия Bot API без сети: на sendMessage отвечает сообщением, на остальное - True
+
+    Ответ проходит обычную проверку и разбор aiogram (check_response).
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._message_id = 0
+
+    async def make_request(self, bot: Bot, method: TelegramMethod[Any], timeout: Optional[int] = None) -> Any:
+        if isinstance(method, SendMessage):
+            self._message_id += 1
+            result: Any = {
+                "message_id": self._message_id,
+                "date": 1700000000,
+                "chat": {"id": method.chat_id, "type": "private"},
+                "text": method.text
+            }
+        else:
+            result = True
+        response = self.check_response(bot, method, 200, json.dumps({"ok": True, "result": result}))
+        return response.result
+
+    async def stream_content(self, *args: Any, **kwargs: Any) -> AsyncGenerator[bytes, None]:
+        # Файлы в бенчмарках не скачиваются: пустой поток
+        return
+        yield
+
+    async def close(self) -> None:
+        pass
+
+
+# --- Хеширование ID (Scrypt, ~40 мс на вызов) ---
+
+@benchmark("crypto", number=5, rounds=5, params={"algorithm": "scrypt"})
+def hash_user_id_scrypt():
+    return lambda: hash_user_id(123456789, config.hash_salt)
+
+
+@benchmark("crypto", number=5, rounds=5, params={"algorithm": "scrypt"})
+def verify_user_id_scrypt():
+    hashed = hash_user_id(123456789, config.hash_salt)
+    return lambda: verify_user_id(123456789, hashed, config.hash_salt)
+
+
+# --- Разбивка ответа модели на сообщения Telegram ---
+
+def _split_benchmark(length: int):
+    def setup():
+        text = fact_check_response(length)
+        return lambda: split_message(text)
+    return setup
+
+
+for _length, _label in ((800, "short"), (3500, "typical"), (12000, "long")):
+    benchmark("text", name=f"split_message_{_label}", number=20_000, params={"chars": _length})(
+        _split_benchmark(_length)
+    )
+
+
+# --- Подпись Robokassa ---
+
+@benchmark("robokassa", number=50_000)
+def verify_signature_valid():
+    out_sum, inv_id = "3600.00", "123456"
+    # Так подписывает ResultURL Robokassa: md5(OutSum:InvId:Password2)
+    signature = hashlib.md5(f"{out_sum}:{inv_id}:{config.robokassa_password2}".encode()).hexdigest().upper()
+    return lambda: RobokassaClient.verify_signature(out_sum, inv_id, signature)
+
+
+@benchmark("robokassa", number=50_000)
+def verify_signature_invalid():
+    return lambda: RobokassaClient.verify_signature("3600.00", "123456", "0" * 32)
+
+
+# --- Список подписок для админа ---
+
+_SUBSCRIPTION_ROWS = 100_000
+_get_all_patch: Optional[Any] = None
+
+
+def _subscription_rows(count: int) -> list[dict]:
+    rnd = random.Random(SEED)
+    now = datetime(2024, 6, 1)
+    return [
+        {
+            "user_id": f"{rnd.getrandbits(256):064x}" * 2,
+            "expires_at": now + timedelta(seconds=rnd.randint(0, 365 * 86400)),
+            "created_at": now - timedelta(seconds=rnd.randint(0, 365 * 86400))
+        }
+        for _ in range(count)
+    ]
+
+
+def _stop_get_all_patch() -> None:
+    global _get_all_patch
+    if _get_all_patch is not None:
+        _get_all_patch.stop()
+        _get_all_patch = None
+
+
+@benchmark(
+    "subscriptions",
+    number=1,
+    rounds=5,
+    is_async=True,
+    teardown=_stop_get_all_patch,
+    params={"rows": _SUBSCRIPTION_ROWS}
+)
+def get_all_formatted_100k():
+    global _get_all_patch
+    rows = _subscription_rows(_SUBSCRIPTION_ROWS)
+
+    async def get_all():
+        return rows
+
+    _get_all_patch = mock.patch.object(SubscriptionRepository, "get_all", staticmethod(get_all))
+    _get_all_patch.start()
+    return SubscriptionService.get_all_formatted
+
+
+# --- Маршрутизация апдейтов (Dispatcher + middleware + роутеры) ---
+
+# Роутеры - объекты модуля и подключаются к одному диспетчеру, поэтому он общий
+_dispatcher: Optional[Dispatcher] = None
+
+_ADMIN = User(id=config.admin_chat_ids[0] if config.admin_chat_ids else 1, is_bot=False, first_name="Admin")
+_CHAT = Chat(id=_ADMIN.id, type="private")
+
+
+def _dispatch_benchmark(update: Update):
+    def setup():
+        global _dispatcher
+        if _dispatcher is None:
+            _dispatcher = create_dispatcher()
+        dp = _dispatcher
+        bot = Bot(token=config.telegram_bot_token, session=NullSession())
+        return lambda: dp.feed_update(bot, update)
+    return setup
+
+
+benchmark("dispatcher", name="admin_start_command", number=2000, is_async=True)(_dispatch_benchmark(Update(
+    update_id=1,
+    message=Message(
+        message_id=1,
+        date=datetime.now(timezone.utc),
+        chat=_CHAT,
+        from_user=_ADMIN,
+        text="/start"
+    )
+)))
+
+# Ни один обработчик не подходит: чистая стоимость middleware и фильтров
+benchmark("dispatcher", name="unhandled_callback", number=5000, is_async=True)(_dispatch_benchmark(Update(
+    update_id=2,
+    callback_query=CallbackQuery(
+        id="1",
+        from_user=_ADMIN,
+        chat_instance="1",
+        data="noop"
+    )
+)))
@@ -0,0 +1,265 @@
+"""
+Замер времени, запись результатов в JSON и сравнение с базовым прогоном.
+
+Каждый бенчмарк выполняется rounds раундов по number вызовов (number
+увеличивается, если раунд короче MIN_ROUND_SECONDS); в результат попадает
+время одного вызова в каждом раунде. Для сравнения коммитов
+используется медиана по раундам - она устойчивее к шуму, чем среднее.
+"""
+import asyncio
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Optional, Union
+
+# Формат файла результатов (увеличивается при несовместимых изменениях)
+SCHEMA_VERSION = 1
+
+# Медиана медленнее базовой больше чем на эту долю - регрессия
+DEFAULT_REGRESSION_THRESHOLD = 0.10
+
+# Раунд короче этого времени слишком шумный: число вызовов увеличивается
+MIN_ROUND_SECONDS = 0.2
+
+BenchFunc = Callable[[], Union[Any, Awaitable[Any]]]
+
+
+@dataclass
+class Benchmark:
+    """
+    Описание бенчмарка
+
+    setup вызывается один раз перед замером и возвращает функцию, время
+    вызова которой измеряется (обычная или async). teardown - после замера.
+    """
+    name: str
+    group: str
+    setup: Callable[[], BenchFunc]
+    number: int
+    rounds: int
+    warmup: int = 1
+    is_async: bool = False
+    teardown: Optional[Callable[[], None]] = None
+    params: dict[str, Any] = field(default_factory=dict)
+
+
+_benchmarks: list[Benchmark] = []
+
+
+def benchmark(
+    group: str,
+    *,
+    name: Optional[str] = None,
+    number: int = 1000,
+    rounds: int = 7,
+    warmup: int = 1,
+    is_async: bool = False,
+    teardown: Optional[Callable[[], None]] = None,
+    params: Optional[dict[str, Any]] = None
+) -> Callable[[Callable[[], BenchFunc]], Callable[[], BenchFunc]]:
+    """
+    Регистрирует бенчмарк; декорируемая функция - setup
+
+        @benchmark("text", number=10_000)
+        def split_short():
+            text = make_text(800)
+            return lambda: split_message(text)
+    """
+    def decorator(setup: Callable[[], BenchFunc]) -> Callable[[], BenchFunc]:
+        _benchmarks.append(Benchmark(
+            name=f"{group}.{name or setup.__name__}",
+            group=group,
+            setup=setup,
+            number=number,
+            rounds=rounds,
+            warmup=warmup,
+            is_async=is_async,
+            teardown=teardown,
+            params=params or {}
+        ))
+        return setup
+    return decorator
+
+
+def registered_benchmarks() -> list[Benchmark]:
+    return list(_benchmarks)
+
+
+def _run_sync(func: BenchFunc, number: int) -> float:
+    started = time.perf_counter()
+    for _ in range(number):
+        func()
+    return time.perf_counter() - started
+
+
+async def _run_async(func: BenchFunc, number: int) -> float:
+    started = time.perf_counter()
+    for _ in range(number):
+        await func()
+    return time.perf_counter() - started
+
+
+def run_benchmark(bench: Benchmark, loop: asyncio.AbstractEventLoop, scale: float = 1.0) -> dict[str, Any]:
+    """Выполняет бенчмарк и возвращает статистику (секунды на один вызов)"""
+    number = max(1, int(bench.number * scale))
+    func = bench.setup()
+    try:
+        def run(count: int) -> float:
+            if bench.is_async:
+                return loop.run_until_complete(_run_async(func, count))
+            return _run_sync(func, count)
+
+        for _ in range(bench.warmup):
+            run(max(1, number // 10))
+
+        elapsed = run(number)
+        if elapsed < MIN_ROUND_SECONDS:
+            number = math.ceil(number * MIN_ROUND_SECONDS / max(elapsed, 1e-9))
+
+        per_call = [run(number) / number for _ in range(bench.rounds)]
+    finally:
+        if bench.teardown is not None:
+            bench.teardown()
+
+    per_call_sorted = sorted(per_call)
+    median = statistics.median(per_call)
+    return {
+        "name": bench.name,
+        "group": bench.group,
+        "params": bench.params,
+        "number": number,
+        "rounds": bench.rounds,
+        "unit": "seconds",
+        "min": per_call_sorted[0],
+        "max": per_call_sorted[-1],
+        "mean": statistics.fmean(per_call),
+        "median": median,
+        "stdev": statistics.stdev(per_call) if len(per_call) > 1 else 0.0,
+        "ops_per_second": 1 / median if median else None,
+        "rounds_raw": per_call
+    }
+
+
+def _git(*args: str) -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", *args],
+            capture_output=True,
+            text=True,
+            check=True,
+            timeout=10
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment_info() -> dict[str, Any]:
+    """Коммит и окружение прогона (для сравнения результатов между машинами)"""
+    try:
+        from importlib.metadata import version
+        aiogram_version = version("aiogram")
+    except Exception:
+        aiogram_version = None
+
+    status = _git("status", "--porcelain", "--untracked-files=no")
+    return {
+        "commit": _git("rev-parse", "HEAD"),
+        "dirty": bool(status) if status is not None else None,
+        "python": sys.version.split()[0],
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "aiogram": aiogram_version
+    }
+
+
+def run_all(
+    benchmarks: list[Benchmark],
+    scale: float = 1.0,
+    report: Callable[[dict[str, Any]], None] = lambda result: None
+) -> dict[str, Any]:
+    """Выполняет бенчмарки по очереди в одном event loop"""
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    results = []
+    try:
+        for bench in benchmarks:
+            result = run_benchmark(bench, loop, scale)
+            results.append(result)
+            report(result)
+    finally:
+        loop.close()
+        asyncio.set_event_loop(None)
+
+    return {
+        "schema": SCHEMA_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "scale": scale,
+        "environment": environment_info(),
+        "results": results
+    }
+
+
+def write_results(data: dict[str, Any], path: str) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+
+
+def load_results(path: str) -> dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if data.get("schema") != SCHEMA_VERSION:
+        raise ValueError(f"{path}: формат {data.get('schema')}, ожидается {SCHEMA_VERSION}")
+    return data
+
+
+def compare(
+    baseline: dict[str, Any],
+    current: dict[str, Any],
+    threshold: float = DEFAULT_REGRESSION_THRESHOLD
+) -> list[dict[str, Any]]:
+    """
+    Сравнивает медианы с базовым прогоном
+
+    Returns:
+        Для каждого бенчмарка из обоих прогонов: name, baseline, current,
+        change (доля, + медленнее) и regression (change > threshold)
+    """
+    base_by_name = {result["name"]: result for result in baseline["results"]}
+    rows = []
+    for result in current["results"]:
+        base = base_by_name.get(result["name"])
+        if base is None or not base["median"]:
+            continue
+        change = result["median"] / base["median"] - 1
+        rows.append({
+            "name": result["name"],
+            "baseline": base["median"],
+            "current": result["median"],
+            "change": change,
+            "regression": change > threshold
+        })
+    return rows
+
+
+def format_seconds(value: float) -> str:
+    """Время одного вызова в удобных единицах"""
+    if value >= 1:
+        return f"{value:.3f} s"
+    if value >= 1e-3:
+        return f"{value * 1e3:.3f} ms"
+    if value >= 1e-6:
+        return f"{value * 1e6:.3f} µs"
+    return f"{value * 1e9:.1f} ns"
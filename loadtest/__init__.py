@@ -0,0 +1,7 @@
+"""
+Сквозной нагрузочный тест бота: python -m loadtest
+
+Бот работает целиком (Dispatcher, роутеры, middleware, PostgreSQL, фоновые
+задачи), а Telegram Bot API и Perplexity заменены локальными серверами с
+настраиваемой задержкой и ошибками. Нужна отдельная тестовая база PostgreSQL.
+"""
@@ -0,0 +1,203 @@
+"""
+Локальная замена Perplexity API (OpenAI-совместимый /chat/completions)
+
+Отвечает на обычные и потоковые (stream=true, server-sent events) запросы
+текстом, похожим на ответ модели. Время до первого фрагмента, скорость
+генерации и доля ошибок 429/500 настраиваются, чтобы проверить повторы,
+circuit breaker и очередь запросов под нагрузкой.
+"""
+import asyncio
+import hashlib
+import json
+import random
+import time
+from collections import Counter
+from typing import Any, Optional
+
+from aiohttp import web
+
+WORDS = (
+    "утверждение источник данные исследование официальный заявление министерство "
+    "публикация агентство статистика отчет проверка факт контекст эксперт дата "
+    "регион правительство сообщил подтверждает опровергает частично вводит заблуждение"
+).split()
+
+_VERDICTS = ("✅ Правда", "❌ Ложь", "⚠️ Частично правда", "❓ Недостаточно данных")
+
+
+def make_answer(claim: str, length: int) -> str:
+    """Детерминированный ответ модели для утверждения: вердикт, абзацы, источники"""
+    rnd = random.Random(hashlib.sha256(claim.encode("utf-8")).digest())
+    parts = [f"**Вердикт:** {rnd.choice(_VERDICTS)}\n\n"]
+    while sum(map(len, parts)) < length * 0.85:
+        sentence = " ".join(rnd.choices(WORDS, k=rnd.randint(8, 16))).capitalize()
+        parts.append(sentence + ". ")
+    parts.append("\n\n**Источники:**\n")
+    index = 0
+    while sum(map(len, parts)) < length:
+        index += 1
+        parts.append(f"{index}. https://example.org/{rnd.choice(WORDS)}/{rnd.randint(1000, 99999)}\n")
+    return "".join(parts)[:length]
+
+
+class FakeCompletionsAPI:
+    """
+    HTTP сервер с эндпоинтом /chat/completions
+
+    Args:
+        first_token_latency: Среднее время до первого фрагмента в секундах
+        jitter: Разброс задержки (логнормальный, доля от среднего)
+        chars_per_second: Скорость генерации текста
+        answer_length: Длина ответа в символах
+        chunk_chars: Размер фрагмента в потоковом ответе
+        error_ratio: Доля ответов HTTP 500
+        rate_limit_ratio: Доля ответов HTTP 429
+        seed: Seed генератора задержек и ошибок
+    """
+
+    def __init__(
+        self,
+        first_token_latency: float = 1.5,
+        jitter: float = 0.3,
+        chars_per_second: float = 400,
+        answer_length: int = 2500,
+        chunk_chars: int = 40,
+        error_ratio: float = 0.0,
+        rate_limit_ratio: float = 0.0,
+        seed: int = 0
+    ):
+        self.first_token_latency = first_token_latency
+        self.jitter = jitter
+        self.chars_per_second = chars_per_second
+        self.answer_length = answer_length
+        self.chunk_chars = max(1, chunk_chars)
+        self.error_ratio = error_ratio
+        self.rate_limit_ratio = rate_limit_ratio
+        self.requests: Counter[str] = Counter()
+        self.injected: Counter[int] = Counter()
+        self.warmups = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._random = random.Random(seed)
+        self._runner: Optional[web.AppRunner] = None
+        self.url: Optional[str] = None
+
+    def _app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/chat/completions", self._handle)
+        # Прогрев и keep-alive клиента делают GET на базовый адрес
+        app.router.add_get("/", self._warmup)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Запускает сервер (port=0 - свободный порт) и возвращает базовый URL"""
+        self._runner = web.AppRunner(self._app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        bound_port = site._server.sockets[0].getsockname()[1]  # type: ignore[union-attr]
+        self.url = f"http://{host}:{bound_port}"
+        return self.url
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "requests": dict(sorted(self.requests.items())),
+            "total_requests": sum(self.requests.values()),
+            "injected_errors": {str(status): count for status, count in sorted(self.injected.items())},
+            "warmups": self.warmups,
+            "max_in_flight": self.max_in_flight
+        }
+
+    def _first_token_delay(self) -> float:
+        if self.first_token_latency <= 0:
+            return 0.0
+        # Логнормальное распределение: длинный хвост, как у настоящего API
+        return self.first_token_latency * self._random.lognormvariate(0, self.jitter)
+
+    async def _warmup(self, request: web.Request) -> web.Response:
+        self.warmups += 1
+        return web.Response(status=404, text="Not Found")
+
+    async def _handle(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        stream = bool(body.get("stream"))
+        self.requests["stream" if stream else "completion"] += 1
+
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self._first_token_delay())
+
+            roll = self._random.random()
+            if roll < self.rate_limit_ratio:
+                return self._error(429, "rate_limit_exceeded")
+            if roll < self.rate_limit_ratio + self.error_ratio:
+                return self._error(500, "internal_error")
+
+            claim = next(
+                (m.get("content", "") for m in reversed(body.get("messages", [])) if m.get("role") == "user"),
+                ""
+            )
+            answer = make_answer(claim, self.answer_length)
+            model = body.get("model", "sonar-pro")
+            if stream:
+                return await self._stream(request, answer, model)
+            return await self._complete(answer, model)
+        finally:
+            self.in_flight -= 1
+
+    def _error(self, status: int, code: str) -> web.Response:
+        self.injected[status] += 1
+        return web.json_response(
+            {"error": {"message": f"Injected {status} ({code})", "type": code, "code": status}},
+            status=status
+        )
+
+    async def _complete(self, answer: str, model: str) -> web.Response:
+        if self.chars_per_second > 0:
+            await asyncio.sleep(len(answer) / self.chars_per_second)
+        return web.json_response({
+            "id": f"loadtest-{time.monotonic_ns()}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": answer},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": len(answer) // 4, "total_tokens": len(answer) // 4}
+        })
+
+    async def _stream(self, request: web.Request, answer: str, model: str) -> web.StreamResponse:
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+
+        completion_id = f"loadtest-{time.monotonic_ns()}"
+        created = int(time.time())
+        chunk_delay = self.chunk_chars / self.chars_per_second if self.chars_per_second > 0 else 0
+
+        async def send(delta: dict[str, Any], finish_reason: Optional[str] = None) -> None:
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            }
+            await response.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+        await send({"role": "assistant", "content": ""})
+        for start in range(0, len(answer), self.chunk_chars):
+            if start and chunk_delay:
+                await asyncio.sleep(chunk_delay)
+            await send({"content": answer[start:start + self.chunk_chars]})
+        await send({}, "stop")
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
@@ -0,0 +1,145 @@
+"""
+Локальная замена Telegram Bot API для нагрузочного теста
+
+Принимает запросы aiogram по адресу /bot<token>/<method> (как
+https://api.telegram.org или собственный telegram-bot-api) и отвечает
+корректными объектами: sendMessage/editMessageText - сообщением, getMe -
+ботом, остальные методы - True. Задержка ответа и доля ответов 429
+(Too Many Requests с retry_after) настраиваются.
+"""
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+from typing import Any, Optional
+
+from aiohttp import web
+
+BOT_USER = {
+    "id": 100000001,
+    "is_bot": True,
+    "first_name": "Fact-checker (load test)",
+    "username": "factchecker_loadtest_bot"
+}
+
+# Методы, которые возвращают отправленное или измененное сообщение
+_MESSAGE_METHODS = {"sendmessage", "editmessagetext"}
+
+
+class FakeBotAPI:
+    """
+    HTTP сервер, совместимый с Bot API на уровне ответов
+
+    Args:
+        latency: Средняя задержка ответа в секундах
+        jitter: Случайная добавка к задержке (равномерно от 0 до jitter)
+        rate_limit_ratio: Доля вызовов к чатам, на которые отвечаем 429
+        retry_after: retry_after в ответах 429
+        seed: Seed генератора случайных задержек и ошибок
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.03,
+        jitter: float = 0.02,
+        rate_limit_ratio: float = 0.0,
+        retry_after: int = 1,
+        seed: int = 0
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_ratio = rate_limit_ratio
+        self.retry_after = retry_after
+        self.calls: Counter[str] = Counter()
+        self.rate_limited: Counter[str] = Counter()
+        self.chats: set[int] = set()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._random = random.Random(seed)
+        self._message_id = 0
+        self._runner: Optional[web.AppRunner] = None
+        self.url: Optional[str] = None
+
+    def _app(self) -> web.Application:
+        app = web.Application(client_max_size=16 * 1024 * 1024)
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Запускает сервер (port=0 - свободный порт) и возвращает базовый URL"""
+        self._runner = web.AppRunner(self._app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        bound_port = site._server.sockets[0].getsockname()[1]  # type: ignore[union-attr]
+        self.url = f"http://{host}:{bound_port}"
+        return self.url
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "calls": dict(sorted(self.calls.items())),
+            "total_calls": sum(self.calls.values()),
+            "rate_limited": dict(sorted(self.rate_limited.items())),
+            "chats": len(self.chats),
+            "max_in_flight": self.max_in_flight
+        }
+
+    def _message(self, params: dict[str, Any]) -> dict[str, Any]:
+        chat_id = int(params.get("chat_id", 0))
+        message_id = params.get("message_id")
+        if message_id is None:
+            self._message_id += 1
+            message_id = self._message_id
+        return {
+            "message_id": int(message_id),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "group"},
+            "from": BOT_USER,
+            "text": params.get("text", "")
+        }
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        key = method.lower()
+        params: dict[str, Any] = dict(await request.post())
+
+        self.calls[method] += 1
+        if "chat_id" in params:
+            self.chats.add(int(params["chat_id"]))
+
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            if "chat_id" in params and self._random.random() < self.rate_limit_ratio:
+                self.rate_limited[method] += 1
+                return web.json_response({
+                    "ok": False,
+                    "error_code": 429,
+                    "description": f"Too Many Requests: retry after {self.retry_after}",
+                    "parameters": {"retry_after": self.retry_after}
+                }, status=429)
+
+            result: Any
+            if key == "getme":
+                result = BOT_USER
+            elif key in _MESSAGE_METHODS:
+                result = self._message(params)
+            else:
+                result = True
+            return web.json_response({"ok": True, "result": result}, dumps=_dumps)
+        finally:
+            self.in_flight -= 1
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False)
@@ -0,0 +1,414 @@
+"""
+Сценарий нагрузки: синтетические пользователи, замер задержек и лага event loop
+
+Импортирует приложение, поэтому загружается после того, как __main__
+выставил переменные окружения (адреса тестовых серверов, тестовая БД).
+
+Апдейты подаются в Dispatcher (admin_router и user_router со всеми
+middleware) по открытой модели: моменты прихода - пуассоновский поток с
+заданной частотой, независимо от того, успевает ли бот. Задержка апдейта
+считается от запланированного момента прихода до завершения обработчика,
+поэтому отставание самого генератора тоже попадает в результат.
+"""
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass
+from typing import Any, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+from app.clients import perplexity
+from app.config import config
+from app.db.pool import get_pool, get_pool_stats
+from app.db.repositories.outbox import OutboxRepository
+from app.main import (
+    close_services,
+    create_bot,
+    create_dispatcher,
+    init_database,
+    init_fact_checking,
+    start_background_tasks,
+    stop_background_tasks
+)
+from app.services.notifications import drain_background_notifications
+from app.services.subscriptions import SubscriptionService
+from app.utils.crypto import init_hash_cache
+from app.utils.entitlement_cache import init_entitlement_cache
+from loadtest.fake_llm import WORDS
+from loadtest.fake_telegram import BOT_USER
+
+logger = logging.getLogger(__name__)
+
+SEED = 20240601
+
+# Синтетические Telegram ID (не пересекаются с настоящими пользователями тестовой базы)
+USER_ID_BASE = 7_000_000_000
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), "schema.sql")
+
+# Действия пользователей и их веса
+SUBSCRIBER_ACTIONS = {"fact_check": 0.75, "mystatus": 0.15, "start": 0.10}
+VISITOR_ACTIONS = {"text_unsubscribed": 0.45, "start": 0.25, "pay_callback": 0.20, "mystatus": 0.10}
+ADMIN_ACTIONS = {"admin_grant": 0.4, "admin_hash": 0.3, "fact_check": 0.3}
+
+# Популярные утверждения, которые присылают многие пользователи (кэш ответов, single-flight)
+POPULAR_CLAIMS = 50
+
+OUTBOX_DRAIN_TIMEOUT_SECONDS = 30
+
+
+@dataclass
+class LoadProfile:
+    """Параметры нагрузки"""
+    users: int = 2000
+    subscribed_ratio: float = 0.5
+    updates_per_user: int = 3
+    rate: float = 100
+    admin_ratio: float = 0.01
+    duplicate_ratio: float = 0.2
+    seed: int = SEED
+
+
+def percentiles(values: list[float]) -> dict[str, Any]:
+    """count, mean, p50/p95/p99 (nearest rank) и max в секундах"""
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def rank(q: float) -> float:
+        return ordered[min(len(ordered) - 1, max(0, int(q * len(ordered) + 0.5) - 1))]
+
+    return {
+        "count": len(ordered),
+        "mean": sum(ordered) / len(ordered),
+        "p50": rank(0.50),
+        "p95": rank(0.95),
+        "p99": rank(0.99),
+        "max": ordered[-1]
+    }
+
+
+class LoopLagMonitor:
+    """
+    Измеряет лаг event loop: насколько позже срабатывает sleep(interval)
+
+    Лаг показывает, сколько времени цикл был занят синхронной работой
+    (разбор JSON, хеширование без пула, тяжелые обработчики) и не мог
+    обслуживать другие корутины.
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: list[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - expected))
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict[str, Any]:
+        result = percentiles(self.samples)
+        result["interval"] = self.interval
+        return result
+
+
+@dataclass
+class SyntheticUser:
+    user_id: int
+    subscribed: bool
+    is_admin: bool = False
+
+
+class UpdateFactory:
+    """Собирает апдейты Telegram в том виде, в каком их возвращает getUpdates"""
+
+    def __init__(self, bot: Bot, profile: LoadProfile, rnd: random.Random):
+        self.bot = bot
+        self.profile = profile
+        self.rnd = rnd
+        self._update_id = 0
+        self._popular = [self._claim() for _ in range(POPULAR_CLAIMS)]
+
+    def _claim(self) -> str:
+        words = self.rnd.choices(WORDS, k=self.rnd.randint(8, 20))
+        return f"Правда ли, что {' '.join(words)} в {self.rnd.randint(1990, 2025)} году?"
+
+    def claim(self) -> str:
+        if self.rnd.random() < self.profile.duplicate_ratio:
+            return self.rnd.choice(self._popular)
+        return self._claim()
+
+    def _next_id(self) -> int:
+        self._update_id += 1
+        return self._update_id
+
+    @staticmethod
+    def _user(user_id: int) -> dict[str, Any]:
+        return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "username": f"user{user_id}"}
+
+    def message(self, user_id: int, text: str) -> Update:
+        update_id = self._next_id()
+        return Update.model_validate({
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private", "first_name": f"User{user_id}"},
+                "from": self._user(user_id),
+                "text": text
+            }
+        }, context={"bot": self.bot})
+
+    def callback(self, user_id: int, data: str) -> Update:
+        update_id = self._next_id()
+        return Update.model_validate({
+            "update_id": update_id,
+            "callback_query": {
+                "id": str(update_id),
+                "from": self._user(user_id),
+                "chat_instance": str(user_id),
+                "data": data,
+                "message": {
+                    "message_id": update_id,
+                    "date": int(time.time()),
+                    "chat": {"id": user_id, "type": "private", "first_name": f"User{user_id}"},
+                    "from": BOT_USER,
+                    "text": "💳 Выберите тариф для оплаты:"
+                }
+            }
+        }, context={"bot": self.bot})
+
+    def build(self, action: str, user: SyntheticUser, visitors: list[SyntheticUser]) -> Update:
+        if action == "start":
+            return self.message(user.user_id, "/start")
+        if action == "mystatus":
+            return self.message(user.user_id, "/mystatus")
+        if action in ("fact_check", "text_unsubscribed"):
+            return self.message(user.user_id, self.claim())
+        if action == "pay_callback":
+            duration, price = self.rnd.choice((("1m", 1000), ("6m", 3600), ("1y", 6000)))
+            return self.callback(user.user_id, f"pay:{duration}:{price}")
+        target = self.rnd.choice(visitors).user_id if visitors else USER_ID_BASE
+        if action == "admin_grant":
+            return self.message(user.user_id, f"/grant {target} 1m")
+        if action == "admin_hash":
+            return self.message(user.user_id, f"/hash {target}")
+        raise ValueError(f"Неизвестное действие: {action}")
+
+
+def make_users(profile: LoadProfile, rnd: random.Random) -> list[SyntheticUser]:
+    users = [
+        SyntheticUser(USER_ID_BASE + i, rnd.random() < profile.subscribed_ratio)
+        for i in range(profile.users)
+    ]
+    users.extend(SyntheticUser(user_id, True, True) for user_id in config.admin_chat_ids)
+    return users
+
+
+def make_schedule(profile: LoadProfile, users: list[SyntheticUser], rnd: random.Random) -> list[tuple[float, str, SyntheticUser]]:
+    """Список (момент прихода, действие, пользователь), отсортированный по времени"""
+    regular = [user for user in users if not user.is_admin]
+    admins = [user for user in users if user.is_admin]
+    events: list[tuple[str, SyntheticUser]] = []
+    for user in regular:
+        actions = SUBSCRIBER_ACTIONS if user.subscribed else VISITOR_ACTIONS
+        events.extend(
+            (action, user)
+            for action in rnd.choices(list(actions), weights=list(actions.values()), k=profile.updates_per_user)
+        )
+    admin_updates = int(len(events) * profile.admin_ratio)
+    for _ in range(admin_updates if admins else 0):
+        action = rnd.choices(list(ADMIN_ACTIONS), weights=list(ADMIN_ACTIONS.values()))[0]
+        events.append((action, rnd.choice(admins)))
+    rnd.shuffle(events)
+
+    schedule = []
+    at = 0.0
+    for action, user in events:
+        at += rnd.expovariate(profile.rate) if profile.rate > 0 else 0.0
+        schedule.append((at, action, user))
+    return schedule
+
+
+async def setup_schema(reset: bool) -> None:
+    """Создает таблицы бота (IF NOT EXISTS); reset - очищает их перед прогоном"""
+    with open(SCHEMA_PATH, encoding="utf-8") as f:
+        ddl = f.read()
+    async with get_pool().acquire() as conn:
+        await conn.execute(ddl)
+        if reset:
+            await conn.execute(
+                "TRUNCATE subscriptions, payments, notification_outbox RESTART IDENTITY"
+            )
+
+
+async def seed_subscriptions(users: list[SyntheticUser], concurrency: int = 32) -> None:
+    """Выдает подписки пользователям-подписчикам (как /grant, без уведомлений)"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def grant(user: SyntheticUser) -> None:
+        async with semaphore:
+            await SubscriptionService.grant(user.user_id, "1m")
+
+    await asyncio.gather(*(grant(user) for user in users if user.subscribed and not user.is_admin))
+
+
+async def wait_outbox_drained(timeout: float) -> int:
+    """Ждет доставки уведомлений из outbox, возвращает сколько осталось"""
+    deadline = time.monotonic() + timeout
+    pending = await OutboxRepository.count_pending()
+    while pending and time.monotonic() < deadline:
+        await asyncio.sleep(0.5)
+        pending = await OutboxRepository.count_pending()
+    return pending
+
+
+async def drive(
+    dp: Dispatcher,
+    bot: Bot,
+    factory: UpdateFactory,
+    schedule: list[tuple[float, str, SyntheticUser]],
+    visitors: list[SyntheticUser]
+) -> tuple[dict[str, list[float]], Counter[str], list[str], float, int]:
+    """
+    Подает апдейты по расписанию и ждет завершения всех обработчиков
+
+    Returns:
+        Задержки по действиям, ошибки по действиям, примеры ошибок,
+        длительность подачи и максимум одновременно обрабатываемых апдейтов
+    """
+    loop = asyncio.get_running_loop()
+    latencies: dict[str, list[float]] = {}
+    errors: Counter[str] = Counter()
+    error_samples: list[str] = []
+    in_flight = 0
+    max_in_flight = 0
+
+    async def handle(scheduled: float, action: str, update: Update) -> None:
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        try:
+            await dp.feed_update(bot, update)
+        except Exception as e:
+            errors[action] += 1
+            if len(error_samples) < 20:
+                error_samples.append(f"{action}: {type(e).__name__}: {e}")
+        finally:
+            in_flight -= 1
+            latencies.setdefault(action, []).append(loop.time() - scheduled)
+
+    tasks = []
+    started = loop.time()
+    for offset, action, user in schedule:
+        scheduled = started + offset
+        delay = scheduled - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        update = factory.build(action, user, visitors)
+        tasks.append(asyncio.create_task(handle(scheduled, action, update)))
+    injected = loop.time() - started
+
+    await asyncio.gather(*tasks)
+    return latencies, errors, error_samples, injected, max_in_flight
+
+
+async def run(profile: LoadProfile, *, setup: bool = False, reset: bool = False) -> dict[str, Any]:
+    """
+    Прогон нагрузки против запущенных тестовых серверов и тестовой БД
+
+    Returns:
+        Отчет: задержки по действиям, лаг event loop, состояние пула БД и
+        внутренние счетчики клиента Perplexity
+    """
+    rnd = random.Random(profile.seed)
+
+    await init_database()
+    if setup or reset:
+        await setup_schema(reset)
+    await init_fact_checking()
+
+    bot = create_bot()
+    dp = create_dispatcher()
+    background_tasks: list[asyncio.Task] = []
+    try:
+        users = make_users(profile, rnd)
+        visitors = [user for user in users if not user.subscribed]
+
+        seed_started = time.perf_counter()
+        await seed_subscriptions(users)
+        seed_seconds = time.perf_counter() - seed_started
+        # Прогон начинается с холодных кэшей, как после перезапуска бота
+        init_hash_cache(config.hash_cache_size, config.hash_cache_ttl)
+        init_entitlement_cache(config.entitlement_cache_size, config.entitlement_cache_ttl, config.entitlement_negative_ttl)
+
+        background_tasks = start_background_tasks(bot, keepalive=False)
+
+        factory = UpdateFactory(bot, profile, rnd)
+        schedule = make_schedule(profile, users, rnd)
+
+        monitor = LoopLagMonitor()
+        monitor.start()
+        started = time.perf_counter()
+        latencies, errors, error_samples, injected, max_in_flight = await drive(
+            dp, bot, factory, schedule, visitors
+        )
+        elapsed = time.perf_counter() - started
+        await monitor.stop()
+
+        outbox_pending = await wait_outbox_drained(OUTBOX_DRAIN_TIMEOUT_SECONDS)
+        pool_stats = get_pool_stats()
+    finally:
+        await stop_background_tasks(background_tasks)
+        await drain_background_notifications()
+        await close_services()
+        await bot.session.close()
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    scenarios = {}
+    for action in sorted(latencies):
+        scenarios[action] = percentiles(latencies[action])
+        scenarios[action]["errors"] = errors[action]
+
+    return {
+        "profile": asdict(profile),
+        "updates": len(schedule),
+        "users": len(users),
+        "subscribed": sum(1 for user in users if user.subscribed and not user.is_admin),
+        "seed_seconds": seed_seconds,
+        "injection_seconds": injected,
+        "elapsed_seconds": elapsed,
+        "throughput": len(schedule) / elapsed if elapsed else None,
+        "max_in_flight": max_in_flight,
+        "latency": {"all": percentiles(all_latencies), **scenarios},
+        "errors": sum(errors.values()),
+        "error_samples": error_samples,
+        "event_loop_lag": monitor.stats(),
+        "db_pool": pool_stats,
+        "outbox_pending_after_drain": outbox_pending,
+        "perplexity_client": {
+            "breaker": perplexity.get_breaker_state(),
+            "response_cache": perplexity.get_response_cache_stats(),
+            "near_duplicates": perplexity.get_near_duplicate_stats()
+        }
+    }
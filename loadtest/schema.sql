@@ -0,0 +1,38 @@
+-- Схема для нагрузочного теста (python -m loadtest --setup-schema)
+-- Таблицы бота в отдельной тестовой базе; существующие таблицы не изменяются.
+-- Не запускайте нагрузочный тест на рабочей базе: он создает подписки и платежи.
+
+CREATE TABLE IF NOT EXISTS subscriptions (
+    user_id TEXT PRIMARY KEY,
+    created_at TIMESTAMP NOT NULL,
+    expires_at TIMESTAMP NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_expires_at ON subscriptions(expires_at);
+
+CREATE TABLE IF NOT EXISTS payments (
+    invoice_id SERIAL PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    amount NUMERIC(10, 2) NOT NULL,
+    duration TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    telegram_user_id BIGINT,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    paid_at TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_payments_user_id ON payments(user_id);
+
+CREATE TABLE IF NOT EXISTS notification_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    chat_id BIGINT NOT NULL,
+    kind TEXT NOT NULL,
+    payload JSONB NOT NULL DEFAULT '{}',
+    priority SMALLINT NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP NOT NULL DEFAULT (NOW() AT TIME ZONE 'UTC'),
+    created_at TIMESTAMP NOT NULL DEFAULT (NOW() AT TIME ZONE 'UTC'),
+    last_error TEXT,
+    failed_at TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_pending
+    ON notification_outbox(priority, next_attempt_at)
+    WHERE failed_at IS NULL;
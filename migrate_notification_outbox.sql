@@ -0,0 +1,30 @@
+-- Migration: очередь уведомлений (transactional outbox)
+-- Уведомления (подтверждение оплаты, выдача/отзыв подписки, сообщения
+-- админам) записываются сюда в той же транзакции, что и изменение данных,
+-- и доставляются фоновой задачей бота. Миграция не трогает существующие таблицы.
+
+-- Шаг 1: Создать таблицу
+CREATE TABLE IF NOT EXISTS notification_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    chat_id BIGINT NOT NULL,
+    kind TEXT NOT NULL,
+    payload JSONB NOT NULL DEFAULT '{}',
+    priority SMALLINT NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP NOT NULL DEFAULT (NOW() AT TIME ZONE 'UTC'),
+    created_at TIMESTAMP NOT NULL DEFAULT (NOW() AT TIME ZONE 'UTC'),
+    last_error TEXT,
+    failed_at TIMESTAMP
+);
+
+-- Шаг 2: Индекс для выборки готовых к отправке (недоставленные без failed_at)
+CREATE INDEX IF NOT EXISTS idx_outbox_pending
+    ON notification_outbox(priority, next_attempt_at)
+    WHERE failed_at IS NULL;
+
+-- Шаг 3: Дать права пользователю botuser
+GRANT ALL PRIVILEGES ON TABLE notification_outbox TO botuser;
+GRANT ALL PRIVILEGES ON ALL SEQUENCES IN SCHEMA public TO botuser;
+
+-- Готово! Недоставленные уведомления можно посмотреть запросом:
+-- SELECT id, chat_id, kind, attempts, last_error FROM notification_outbox WHERE failed_at IS NOT NULL;